@@ -0,0 +1,207 @@
+"""
+Relatorios de agrupamento (group by) e top N, numa passagem em streaming
+- group(): um dict grupo -> [linhas, soma]; a memoria e proporcional ao numero de grupos,
+  nao ao numero de linhas
+- top(): os N maiores grupos com heapq.nlargest (um heap de N elementos)
+- Campos pelo nome do registo (id, name, supplier_id, product_id, units, ...) ou pelo label
+- No backend csv as linhas sao so partidas nos campos (validate.iter_fields), sem criar
+  registos; com sqlite / servico usa storage.iter_records
+- Relatorios prontos (no menu Reports dos GUIs e das CLIs, via joins.REPORTS):
+      top products by units received   (entradas do stock.csv: units > 0)
+      suppliers with most products     (supplier id do product.csv)
+      movements per product            (movimentos, entradas, saidas e saldo de cada produto)
+      movements per day (last 30 days) (so le o fim do stock.csv: storage.movements)
+- by_period(): resumo dos movimentos de um intervalo de tempo por hora/dia/semana/mes/ano
+- Os nomes dos N primeiros vem do indice de ids (storage.find), sem ler o outro ficheiro todo
+- Com o stock.csv compactado (compact.py) as linhas arquivadas entram pelo snapshot
+  (storage.snapshot: tambem com o servico)
+- CLI: python stock.py group product_id --sum units --top 20
+"""
+
+import heapq
+
+import instrument
+import storage
+import timeline
+import validate
+
+TOP = 20
+RECENT_DAYS = 30
+
+
+def field_index(kind, name):
+    """Posicao do campo no registo (nome do namedtuple ou label do dataset)"""
+    ds = storage.DATASETS[kind]
+    key = name.strip().lower()
+    for names in (ds.record._fields, ds.labels):
+        if key in names:
+            return names.index(key)
+    raise ValueError(f"unknown {kind} field {name!r} (expected one of {', '.join(ds.record._fields)})")
+
+
+def _number(value):
+    # int() e o caso normal (aceita espacos); parse_units para decimais e texto
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return storage.parse_units(value)
+
+
+def iter_fields(kind, csvfile=None, progress=None):
+    """Gera (numero da linha, campos): lista de str no csv, registo com sqlite / servico"""
+    if storage.BACKEND == "csv" and not storage.SERVICE:
+        return validate.iter_fields(kind, storage.path(kind, csvfile), progress)
+    return enumerate(storage.iter_records(kind, csvfile, progress=progress), 1)
+
+
+@instrument.operation("group")
+def group(kind, by, value=None, csvfile=None, progress=None):
+    """
+    dict grupo -> [linhas, soma do campo value] numa passagem pelo ficheiro.
+    Valores que nao sao numeros nao somam; linhas sem o campo by nao contam.
+    """
+    key = field_index(kind, by)
+    column = field_index(kind, value) if value else None
+    width = max(key, column or 0)
+    groups = {}
+    get = groups.get
+    rows = 0
+    for rows, fields in iter_fields(kind, csvfile, progress):
+        if len(fields) <= width:
+            continue
+        name = fields[key].strip()
+        acc = get(name)
+        if acc is None:
+            acc = groups[name] = [0, 0]
+        acc[0] += 1
+        if column is not None:
+            number = _number(fields[column])
+            if number is not None:
+                acc[1] += number
+    instrument.add(rows=rows, matches=len(groups))
+    return groups
+
+
+@instrument.operation("group", "stock")
+def stock_totals(stock_file=None, progress=None):
+    """dict product id -> [movimentos, entradas, saidas] do stock.csv e do snapshot (compact.py)"""
+    totals = {}
+    get = totals.get
+    rows = 0
+    for rows, fields in iter_fields("stock", stock_file, progress):
+        if len(fields) < 3:
+            continue
+        product = fields[1].strip()
+        acc = get(product)
+        if acc is None:
+            acc = totals[product] = [0, 0, 0]
+        acc[0] += 1
+        units = fields[2]
+        if isinstance(units, str):
+            try:
+                units = int(units)
+            except ValueError:
+                units = storage.parse_units(units)
+        if units:
+            acc[1 if units > 0 else 2] += units
+    instrument.add(rows=rows, matches=len(totals))
+    snap = storage.snapshot(stock_file)
+    if snap:
+        moves = snap.get("moves", {})
+        receipts = snap.get("receipts", {})
+        for product, balance in snap["balances"].items():
+            acc = totals.setdefault(product, [0, 0, 0])
+            acc[0] += moves.get(product, 0)
+            acc[1] += receipts.get(product, 0)
+            acc[2] += balance - receipts.get(product, 0)
+    return totals
+
+
+def top(groups, n=TOP, by_sum=False):
+    """Os n maiores (grupo, [linhas, soma]) por linhas ou por soma; empates pela ordem de chegada"""
+    i = 1 if by_sum else 0
+    return heapq.nlargest(n, groups.items(), key=lambda item: item[1][i])
+
+
+def rows(groups, n=None, by_sum=False, with_sum=False):
+    """(grupo, linhas[, soma]): os n maiores, ou todos ordenados pelo grupo se n for None"""
+    items = top(groups, n, by_sum) if n else sorted(groups.items())
+    for name, (count, total) in items:
+        yield (name, count, total) if with_sum else (name, count)
+
+
+def _name(kind, record_id, csvfile):
+    line = storage.find(kind, record_id, csvfile)
+    rec = storage.parse_line(kind, line) if line else None
+    return rec.name if rec else ""
+
+
+def top_received(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Lista dos TOP (product id, name, units received), do maior para o menor"""
+    totals = stock_totals(stock_file, progress)
+    best = heapq.nlargest(TOP, totals.items(), key=lambda item: item[1][1])
+    return [(product, _name("product", product, product_file), received)
+            for product, (_, received, _) in best if received > 0]
+
+
+def top_suppliers(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Lista dos TOP (supplier id, name, products), do maior para o menor"""
+    products = group("product", "supplier_id", csvfile=product_file, progress=progress)
+    return [(supplier, _name("supplier", supplier, supplier_file), count)
+            for supplier, (count, _) in top(products, TOP)]
+
+
+def movements_per_product(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Lista de (product id, movements, received, issued, balance) ordenada por product id"""
+    totals = stock_totals(stock_file, progress)
+    return [(product, moves, received, abs(issued), received + issued)
+            for product, (moves, received, issued) in sorted(totals.items())]
+
+
+@instrument.operation("group", "stock")
+def by_period(start=None, end=None, period="day", stock_file=None, progress=None):
+    """
+    Lista de (periodo, movements, received, issued, net) de start <= time < end, por ordem.
+    So le as linhas do intervalo; o periodo "" junta as linhas sem hora (so sem start).
+    """
+    if period not in timeline.PERIODS:
+        raise ValueError(f"unknown period {period!r} (expected one of {', '.join(timeline.PERIODS)})")
+    days = {}  # dia (ou hora) -> [movimentos, entradas, saidas]
+    step = "hour" if period == "hour" else "day"
+    for line in storage.movements(start, end, stock_file, progress):
+        fields = line.split(",")
+        if len(fields) < 3:
+            continue
+        key = timeline.bucket(fields[3].strip() if len(fields) > 3 else "", step)
+        acc = days.get(key)
+        if acc is None:
+            acc = days[key] = [0, 0, 0]
+        acc[0] += 1
+        units = _number(fields[2])
+        if units:
+            acc[1 if units > 0 else 2] += units
+    totals = {}
+    for day, (moves, received, issued) in days.items():
+        # os dias juntam-se na semana / mes / ano (poucos grupos)
+        key = timeline.bucket(day + "T00:00:00Z", period) if day and step == "day" else day
+        acc = totals.setdefault(key, [0, 0, 0])
+        acc[0] += moves
+        acc[1] += received
+        acc[2] += issued
+    return [(key, moves, received, abs(issued), received + issued)
+            for key, (moves, received, issued) in sorted(totals.items())]
+
+
+def recent_days(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Movimentos por dia dos ultimos RECENT_DAYS dias"""
+    return by_period(timeline.parse_time(f"{RECENT_DAYS}d"), None, "day", stock_file, progress)
+
+
+REPORTS = {
+    "top products by units received": top_received,
+    "suppliers with most products": top_suppliers,
+    "movements per product": movements_per_product,
+    f"movements per day (last {RECENT_DAYS} days)": recent_days,
+}
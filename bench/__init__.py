@@ -0,0 +1,9 @@
+"""
+Benchmarks do product/supplier/stock
+- gendata: gera product.csv, supplier.csv e stock.csv sinteticos (1e3 a 1e8 linhas) com ligacoes entre eles
+- run: mede tempo e memoria dos caminhos de codigo das CLI e dos GUIs e grava os resultados em JSON
+
+Executar: python -m bench.gendata --rows 1e5 --out benchdata/1e5
+          python -m bench.run --sizes 1e3 1e4 1e5 --out bench.json
+          python -m bench.run --sizes 1e5 --compare antes.json
+"""
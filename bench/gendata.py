@@ -0,0 +1,115 @@
+"""
+Gera product.csv, supplier.csv e stock.csv sinteticos no formato que o storage escreve
+- supplier: id com 9 digitos, csv quoting (alguns nomes tem virgula, como "Silva, Lda")
+- product: BOM no inicio, id com 8 digitos, supplier id de um supplier que existe
+- stock: movimentos (entradas e saidas) de produtos que existem, com hora (timeline.FORMAT)
+  espalhada por SPAN_DAYS dias ate END, por ordem
+- Escreve em streaming: 1e8 linhas nao precisam de memoria
+- Com a mesma seed gera sempre os mesmos ficheiros
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+
+import storage
+import timeline
+
+WORDS = ("alfa beta gama delta omega norte sul central digital global tecno sistemas "
+         "solucoes metal papel madeira vidro plastico energia agro logistica").split()
+STREETS = ("Rua Augusta", "Avenida da Liberdade", "Rua do Carmo", "Praca do Comercio", "Rua Direita")
+SUFFIXES = ("Lda", "SA", "Unipessoal", "Industria", "Comercio")
+WRITE_ROWS = 10000
+END = 1767225600  # 2026-01-01T00:00:00Z: fixo, para a mesma seed dar os mesmos ficheiros
+SPAN_DAYS = 3 * 365
+
+
+def supplier_id(n):
+    return "%09d" % n
+
+
+def product_id(n):
+    return "%08d" % n
+
+
+def _name(rnd, words=2):
+    return " ".join(rnd.choice(WORDS) for _ in range(words))
+
+
+def suppliers(rows, rnd):
+    for n in range(rows):
+        name = _name(rnd).title()
+        if n % 3 == 0:
+            name += ", " + rnd.choice(SUFFIXES)
+        yield [supplier_id(n), name, f"{rnd.choice(STREETS)} {rnd.randint(1, 300)}, Lisboa",
+               "9%08d" % rnd.randrange(10 ** 8), f"geral@{name.split(',')[0].replace(' ', '').lower()}.pt",
+               _name(rnd, 4)]
+
+
+def products(rows, supplier_rows, rnd):
+    for n in range(rows):
+        yield [product_id(n), _name(rnd, 3), supplier_id(rnd.randrange(supplier_rows)), _name(rnd, 5)]
+
+
+def stock(rows, product_rows, rnd):
+    start = END - SPAN_DAYS * 86400
+    step = SPAN_DAYS * 86400 / max(rows, 1)
+    for n in range(rows):
+        units = rnd.randint(1, 100) if rnd.random() < 0.7 else -rnd.randint(1, 50)
+        stamp = time.strftime(timeline.FORMAT, time.gmtime(start + int(n * step)))
+        yield [str(n), product_id(rnd.randrange(product_rows)), str(units), stamp]
+
+
+def write(kind, csvfile, rows):
+    """Escreve as linhas como o storage.append_rows (sem os indices)"""
+    ds = storage.DATASETS[kind]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    with open(csvfile, "wb", buffering=storage.BUFFER_SIZE) as fh:
+        if ds.bom:
+            fh.write(storage.BOM)
+        for n, vals in enumerate(rows, 1):
+            if ds.quote:
+                writer.writerow(vals)
+            else:
+                buf.write(",".join(vals) + "\n")
+            if n % WRITE_ROWS == 0:
+                fh.write(buf.getvalue().encode(storage.ENCODING))
+                buf.seek(0)
+                buf.truncate()
+        fh.write(buf.getvalue().encode(storage.ENCODING))
+
+
+def generate(folder, rows, seed=1):
+    """Cria os tres csv em folder com rows linhas cada; devolve {kind: caminho}"""
+    os.makedirs(folder, exist_ok=True)
+    rnd = random.Random(seed)
+    files = {kind: os.path.join(folder, ds.file) for kind, ds in storage.DATASETS.items()}
+    write("supplier", files["supplier"], suppliers(rows, rnd))
+    write("product", files["product"], products(rows, rows, rnd))
+    write("stock", files["stock"], stock(rows, rows, rnd))
+    return files
+
+
+def parse_rows(text):
+    # aceita 1e5, 100000 ou 100_000
+    return int(float(text.replace("_", "")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic product/supplier/stock csv files")
+    parser.add_argument("--rows", type=parse_rows, default=1000, help="rows per file, e.g. 1e6")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    for kind, csvfile in generate(args.out, args.rows, args.seed).items():
+        print(f"{kind}: {csvfile} ({os.path.getsize(csvfile)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Mede tempo e memoria dos caminhos de codigo das CLI e dos GUIs
+- Para cada tamanho gera (ou reutiliza) os dados em <data>/<linhas> com bench.gendata
+- Os GUIs correm sem janela: mede-se o trabalho que cada um entrega ao TaskBar
+  (storage.table_rows + a primeira pagina para o List, storage.search para o Report)
+- suppliergui.read_all_text / search_records / add_record sao chamados diretamente
+- CLI reports(): storage.search(kind, termo, ficheiro, False), como em product.py/stock.py
+- report.*: relatorios de agrupamento / top N do aggregate.py (menu Reports)
+- stock.movements.day: movimentos do ultimo dia do ficheiro (pesquisa binaria por tempo)
+- Tempo: melhor de --repeat execucoes; memoria: pico do tracemalloc numa execucao extra
+- O JSON tem o commit (git) para comparar: --compare antigo.json mostra as regressoes
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import aggregate
+import colcache
+import csvindex
+import ledger
+import searchcache
+import storage
+import suppliergui
+import timeline
+import trigram
+from bench import gendata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE = 50  # linhas visiveis na tabela dos GUIs
+ADDS = 100
+SIDECARS = (".idx", ".tri", ".bal", ".lock", ".col", ".product.col", ".units.col")
+THRESHOLD = 1.25
+
+# setup corre antes de cada execucao (fora do tempo); ops: operacoes por execucao
+Case = namedtuple("Case", "name run setup ops")
+
+
+def _count(lines):
+    return sum(1 for _ in lines)
+
+
+def _remove_sidecars(kind):
+    # indices em disco e em memoria: a proxima chamada comeca do zero
+    for cache in (csvindex._cache, ledger._cache, trigram._cache):
+        cache.clear()
+    searchcache.clear()
+    for ext in SIDECARS:
+        try:
+            os.remove(storage.DATASETS[kind].file + ext)
+        except OSError:
+            pass
+
+
+def _adds(rows):
+    start = rows * 10
+
+    def run():
+        nonlocal start
+        for n in range(start, start + ADDS):
+            suppliergui.add_record([gendata.supplier_id(n), "Bench, Lda", "Rua Augusta 1", "912345678",
+                                    "bench@example.pt", "bench"])
+        start += ADDS
+    return run
+
+
+def _last_day():
+    # movimentos do ultimo dia que tem linhas (os dados gerados acabam em gendata.END)
+    last = timeline.last_time(storage.DATASETS["stock"].file)
+    if not last:
+        return 0  # dados antigos, sem hora
+    return _count(storage.movements(timeline.parse_time("1d", datetime.fromisoformat(last))))
+
+
+def cases(rows):
+    mid = rows // 2
+    return [
+        Case("supplier.read_all_text", lambda: len(suppliergui.read_all_text()), None, 1),
+        Case("supplier.search_records", lambda: len(suppliergui.search_records("lda")), searchcache.clear, 1),
+        Case("supplier.search_records.miss", lambda: len(suppliergui.search_records("zzzz")), searchcache.clear, 1),
+        Case("cli.reports.product", lambda: _count(storage.search("product", "delta", None, False)),
+             searchcache.clear, 1),
+        Case("cli.reports.stock", lambda: _count(storage.search("stock", gendata.product_id(mid), None, False)),
+             searchcache.clear, 1),
+        Case("gui.list.product", lambda: storage.table_rows("product").rows(0, PAGE), None, 1),
+        Case("gui.list.supplier", lambda: storage.table_rows("supplier").rows(0, PAGE), None, 1),
+        Case("gui.list.stock", lambda: storage.table_rows("stock").rows(0, PAGE), None, 1),
+        Case("gui.report.product", lambda: len(list(storage.search("product", "Delta"))), searchcache.clear, 1),
+        Case("gui.report.product.cached", lambda: len(list(storage.search("product", "Delta"))), None, 1),
+        Case("gui.report.stock", lambda: len(list(storage.search("stock", gendata.product_id(mid)))),
+             searchcache.clear, 1),
+        Case("stock.balances.full", lambda: len(storage.balances()), lambda: _remove_sidecars("stock"), 1),
+        Case("report.top_received", lambda: len(aggregate.top_received()), None, 1),
+        Case("report.top_suppliers", lambda: len(aggregate.top_suppliers()), None, 1),
+        Case("stock.movements.day", _last_day, None, 1),
+        Case("stock.below.colcache", lambda: len(colcache.stock_below(10)), None, 1),
+        Case("supplier.find_record.cold", lambda: suppliergui.find_record(gendata.supplier_id(mid)),
+             lambda: _remove_sidecars("supplier"), 1),
+        Case("supplier.find_record", lambda: suppliergui.find_record(gendata.supplier_id(mid)), None, 1),
+        Case("supplier.add_record", _adds(rows), None, ADDS),
+    ]
+
+
+def measure(case, repeat, memory=True):
+    times = []
+    for _ in range(repeat):
+        if case.setup:
+            case.setup()
+        t = time.perf_counter()
+        case.run()
+        times.append(time.perf_counter() - t)
+    result = {"seconds": min(times), "mean": sum(times) / len(times), "per_op": min(times) / case.ops}
+    if memory:
+        if case.setup:
+            case.setup()
+        tracemalloc.start()
+        case.run()
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run_size(rows, data, repeat, memory=True, only=None, regen=False):
+    folder = os.path.abspath(os.path.join(data, str(rows)))
+    if regen and os.path.isdir(folder):
+        shutil.rmtree(folder)
+    if not os.path.exists(os.path.join(folder, "stock.csv")):
+        print(f"generating {rows} rows in {folder}", file=sys.stderr)
+        gendata.generate(folder, rows)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    results = []
+    try:
+        for kind in storage.DATASETS:
+            _remove_sidecars(kind)
+        sizes = {kind: os.path.getsize(ds.file) for kind, ds in storage.DATASETS.items()}
+        for case in cases(rows):
+            if only and not any(case.name.startswith(prefix) for prefix in only):
+                continue
+            result = {"name": case.name, "rows": rows}
+            result.update(measure(case, repeat, memory))
+            results.append(result)
+            print(f"{rows:>10} {case.name:<32} {result['seconds'] * 1000:10.2f} ms"
+                  + (f" {result['peak_bytes'] / 1024:10.0f} KiB" if memory else ""), file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+    return results, sizes
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, threshold=THRESHOLD):
+    """Linhas de texto com os casos que ficaram mais lentos que threshold vezes"""
+    before = {(r["name"], r["rows"]): r["seconds"] for r in old["results"]}
+    lines = []
+    for r in new["results"]:
+        prev = before.get((r["name"], r["rows"]))
+        if prev and r["seconds"] > prev * threshold:
+            lines.append(f"{r['name']} @ {r['rows']}: {prev * 1000:.2f} ms -> {r['seconds'] * 1000:.2f} ms "
+                         f"({r['seconds'] / prev:.2f}x)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark add/list/report on synthetic data")
+    parser.add_argument("--sizes", nargs="+", type=gendata.parse_rows, default=[1000, 10000, 100000],
+                        help="rows per file, 1e3 .. 1e8")
+    parser.add_argument("--data", default=os.path.join(ROOT, "benchdata"), help="folder for the generated files")
+    parser.add_argument("--regen", action="store_true", help="generate the data again")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--only", nargs="+", help="case name prefixes, e.g. gui.list supplier")
+    parser.add_argument("--out", help="JSON results file (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON results; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+    if storage.BACKEND != "csv":
+        print(f"note: storage backend is {storage.BACKEND}", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": storage.BACKEND,
+        "results": [],
+        "files": {},
+    }
+    for rows in args.sizes:
+        results, sizes = run_size(rows, args.data, args.repeat, not args.no_memory, args.only, args.regen)
+        report["results"].extend(results)
+        report["files"][str(rows)] = sizes
+    if resource is not None:
+        report["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            regressions = compare(json.load(fh), report, args.threshold)
+        for line in regressions:
+            print("regression:", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Importacao em massa para product.csv, supplier.csv e stock.csv
+- Le linhas de um ficheiro CSV ou JSONL (ou do stdin com "-")
+- Valida e limpa cada linha como os scripts originais (storage.clean):
+  product/stock trocam "," por ";", supplier usa csv quoting (como o suppliergui)
+- Escreve em lotes grandes num so open(), e atualiza os indices (.idx/.tri) no fim
+- Nas linhas JSONL os campos podem vir com o nome do registo (supplier_id) ou do label (supplier id)
+- Uma linha JSONL invalida e recusada (com o numero da linha), como as outras linhas invalidas
+- Durabilidade: --fsync batch (fsync em cada lote), end (so no fim) ou none
+
+Executar: python bulkimport.py supplier novos.jsonl --fsync batch
+          python bulkimport.py stock - < movimentos.csv
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+import storage
+
+BATCH_SIZE = storage.BATCH_SIZE
+
+
+def read_rows(path, fmt=None):
+    """
+    Gera linhas (listas ou dicts) de um CSV ou JSONL; "-" le do stdin.
+    Uma linha JSONL que nao se consegue ler gera um ValueError (recusado pelo storage.clean).
+    """
+    if fmt is None:
+        fmt = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+    fh = sys.stdin if path == "-" else open(path, "r", newline="", encoding="utf-8-sig")
+    try:
+        if fmt == "jsonl":
+            for line_no, line in enumerate(fh, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as ex:
+                    yield ValueError(f"invalid JSON on line {line_no}: {ex.msg}")
+        else:
+            for row in csv.reader(fh):
+                if row:
+                    yield row
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+
+def import_rows(kind, rows, csvfile=None, batch_size=BATCH_SIZE, fsync="end"):
+    """
+    Acrescenta as linhas validas ao CSV de kind (ver storage.append_rows).
+    fsync: "batch" (apos cada lote), "end" (uma vez no fim) ou "none".
+    """
+    return storage.append_rows(kind, rows, csvfile, batch_size, fsync)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import into product.csv, supplier.csv or stock.csv")
+    parser.add_argument("kind", choices=sorted(storage.DATASETS))
+    parser.add_argument("source", help="CSV or JSONL file, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension (csv for stdin)")
+    parser.add_argument("--csv", dest="csvfile", help="target file (default: the usual csv for kind)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fsync", choices=["batch", "end", "none"], default="end")
+    args = parser.parse_args(argv)
+
+    rows = read_rows(args.source, args.format)
+    result = import_rows(args.kind, rows, args.csvfile, args.batch_size, args.fsync)
+    for n, error in result.rejected:
+        print(f"row {n}: {error}", file=sys.stderr)
+    print(f"{result.written} rows written, {len(result.rejected)} rejected")
+    return 1 if result.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Cache em colunas (arrays binarios) do stock.csv para contas com numeros
+- product (codigo num dicionario de ids de produto) e units (double)
+- So no backend csv: com sqlite / servico as contas usam storage.balances (e o aggregate)
+- Cada coluna fica em <csv>.<coluna>.col e o estado (offset, bytes de controlo, dicionario) em <csv>.col
+- load() abre as colunas com mmap; se o CSV cresceu so le as linhas novas e acrescenta-as,
+  se foi truncado/substituido volta a criar tudo (como o ledger.py)
+- As colunas sao memoryview sobre o mmap
+- A ultima linha sem \n so entra na cache quando estiver completa
+- As contas do stock incluem o snapshot do ledger compactado (compact.py)
+"""
+
+import json
+import mmap
+import os
+from array import array
+
+import aggregate
+import csvindex
+import csvscan
+import filelock
+import instrument
+import ledger
+import storage
+
+CHECK_SIZE = 64
+
+# (nome, typecode do array)
+COLUMNS = {
+    "stock": [("product", "i"), ("units", "d")],
+}
+
+
+def state_path(csvfile):
+    return csvfile + ".col"
+
+
+def column_path(csvfile, name):
+    return f"{csvfile}.{name}.col"
+
+
+def _check_bytes(fh, offset):
+    start = max(0, offset - CHECK_SIZE)
+    fh.seek(start)
+    return fh.read(offset - start).hex()
+
+
+class Columns:
+    """Colunas de um CSV abertas com mmap: cols["units"], cols.rows, cols.dictionary"""
+
+    def __init__(self, kind, csvfile, rows, dictionary):
+        self.kind = kind
+        self.csvfile = csvfile
+        self.rows = rows
+        self.dictionary = dictionary
+        self._maps = []
+        self._arrays = {}
+        for name, code in COLUMNS[kind]:
+            self._arrays[name] = self._open(column_path(csvfile, name), code)
+
+    def _open(self, path, code):
+        if self.rows == 0:
+            return memoryview(array(code))
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mm)
+        return memoryview(mm).cast(code)[:self.rows]
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def close(self):
+        self._arrays = {}
+        for mm in self._maps:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # ainda ha arrays a usar o mmap: fecha quando forem libertados
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _load_state(csvfile, kind):
+    try:
+        with open(state_path(csvfile), "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    for name, code in COLUMNS[kind]:
+        try:
+            if os.path.getsize(column_path(csvfile, name)) != state["rows"] * array(code).itemsize:
+                return None
+        except OSError:
+            return None
+    return state
+
+
+def _save_state(csvfile, state):
+    tmp = state_path(csvfile) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, state_path(csvfile))
+
+
+def _parse(kind, raw, codes, dictionary):
+    rec = storage.parse_line(kind, csvindex.decode_line(raw))
+    if rec is None:
+        return None
+    product = rec.product_id.strip()
+    code = codes.get(product)
+    if code is None:
+        code = codes[product] = len(dictionary)
+        dictionary.append(product)
+    units = rec.units if rec.units is not None else float("nan")
+    return (code, float(units))
+
+
+def _update(kind, csvfile):
+    """Poe a cache em dia com o CSV (so le o que foi acrescentado); devolve o estado"""
+    state = _load_state(csvfile, kind)
+    with open(csvfile, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if state is not None and (state["offset"] > size or _check_bytes(fh, state["offset"]) != state["check"]):
+            state = None
+        if state is None:
+            state = {"offset": 0, "check": "", "rows": 0, "dictionary": []}
+            for name, _ in COLUMNS[kind]:
+                open(column_path(csvfile, name), "wb").close()
+        if state["offset"] == size:
+            return state
+        dictionary = state["dictionary"]
+        codes = {product: code for code, product in enumerate(dictionary)}
+        new = [array(code) for _, code in COLUMNS[kind]]
+        offset = state["offset"]
+        for raw_offset, raw in csvscan.iter_lines(csvfile, offset):
+            if not raw.endswith(b"\n"):
+                break  # linha ainda incompleta
+            offset = raw_offset + len(raw)
+            values = _parse(kind, raw, codes, dictionary)
+            if values is None:
+                continue
+            for col, value in zip(new, values):
+                col.append(value)
+        for (name, _), col in zip(COLUMNS[kind], new):
+            with open(column_path(csvfile, name), "ab") as out:
+                col.tofile(out)
+        state["rows"] += len(new[0])
+        state["offset"] = offset
+        state["check"] = _check_bytes(fh, offset)
+    _save_state(csvfile, state)
+    return state
+
+
+@instrument.operation("columns")
+def load(kind, csvfile=None):
+    """Columns do CSV de kind (atualiza a cache primeiro); usar com with ou chamar close()"""
+    csvfile = storage.path(kind, csvfile)
+    if not os.path.exists(csvfile):
+        return Columns(kind, csvfile, 0, [])
+    with filelock.locked(csvfile):
+        state = _update(kind, csvfile)
+    return Columns(kind, csvfile, state["rows"], state["dictionary"])
+
+
+def _number_text(value):
+    return int(value) if value == int(value) else value
+
+
+def _local():
+    # a cache so serve para o stock.csv local
+    return storage.BACKEND == "csv" and not storage.SERVICE
+
+
+def stock_totals(csvfile=None):
+    """{id do produto: unidades} somando todos os movimentos (snapshot + csv)"""
+    if not _local():
+        return storage.balances(csvfile)
+    snap = ledger.load_snapshot(storage.path("stock", csvfile))
+    with load("stock", csvfile) as cols:
+        sums = [0.0] * len(cols.dictionary)
+        for code, units in zip(cols["product"], cols["units"]):
+            if units == units:  # nan
+                sums[code] += units
+        totals = dict(snap["balances"]) if snap else {}
+        for product, total in zip(cols.dictionary, sums):
+            totals[product] = _number_text(float(totals.get(product, 0) + total))
+        return totals
+
+
+def total_units(csvfile=None, received=False):
+    """Soma das unidades de todos os movimentos (received=True: so as entradas, > 0)"""
+    if not _local():
+        if received:
+            return sum(acc[1] for acc in aggregate.stock_totals(csvfile).values())
+        return sum(storage.balances(csvfile).values())
+    snap = ledger.load_snapshot(storage.path("stock", csvfile))
+    with load("stock", csvfile) as cols:
+        total = sum(u for u in cols["units"] if u == u and (u > 0 or not received))
+        if snap:
+            total += snap["received"] if received else snap["units"]
+        return _number_text(float(total))
+
+
+def stock_below(limit, csvfile=None):
+    """Lista de (produto, unidades) com menos de limit unidades, ordenada por produto"""
+    return sorted((p, u) for p, u in stock_totals(csvfile).items() if u < limit)
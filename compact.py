@@ -0,0 +1,221 @@
+"""
+Compactacao do ledger do stock (stock.csv)
+- Soma as linhas completas do stock.csv num snapshot <csv>.snap (JSON): saldos, entradas (> 0)
+  e numero de movimentos por produto, id da ultima entrada incluida, numero de linhas,
+  total de unidades e de entradas
+- As linhas somadas passam para o arquivo (stock.archive.csv, mesmo formato) ou sao
+  apagadas (--truncate); no stock.csv fica so o que vier depois
+- Com --truncate os ids das linhas apagadas ficam em <csv>.dropped (um por linha): os
+  appends continuam a recusar esses ids (storage.archived_ids)
+- ledger.balances e o colcache somam o snapshot com o csv: os saldos passam a depender
+  so dos movimentos desde a ultima compactacao
+- Ordem: arquivo, csv novo (.tmp), snapshot, rename do csv. O snapshot guarda o inode do csv
+  novo e o inicio e o fim das linhas arquivadas; se o rename nao chegou a ser feito o ledger
+  usa o snapshot anterior (previous) e a proxima compactacao corta o arquivo onde estava.
+  O que estiver no arquivo depois do fim guardado no snapshot (compactacao que parou antes
+  de gravar o snapshot) tambem e cortado: as linhas ainda estao no csv
+- find/search/list so veem as linhas que ficaram no csv (as antigas estao no arquivo)
+  storage.movements (por hora) procura tambem no arquivo (ledger.archive_range)
+- So para o backend csv
+
+Executar: python compact.py [stock.csv] [--truncate]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import colcache
+import csvindex
+import csvscan
+import filelock
+import instrument
+import ledger
+import storage
+import trigram
+
+COPY_SIZE = 1 << 20
+
+
+def archive_path(csvfile):
+    root, ext = os.path.splitext(csvfile)
+    return root + ".archive" + (ext or ".csv")
+
+
+def dropped_path(csvfile):
+    return csvfile + ".dropped"
+
+
+def _empty():
+    return {"balances": {}, "receipts": {}, "moves": {}, "last_id": None, "rows": 0, "bad": 0, "units": 0, "received": 0,
+            "compactions": 0}
+
+
+def _fold(snap, raw):
+    line = csvindex.decode_line(raw)
+    if not line:
+        return
+    snap["rows"] += 1
+    if not ledger.fold(snap["balances"], raw):
+        snap["bad"] += 1
+        return
+    parts = line.split(",")
+    product = parts[1].strip()
+    units = ledger.parse_units(parts[2])
+    snap["units"] += units
+    snap["moves"][product] = snap["moves"].get(product, 0) + 1
+    if units > 0:
+        snap["received"] += units
+        snap["receipts"][product] = snap["receipts"].get(product, 0) + units
+    snap["last_id"] = parts[0].strip()
+
+
+def _copy(src, dst, start, end):
+    src.seek(start)
+    left = end - start
+    while left > 0:
+        data = src.read(min(COPY_SIZE, left))
+        if not data:
+            break
+        dst.write(data)
+        left -= len(data)
+    dst.flush()
+    os.fsync(dst.fileno())
+
+
+def _kept(current, base, interrupted, path, name):
+    """Bytes do arquivo (name: archive / dropped) que valem; None = nao se sabe (fica tudo)"""
+    if interrupted and current.get(name) == path:
+        return current[name + "_start"]
+    if base and base.get(name) == path:
+        return base.get(name + "_end")  # snapshots antigos nao tem o fim
+    return 0  # nenhum snapshot usa o arquivo: restos de uma compactacao que parou antes
+
+
+def _cut(out, size):
+    if size is not None and out.seek(0, os.SEEK_END) > size:
+        out.truncate(size)
+
+
+def _copy_ids(csvfile, out, end):
+    # so o id de cada linha (as linhas sao apagadas)
+    ids = (csvindex.first_field(raw) for _, raw in csvscan.iter_lines(csvfile, 0, end))
+    out.write(b"".join((key + "\n").encode(storage.ENCODING) for key in ids if key))
+    out.flush()
+    os.fsync(out.fileno())
+
+
+def _forget(csvfile):
+    # indices e caches do csv antigo: sao criados outra vez a partir do csv novo
+    for sidecar in (csvindex.index_path(csvfile), trigram.index_path(csvfile),
+                    ledger.state_path(csvfile), colcache.state_path(csvfile)):
+        try:
+            os.remove(sidecar)
+        except OSError:
+            pass
+    for cache in (csvindex._cache, ledger._cache, trigram._cache):
+        cache.pop(os.path.abspath(csvfile), None)
+
+
+@instrument.operation("compact", "stock")
+def compact(csvfile=None, archive=True, progress=None):
+    """
+    Passa as linhas completas do stock.csv para o snapshot (e para o arquivo).
+    Devolve o snapshot novo, ou None se nao havia linhas para compactar.
+    """
+    if storage.BACKEND != "csv":
+        raise ValueError("compaction is only available for the csv backend")
+    csvfile = storage.path("stock", csvfile)
+    if not os.path.exists(csvfile):
+        return None
+    with filelock.locked(csvfile):
+        current = ledger.read_snapshot(csvfile)
+        interrupted = current is not None and not ledger.applied(current, csvfile)
+        base = current.get("previous") if interrupted else current
+        end = csvscan.end_of_lines(csvfile)
+        if end == 0:
+            return None
+        snap = _empty()
+        if base:
+            snap.update({k: v for k, v in base.items() if k != "previous"})
+            for name in ("balances", "receipts", "moves"):
+                snap[name] = dict(base.get(name, {}))
+        for _, raw in csvscan.iter_lines(csvfile, 0, end, progress):
+            _fold(snap, raw)
+        with open(csvfile, "rb") as fh:
+            if archive:
+                path = archive_path(csvfile)
+                with open(path, "ab") as out:
+                    # compactacao anterior interrompida: as linhas dela ainda estao no csv
+                    _cut(out, _kept(current, base, interrupted, path, "archive"))
+                    snap["archive"] = path
+                    snap["archive_start"] = out.seek(0, os.SEEK_END)
+                    _copy(fh, out, 0, end)
+                    snap["archive_end"] = out.tell()
+            else:
+                path = dropped_path(csvfile)
+                with open(path, "ab") as out:
+                    _cut(out, _kept(current, base, interrupted, path, "dropped"))
+                    snap["dropped"] = path
+                    snap["dropped_start"] = out.seek(0, os.SEEK_END)
+                    _copy_ids(csvfile, out, end)
+                    snap["dropped_end"] = out.tell()
+                if snap.get("archive"):
+                    # o arquivo das compactacoes anteriores fica como estava
+                    with open(snap["archive"], "ab") as out:
+                        _cut(out, _kept(current, base, interrupted, snap["archive"], "archive"))
+                        snap["archive_start"] = snap["archive_end"] = out.seek(0, os.SEEK_END)
+            fh.seek(0)
+            head = fh.read(min(ledger.CHECK_SIZE, end))
+            tmp = csvfile + ".compact.tmp"
+            with open(tmp, "wb") as out:
+                _copy(fh, out, end, os.fstat(fh.fileno()).st_size)
+                st = os.fstat(out.fileno())
+        snap["ident"] = [st.st_dev, st.st_ino]
+        snap["head"] = head.hex()
+        snap["time"] = time.time()
+        snap["compactions"] += 1
+        snap["previous"] = {k: v for k, v in base.items() if k != "previous"} if base else None
+        _save(csvfile, snap)
+        os.replace(tmp, csvfile)
+        _forget(csvfile)
+    instrument.add(bytes=end, rows=snap["rows"] - (base["rows"] if base else 0))
+    return snap
+
+
+def _save(csvfile, snap):
+    path = ledger.snapshot_path(csvfile)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(snap, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact stock.csv into a balance snapshot")
+    parser.add_argument("csvfile", nargs="?", default=None, help="stock csv (default stock.csv)")
+    parser.add_argument("--truncate", action="store_true", help="drop the compacted lines instead of archiving them")
+    args = parser.parse_args(argv)
+    try:
+        snap = compact(args.csvfile, archive=not args.truncate)
+    except (OSError, ValueError) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    if snap is None:
+        print("nothing to compact")
+        return 0
+    print(f"{snap['rows']} entries in snapshot (last id {snap['last_id']}), {len(snap['balances'])} products")
+    if args.truncate:
+        print(f"ids kept in {snap['dropped']}")
+    elif snap["archive"]:
+        print(f"archived to {snap['archive']}")
+    return 0
+
+
+if __name__ == "__main__":
+    instrument.configure(sys.argv)
+    sys.exit(main())
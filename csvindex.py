@@ -0,0 +1,188 @@
+"""
+Indice de ids para os CSV (product.csv, supplier.csv, stock.csv)
+- Guarda um ficheiro <csv>.idx ao lado do CSV com linhas: id,byte offset
+- A primeira linha do .idx tem o tamanho e o mtime do CSV que o indice cobre
+- Atualizado em cada append (record_append) e reconstruido quando o CSV muda por fora
+- Se outro processo acrescentou linhas (e ao .idx), load() so le as entradas novas do .idx
+- lookup(csv, id) faz um seek em vez de ler o ficheiro todo
+"""
+
+import csv
+import os
+
+import instrument
+
+HEADER_SIZE = 42  # "%020d,%020d\n"
+
+# cache em memoria: caminho do csv -> (stamp, {id: offset}, (inode, bytes lidos) do .idx)
+_cache = {}
+
+
+def index_path(csvfile):
+    return csvfile + ".idx"
+
+
+def stamp(csvfile):
+    # (tamanho, mtime) do CSV ou None se nao existir
+    try:
+        st = os.stat(csvfile)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def first_field(raw):
+    # raw: linha em bytes tal como esta no ficheiro
+    line = decode_line(raw)
+    if not line:
+        return ""
+    if line.startswith('"'):
+        # linha escrita pelo csv.writer (suppliergui) com o id entre aspas
+        for row in csv.reader([line]):
+            return row[0] if row else ""
+    return line.split(",", 1)[0]
+
+
+def _header(st):
+    return b"%020d,%020d\n" % st
+
+
+def _read_header(fh):
+    head = fh.read(HEADER_SIZE)
+    if len(head) != HEADER_SIZE:
+        return None
+    try:
+        size, mtime = head.rstrip(b"\n").split(b",")
+        return (int(size), int(mtime))
+    except ValueError:
+        return None
+
+
+def build(csvfile):
+    """Le o CSV uma vez e escreve o indice completo"""
+    index = {}
+    st = stamp(csvfile)
+    if st is None:
+        return index
+    entries = []
+    offset = 0
+    with open(csvfile, "rb") as fh:
+        for raw in fh:
+            key = first_field(raw)
+            if key and key not in index:
+                index[key] = offset
+                entries.append(b"%s,%d\n" % (key.encode("utf-8"), offset))
+            offset += len(raw)
+    # o ficheiro pode ter mudado durante a leitura: guardar o que foi lido
+    st = (offset, st[1]) if offset != st[0] else st
+    tmp = index_path(csvfile) + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(_header(st))
+        fh.writelines(entries)
+    os.replace(tmp, index_path(csvfile))
+    _cache[os.path.abspath(csvfile)] = (st, index, _position(index_path(csvfile)))
+    return index
+
+
+def _position(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size)
+
+
+def _read_entries(fh, index):
+    for raw in fh:
+        key, _, off = raw.rstrip(b"\n").rpartition(b",")
+        index.setdefault(key.decode("utf-8"), int(off))
+
+
+def load(csvfile):
+    """Devolve o dict id -> offset, reconstruindo se o CSV mudou"""
+    st = stamp(csvfile)
+    if st is None:
+        return {}
+    cached = _cache.get(os.path.abspath(csvfile))
+    if cached and cached[0] == st:
+        return cached[1]
+    try:
+        with open(index_path(csvfile), "rb") as fh:
+            if _read_header(fh) != st:
+                return build(csvfile)
+            ino = os.fstat(fh.fileno()).st_ino
+            if cached and cached[2] and cached[2][0] == ino:
+                # o mesmo .idx com mais entradas no fim: so essas sao lidas
+                index = cached[1]
+                fh.seek(cached[2][1])
+            else:
+                index = {}
+            _read_entries(fh, index)
+            position = (ino, fh.tell())
+    except (OSError, ValueError):
+        return build(csvfile)
+    _cache[os.path.abspath(csvfile)] = (st, index, position)
+    return index
+
+
+def record_append(csvfile, key, before):
+    """
+    Chamar depois de acrescentar uma linha ao CSV.
+    before: stamp(csvfile) tirado antes do append (o offset da nova linha e before[0]).
+    Se o indice nao estava em dia antes do append nao faz nada (load reconstroi).
+    """
+    if before is not None:
+        record_appends(csvfile, [(key, before[0])], before)
+
+
+def record_appends(csvfile, entries, before):
+    """Como record_append mas para varias linhas: entries = [(id, offset), ...]"""
+    after = stamp(csvfile)
+    entries = [(key, offset) for key, offset in entries if key]
+    if not entries or before is None or after is None:
+        return
+    path = index_path(csvfile)
+    try:
+        with open(path, "r+b") as fh:
+            if _read_header(fh) != before:
+                return
+            fh.seek(0, 2)
+            fh.writelines(b"%s,%d\n" % (key.encode("utf-8"), offset) for key, offset in entries)
+            position = (os.fstat(fh.fileno()).st_ino, fh.tell())
+            fh.seek(0)
+            fh.write(_header(after))
+    except OSError:
+        return
+    cached = _cache.get(os.path.abspath(csvfile))
+    if cached and cached[0] == before:
+        for key, offset in entries:
+            cached[1].setdefault(key, offset)
+        _cache[os.path.abspath(csvfile)] = (after, cached[1], position)
+
+
+def decode_line(raw):
+    return raw.decode("utf-8", errors="replace").lstrip("\ufeff").rstrip("\r\n")
+
+
+def unquote_line(line):
+    # linha com aspas (csv.writer): juntar os campos como o suppliergui mostra
+    for row in csv.reader([line]):
+        return ",".join(row)
+    return line
+
+
+def lookup(csvfile, key):
+    """Linha do CSV com este id (ou None)"""
+    for attempt in range(2):
+        offset = load(csvfile).get(key)
+        if offset is None:
+            return None
+        with open(csvfile, "rb") as fh:
+            fh.seek(offset)
+            raw = fh.readline()
+        instrument.add(bytes=len(raw), rows=1)
+        if first_field(raw) == key:
+            return decode_line(raw)
+        # indice desatualizado (ficheiro editado por fora com o mesmo tamanho)
+        build(csvfile)
+    return None
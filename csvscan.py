@@ -0,0 +1,271 @@
+"""
+Leitura em streaming dos CSV grandes
+- iter_chunks le blocos de CHUNK_SIZE bytes sempre cortados no fim de uma linha
+- iter_lines / iter_matches sao geradores: a memoria usada nao depende do tamanho do ficheiro
+- iter_matches procura o termo no bloco inteiro (bytes.find) e so depois recorta a linha
+- Se existir o indice de trigramas (<csv>.tri) so as linhas candidatas sao lidas
+- Sem indice, os ficheiros grandes sao lidos por varios processos (parallel.py)
+- Tail / LineRows.refresh leem so os bytes acrescentados desde a ultima leitura
+"""
+
+import csv
+import os
+from array import array
+
+import csvindex
+import instrument
+import parallel
+import trigram
+
+CHUNK_SIZE = 1 << 20
+CHECK_SIZE = 64  # bytes antes do offset usados para ver se o inicio do ficheiro mudou
+REFRESH_BYTES = 4 << 20  # refresh incremental no maximo com isto de dados novos
+
+
+def iter_chunks(csvfile, start=0, end=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Gera (offset, bytes) com linhas completas; o ultimo bloco pode nao acabar em \\n.
+    progress(feito, total) e chamado antes de cada leitura (bytes).
+    """
+    if not os.path.exists(csvfile):
+        return
+    with open(csvfile, "rb") as fh:
+        fh.seek(start)
+        offset = start
+        carry = b""
+        total = (end if end is not None else os.fstat(fh.fileno()).st_size) - start
+        while True:
+            if progress:
+                progress(offset + len(carry) - start, total)
+            size = chunk_size if end is None else min(chunk_size, end - offset - len(carry))
+            data = fh.read(size) if size > 0 else b""
+            instrument.add(bytes=len(data))
+            if not data:
+                if carry:
+                    instrument.add(rows=1)
+                    yield offset, carry
+                return
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                carry = data
+                continue
+            carry = data[cut:]
+            chunk = data[:cut]
+            instrument.add(rows=chunk.count(b"\n"))
+            yield offset, chunk
+            offset += cut
+
+
+def line_offsets(csvfile, start=0, offsets=None, progress=None):
+    """
+    Offsets (array de inteiros) do inicio de cada linha a partir de start.
+    Devolve (offsets, fim); se a ultima linha nao acaba em \n tambem fica no array.
+    """
+    if offsets is None:
+        offsets = array("Q")
+    end = start
+    for offset, chunk in iter_chunks(csvfile, start, progress=progress):
+        pos = 0
+        size = len(chunk)
+        while pos < size:
+            offsets.append(offset + pos)
+            nl = chunk.find(b"\n", pos)
+            pos = size if nl == -1 else nl + 1
+        end = offset + size
+    return offsets, end
+
+
+class Tail:
+    """
+    Onde ficou a leitura de um csv: offset (fim da ultima linha completa), inode e mtime.
+    status() diz se o ficheiro esta igual, cresceu, ou foi truncado/substituido.
+    """
+
+    def __init__(self, csvfile, offset=0):
+        self.csvfile = csvfile
+        self.offset = offset
+        self.ident = None
+        self.mtime = None
+        self.check = b""
+        self.mark(offset)
+
+    def mark(self, offset):
+        self.offset = offset
+        try:
+            with open(self.csvfile, "rb") as fh:
+                st = os.fstat(fh.fileno())
+                self.ident = (st.st_dev, st.st_ino)
+                self.mtime = st.st_mtime_ns if st.st_size == offset else None
+                self.check = _check_bytes(fh, offset)
+        except OSError:
+            self.ident = None
+            self.mtime = None
+            self.check = b""
+
+    def size(self):
+        try:
+            return os.stat(self.csvfile).st_size
+        except OSError:
+            return 0
+
+    def status(self):
+        """"same", "grown" ou "reset" (truncado, substituido ou reescrito)"""
+        try:
+            fh = open(self.csvfile, "rb")
+        except OSError:
+            return "same" if self.offset == 0 else "reset"
+        with fh:
+            st = os.fstat(fh.fileno())
+            if self.ident is not None and (st.st_dev, st.st_ino) != self.ident:
+                return "reset"
+            if st.st_size < self.offset:
+                return "reset"
+            if st.st_size == self.offset:
+                # mesmo tamanho mas mtime diferente: reescrito
+                return "same" if st.st_mtime_ns == self.mtime else "reset"
+            if _check_bytes(fh, self.offset) != self.check:
+                return "reset"
+            return "grown"
+
+    def read(self):
+        """Bytes das linhas completas acrescentadas desde offset (avanca o offset); None se reset"""
+        status = self.status()
+        if status == "reset":
+            return None
+        data = b""
+        if status == "grown":
+            with open(self.csvfile, "rb") as fh:
+                fh.seek(self.offset)
+                data = fh.read()
+            data = data[:data.rfind(b"\n") + 1]
+        self.mark(self.offset + len(data))
+        return data
+
+
+def _check_bytes(fh, offset):
+    start = max(0, offset - CHECK_SIZE)
+    fh.seek(start)
+    return fh.read(offset - start)
+
+
+def end_of_lines(csvfile):
+    """Offset logo a seguir ao ultimo \n (le o ficheiro de tras para a frente)"""
+    try:
+        fh = open(csvfile, "rb")
+    except OSError:
+        return 0
+    with fh:
+        pos = os.fstat(fh.fileno()).st_size
+        while pos > 0:
+            start = max(0, pos - CHUNK_SIZE)
+            fh.seek(start)
+            nl = fh.read(pos - start).rfind(b"\n")
+            if nl != -1:
+                return start + nl + 1
+            pos = start
+        return 0
+
+
+class LineRows:
+    """Linhas do csv por numero (offsets de line_offsets): fonte de linhas do tableview.CsvTable"""
+
+    def __init__(self, csvfile, offsets, end):
+        self.csvfile = csvfile
+        self.offsets = offsets
+        self.end = end
+        self._set_tail()
+
+    def _set_tail(self):
+        # a ultima linha pode ainda nao ter \n: volta a ser lida no proximo refresh
+        self.complete = len(self.offsets)
+        complete_end = self.end
+        if self.offsets:
+            with open(self.csvfile, "rb") as fh:
+                fh.seek(self.end - 1)
+                if fh.read(1) != b"\n":
+                    self.complete -= 1
+                    complete_end = self.offsets[-1]
+        self.tail = Tail(self.csvfile, complete_end)
+
+    def total(self):
+        return len(self.offsets)
+
+    def refresh(self, max_bytes=REFRESH_BYTES):
+        """
+        Acrescenta as linhas novas (so le os bytes novos).
+        False se for preciso ler tudo de novo: truncado, substituido ou mais de max_bytes novos.
+        """
+        status = self.tail.status()
+        if status == "same":
+            return True
+        if status == "reset" or self.tail.size() - self.tail.offset > max_bytes:
+            return False
+        del self.offsets[self.complete:]
+        self.offsets, self.end = line_offsets(self.csvfile, self.tail.offset, self.offsets)
+        self._set_tail()
+        return True
+
+    def rows(self, start, stop):
+        rows = []
+        if start >= stop:
+            return rows
+        with open(self.csvfile, "rb") as fh:
+            fh.seek(self.offsets[start])
+            for _ in range(stop - start):
+                raw = fh.readline()
+                if not raw:
+                    break
+                rows.append(next(csv.reader([csvindex.decode_line(raw)]), []))
+                instrument.add(bytes=len(raw), rows=1)
+        return rows
+
+
+def iter_lines(csvfile, start=0, end=None, progress=None):
+    """Gera (offset, linha em bytes) sem carregar o ficheiro todo"""
+    for offset, chunk in iter_chunks(csvfile, start, end, progress=progress):
+        for raw in chunk.splitlines(keepends=True):
+            yield offset, raw
+            offset += len(raw)
+
+
+def iter_matches(csvfile, term, ignore_case=True, unquote=False, progress=None):
+    """
+    Gera as linhas (str, sem \\n) que contem term.
+    ignore_case=False mantem o comportamento das CLI (str.find).
+    unquote=True compara e devolve as linhas com aspas ja interpretadas pelo csv.
+    """
+    hits = trigram.search(csvfile, term, ignore_case, unquote, progress)
+    if hits is None:
+        # ficheiros grandes: varios processos (parallel.py), cada um com um bloco de linhas
+        hits = parallel.search(csvfile, term, ignore_case, unquote, progress)
+    if hits is None:
+        hits = scan_matches(csvfile, term, ignore_case, unquote, progress=progress)
+    yield from hits
+
+
+def scan_matches(csvfile, term, ignore_case=True, unquote=False, start=0, end=None, progress=None):
+    """iter_matches sem indices, so entre os bytes start e end (alinhados no inicio de linhas)"""
+    needle = term.lower() if ignore_case else term
+    try:
+        bneedle = needle.encode("ascii")
+    except UnicodeEncodeError:
+        bneedle = None
+    for offset, chunk in iter_chunks(csvfile, start, end, progress=progress):
+        if bneedle is None or not bneedle or (unquote and b'"' in chunk):
+            # caminho lento: linha a linha
+            for raw in chunk.splitlines(keepends=True):
+                line = csvindex.decode_line(raw)
+                if unquote and '"' in line:
+                    line = csvindex.unquote_line(line)
+                if needle in (line.lower() if ignore_case else line):
+                    yield line
+            continue
+        hay = chunk.lower() if ignore_case else chunk
+        pos = hay.find(bneedle)
+        while pos != -1:
+            line_start = hay.rfind(b"\n", 0, pos) + 1
+            line_end = hay.find(b"\n", pos)
+            line_end = len(hay) if line_end == -1 else line_end + 1
+            yield csvindex.decode_line(chunk[line_start:line_end])
+            pos = hay.find(bneedle, line_end)
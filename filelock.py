@@ -0,0 +1,69 @@
+"""
+Lock exclusivo (advisory) para escrever nos CSV partilhados
+- Usa um ficheiro <csv>.lock ao lado do CSV: fcntl.flock no Linux/macOS, msvcrt.locking no Windows
+- Todos os appends (storage.append_rows) e a atualizacao dos indices (.idx/.tri) sao feitos com o lock
+- O lock e do processo todo: varias threads do mesmo processo esperam umas pelas outras
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+RETRY_DELAY = 0.005
+
+# locks por ficheiro dentro deste processo (flock nao exclui threads com outro fd)
+_thread_locks = {}
+_guard = threading.Lock()
+
+
+def lock_path(csvfile):
+    return csvfile + ".lock"
+
+
+def _thread_lock(csvfile):
+    key = os.path.abspath(csvfile)
+    with _guard:
+        return _thread_locks.setdefault(key, threading.Lock())
+
+
+def _acquire(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(RETRY_DELAY)
+
+
+def _release(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked(csvfile):
+    """with locked("stock.csv"): ... (espera pelos outros processos/threads)"""
+    with _thread_lock(csvfile):
+        fd = os.open(lock_path(csvfile), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            _acquire(fd)
+            try:
+                yield
+            finally:
+                _release(fd)
+        finally:
+            os.close(fd)
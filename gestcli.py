@@ -0,0 +1,273 @@
+"""
+Interface de linha de comandos sem menu (para scripts e pipelines)
+- product.py / supplier.py / stock.py com argumentos usam isto; sem argumentos abrem o menu
+      python product.py add 12 "Parafuso" 000000001 "caixa de 100"
+      python product.py list
+      python product.py report name:parafuso
+      python product.py find 12
+      python stock.py group product_id --sum units --top 20   (agrupamento, aggregate.py)
+      python stock.py movements --since 7d                    (por hora gravada, timeline.py)
+      python stock.py summary --period week --since 2026-01-01
+      python product.py import novos.jsonl
+      python product.py export copia.csv
+      python stock.py --batch operacoes.txt      (ou - para o stdin)
+- Ou diretamente: python gestcli.py product list
+- Os resultados vao para o stdout linha a linha; erros e resumos para o stderr
+- --batch: um comando por linha (como os de cima, sem o nome do script), tudo no mesmo processo;
+  os add seguidos sao escritos juntos com storage.append_rows (um lock e um write por lote);
+  os erros saem pela ordem das linhas, cada um numa linha curta ("line 5: ...")
+- Codigo de saida 1 se algum comando falhou
+"""
+
+import argparse
+import os
+import shlex
+import sys
+
+import aggregate
+import bulkimport
+import instrument
+import storage
+import timeline
+
+BATCH_SIZE = storage.BATCH_SIZE
+
+
+class CommandError(ValueError):
+    """Linha do --batch que o argparse nao aceita"""
+
+
+class BatchParser(argparse.ArgumentParser):
+    # no --batch um comando invalido e so um erro dessa linha: sem o usage e sem sair
+    def error(self, message):
+        raise CommandError(f"{self.prog}: {message}")
+
+
+class Session:
+    """Estado de uma execucao: kind, csv, onde escrever e os add ainda por gravar"""
+
+    def __init__(self, kind, csvfile=None, out=None, err=None):
+        self.kind = kind
+        self.csvfile = storage.path(kind, csvfile)
+        self.out = out or sys.stdout
+        self.err = err or sys.stderr
+        self.pending = []  # (numero da linha, valores)
+        self.failed = 0
+
+    def error(self, where, message):
+        self.failed += 1
+        self.err.write(f"{where}: {message}\n" if where else f"{message}\n")
+
+    def add(self, values, where=None):
+        self.pending.append((where, values))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Grava os add pendentes num so append_rows"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        result = storage.append_rows(self.kind, [values for _, values in pending], self.csvfile)
+        for n, message in result.rejected:
+            self.error(pending[n - 1][0], message)
+
+    def list(self):
+        self.flush()
+        write = self.out.write
+        for text in storage.iter_text(self.kind, self.csvfile):
+            write(text)
+
+    def report(self, text, ignore_case=False):
+        self.flush()
+        write = self.out.write
+        for line in storage.query(self.kind, text, self.csvfile, ignore_case):
+            write(line.rstrip("\r\n") + "\n")
+
+    def find(self, record_id, where=None):
+        self.flush()
+        line = storage.find(self.kind, record_id, self.csvfile)
+        if line is None:
+            self.error(where, f"{record_id}: not found")
+        else:
+            self.out.write(line.rstrip("\r\n") + "\n")
+
+    def group(self, field, total=None, n=None):
+        """grupo,linhas[,soma] por grupo; com n so os n maiores (pela soma, se houver)"""
+        self.flush()
+        groups = aggregate.group(self.kind, field, total, self.csvfile)
+        write = self.out.write
+        for row in aggregate.rows(groups, n, by_sum=bool(total), with_sum=bool(total)):
+            write(",".join(str(v) for v in row) + "\n")
+
+    def movements(self, since=None, until=None):
+        self.flush()
+        write = self.out.write
+        for line in storage.movements(timeline.parse_time(since), timeline.parse_time(until), self.csvfile):
+            write(line + "\n")
+
+    def summary(self, period="day", since=None, until=None):
+        """periodo,movimentos,entradas,saidas,liquido"""
+        self.flush()
+        rows = aggregate.by_period(timeline.parse_time(since), timeline.parse_time(until), period, self.csvfile)
+        for row in rows:
+            self.out.write(",".join(str(v) for v in row) + "\n")
+
+    def import_file(self, source, fmt=None, fsync="end"):
+        self.flush()
+        rows = bulkimport.read_rows(source, fmt)
+        result = storage.append_rows(self.kind, rows, self.csvfile, fsync=fsync)
+        for n, message in result.rejected:
+            self.error(f"{source} row {n}", message)
+        self.err.write(f"{result.written} rows written, {len(result.rejected)} rejected\n")
+
+    def export_file(self, target):
+        self.flush()
+        if target == "-":
+            self.list()
+            return
+        with open(target, "w", encoding=storage.ENCODING, newline="") as fh:
+            for text in storage.iter_text(self.kind, self.csvfile):
+                fh.write(text)
+
+
+def _query_text(words):
+    # um argumento passa tal como esta; varios voltam a ter as aspas (para o query.py)
+    return words[0] if len(words) == 1 else shlex.join(words)
+
+
+def build_parser(kind, batch=False):
+    labels = storage.DATASETS[kind].labels
+    parser_class = BatchParser if batch else argparse.ArgumentParser
+    parser = parser_class(prog=f"{kind}.py" if not batch else kind, add_help=not batch,
+                          description=f"Non-interactive commands for {kind}.csv")
+    if not batch:
+        parser.add_argument("--csv", dest="csvfile", help=f"data file (default {storage.DATASETS[kind].file})")
+        parser.add_argument("--batch", metavar="FILE", help="read one command per line from FILE (- for stdin)")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("add", help="append one record")
+    p.add_argument("values", nargs="*", help=", ".join(labels))
+    sub.add_parser("list", help="print every line")
+    p = sub.add_parser("report", help="search (text or fields, ex: name:ibm units>=5)")
+    p.add_argument("-i", "--ignore-case", action="store_true")
+    p.add_argument("words", nargs="+")
+    p = sub.add_parser("find", help="print the record with this id")
+    p.add_argument("id")
+    p = sub.add_parser("group", help="rows (and a sum) per value of a field, ex: group supplier_id --top 20")
+    p.add_argument("field")
+    p.add_argument("--sum", dest="total", metavar="FIELD", help="also add up this field (e.g. units)")
+    p.add_argument("--top", type=int, metavar="N", help="only the N largest groups (by the sum, if given)")
+    if storage.DATASETS[kind].stamped:
+        since = "from this time, e.g. 7d, 12h, today, 2026-10-01 (local) or 2026-10-01T08:00:00Z"
+        p = sub.add_parser("movements", help="print the movements between two times")
+        p.add_argument("--since", help=since)
+        p.add_argument("--until", help="up to (not including) this time")
+        p = sub.add_parser("summary", help="movements, received, issued and net per period")
+        p.add_argument("--period", choices=timeline.PERIODS, default="day", help="UTC periods")
+        p.add_argument("--since", help=since)
+        p.add_argument("--until", help="up to (not including) this time")
+    p = sub.add_parser("import", help="append the rows of a CSV or JSONL file (- for stdin)")
+    p.add_argument("source")
+    p.add_argument("--format", choices=["csv", "jsonl"])
+    p.add_argument("--fsync", choices=["batch", "end", "none"], default="end")
+    p = sub.add_parser("export", help="write the data as CSV (- for stdout)")
+    p.add_argument("target", nargs="?", default="-")
+    return parser
+
+
+def run(session, args, where=None):
+    """Executa um comando ja interpretado pelo argparse"""
+    if args.command == "add":
+        session.add(args.values, where)
+    elif args.command == "list":
+        session.list()
+    elif args.command == "report":
+        session.report(_query_text(args.words), args.ignore_case)
+    elif args.command == "find":
+        session.find(args.id, where)
+    elif args.command == "group":
+        session.group(args.field, args.total, args.top)
+    elif args.command == "movements":
+        session.movements(args.since, args.until)
+    elif args.command == "summary":
+        session.summary(args.period, args.since, args.until)
+    elif args.command == "import":
+        session.import_file(args.source, args.format, args.fsync)
+    elif args.command == "export":
+        session.export_file(args.target)
+
+
+def _split(line):
+    # sem aspas nem escapes basta o split (o shlex e bem mais lento)
+    if '"' in line or "'" in line or "\\" in line:
+        return shlex.split(line)
+    return line.split()
+
+
+def run_batch(session, lines):
+    """Um comando por linha (linhas vazias e comecadas por # sao ignoradas)"""
+    parser = build_parser(session.kind, batch=True)
+
+    def fail(where, message):
+        # grava antes os add anteriores: os erros deles saem primeiro
+        session.flush()
+        session.error(where, message)
+
+    for n, line in enumerate(lines, 1):
+        where = f"line {n}"
+        try:
+            words = _split(line)
+        except ValueError as ex:
+            fail(where, ex)
+            continue
+        if not words or words[0].startswith("#"):
+            continue
+        try:
+            if words[0] == "add":
+                # caminho rapido: os add sao a maior parte de um batch
+                session.add(words[1:], where)
+                continue
+            try:
+                args = parser.parse_args(words)
+            except SystemExit:
+                fail(where, f"invalid command: {line.strip()}")
+                continue
+            run(session, args, where)
+        except (OSError, ValueError) as ex:
+            fail(where, ex)
+    session.flush()
+
+
+def main(kind, argv=None, csvfile=None):
+    """Ponto de entrada dos scripts (argv sem o nome do programa); devolve o codigo de saida"""
+    parser = build_parser(kind)
+    args = parser.parse_args(argv)
+    if not args.command and not args.batch:
+        parser.error("a command or --batch is required")
+    session = Session(kind, args.csvfile or csvfile)
+    try:
+        if args.batch:
+            if args.batch == "-":
+                run_batch(session, sys.stdin)
+            else:
+                with open(args.batch, "r", encoding="utf-8") as fh:
+                    run_batch(session, fh)
+        else:
+            try:
+                run(session, args)
+                session.flush()
+            except (OSError, ValueError) as ex:
+                session.error(None, ex)
+        session.out.flush()
+    except BrokenPipeError:
+        # ex: | head: o resto da saida ja nao interessa (e o flush no fim nao pode falhar)
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 1 if session.failed else 0
+
+
+if __name__ == "__main__":
+    instrument.configure(sys.argv)
+    if len(sys.argv) < 2 or sys.argv[1] not in storage.DATASETS:
+        print(f"usage: gestcli.py {{{','.join(sorted(storage.DATASETS))}}} command ...", file=sys.stderr)
+        sys.exit(2)
+    sys.exit(main(sys.argv[1], sys.argv[2:]))
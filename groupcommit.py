@@ -0,0 +1,103 @@
+"""
+Group commit para os appends de um registo (storage.append)
+- submit() valida o registo logo (ValueError) e poe-no numa fila
+- Uma thread grava os registos com um so storage.append_rows por ficheiro:
+  um lock, um write e um flush para o grupo
+- Um registo sozinho e gravado logo; se houver mais na fila (varias threads a gravar)
+  espera ate WINDOW segundos para juntar os que ainda estao a chegar
+- wait() espera que o grupo esteja gravado (e volta a lancar o erro da escrita, se houver;
+  ValueError se o registo foi recusado na escrita, ex: id repetido)
+"""
+
+import queue
+import threading
+import time
+
+import storage
+
+WINDOW = 0.01  # segundos
+MAX_ROWS = storage.BATCH_SIZE
+
+
+class Pending:
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+    def done(self, error=None):
+        self.error = error
+        self.event.set()
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise TimeoutError("group commit did not finish in time")
+        if self.error is not None:
+            raise self.error
+
+
+class GroupWriter:
+    def __init__(self, window=WINDOW, fsync="none", max_rows=MAX_ROWS):
+        self.window = window
+        self.fsync = fsync
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, values, csvfile=None):
+        vals, error = storage.clean(kind, values)
+        if error:
+            raise ValueError(error)
+        pending = Pending()
+        self.queue.put((kind, storage.path(kind, csvfile), vals, pending))
+        return pending
+
+    def _drain(self, items):
+        while len(items) < self.max_rows:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _collect(self):
+        items = [self.queue.get()]
+        self._drain(items)
+        if len(items) == 1:
+            return items
+        deadline = time.monotonic() + self.window
+        while len(items) < self.max_rows:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            groups = {}  # (kind, csv) -> [(vals, pending)], pela ordem de chegada
+            for kind, csvfile, vals, pending in self._collect():
+                groups.setdefault((kind, csvfile), []).append((vals, pending))
+            for (kind, csvfile), items in groups.items():
+                try:
+                    result = storage.append_rows(kind, [vals for vals, _ in items], csvfile, fsync=self.fsync)
+                    errors = {n: ValueError(message) for n, message in result.rejected}
+                except Exception as ex:
+                    errors = dict.fromkeys(range(1, len(items) + 1), ex)
+                for n, (_, pending) in enumerate(items, 1):
+                    pending.done(errors.get(n))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer():
+    """O GroupWriter partilhado deste processo (criado na primeira chamada)"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = GroupWriter()
+        return _writer
@@ -0,0 +1,236 @@
+"""
+Medicao das operacoes do storage (ensure_file, list, search, find, append, ...)
+- Cada operacao gera um Measure: tempo, bytes lidos/escritos, linhas lidas e resultados
+- O codigo que le os ficheiros chama instrument.add(bytes=..., rows=...) e o valor vai
+  para a operacao ativa nessa thread (se nao houver nenhuma nao faz nada)
+- Nas operacoes que devolvem um gerador o tempo so conta enquanto o gerador esta a correr
+- HISTORY guarda as ultimas operacoes (resumo nos GUIs: summary / rolling)
+- Ativar com GEST_PROFILE ou --profile (nos seis scripts):
+      json[:ficheiro]      uma linha JSON por operacao (por omissao gest-ops.jsonl)
+      cprofile[:ficheiro]  dump do cProfile no fim (por omissao gest.prof); --profile sozinho
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+HISTORY_SIZE = 200
+JSON_FILE = "gest-ops.jsonl"
+PROFILE_FILE = "gest.prof"
+
+HISTORY = deque(maxlen=HISTORY_SIZE)
+_local = threading.local()
+_lock = threading.Lock()
+_json_path = None
+_profile_path = None
+_profiles = []
+
+
+class Measure:
+    def __init__(self, op, kind=None):
+        self.op = op
+        self.kind = kind
+        self.seconds = 0.0
+        self.bytes = 0
+        self.rows = 0
+        self.matches = 0
+        self.error = None
+        self.started = time.time()
+
+    def as_dict(self):
+        return {"op": self.op, "kind": self.kind, "ms": round(self.seconds * 1000, 3), "bytes": self.bytes,
+                "rows": self.rows, "matches": self.matches, "error": self.error, "time": self.started}
+
+    def __repr__(self):
+        return f"Measure({self.op!r}, {self.kind!r}, {self.seconds * 1000:.1f} ms, rows={self.rows})"
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def add(bytes=0, rows=0, matches=0):
+    """Soma aos contadores da operacao ativa nesta thread"""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        m = stack[-1]
+        m.bytes += bytes
+        m.rows += rows
+        m.matches += matches
+
+
+@contextmanager
+def active(m):
+    """with active(m): os add() desta thread vao para m (sem o guardar no HISTORY)"""
+    stack = _stack()
+    stack.append(m)
+    t = time.perf_counter()
+    try:
+        yield m
+    finally:
+        m.seconds += time.perf_counter() - t
+        stack.pop()
+
+
+def _finish(m):
+    HISTORY.append(m)
+    collected = getattr(_local, "collected", None)
+    if collected is not None:
+        collected.append(m)
+    if _json_path:
+        line = json.dumps(m.as_dict())
+        with _lock, open(_json_path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+def _measure_iter(m, items):
+    # o mesmo que active a volta de cada next(), sem o custo do contextmanager por linha
+    it = iter(items)
+    stack = _stack()
+    clock = time.perf_counter
+    try:
+        while True:
+            stack.append(m)
+            t = clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                m.seconds += clock() - t
+                stack.pop()
+            m.matches += 1
+            yield item
+    except Exception as ex:
+        m.error = repr(ex)
+        raise
+    finally:
+        _finish(m)
+
+
+def operation(op, kind=None):
+    """Decorador para as funcoes do storage: o kind e o primeiro argumento (se nao for dado aqui)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            m = Measure(op, kind or (args[0] if args else kw.get("kind")))
+            try:
+                with active(m):
+                    result = fn(*args, **kw)
+            except Exception as ex:
+                m.error = repr(ex)
+                _finish(m)
+                raise
+            if isinstance(result, Iterator):
+                return _measure_iter(m, result)
+            _finish(m)
+            return result
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def collect():
+    """with collect() as ops: ... guarda em ops as operacoes terminadas nesta thread"""
+    previous = getattr(_local, "collected", None)
+    ops = _local.collected = []
+    try:
+        yield ops
+    finally:
+        _local.collected = previous
+
+
+def summary(ops):
+    """Texto curto, ex: "12,345 rows scanned in 84 ms" """
+    if not ops:
+        return ""
+    rows = sum(m.rows for m in ops)
+    ms = sum(m.seconds for m in ops) * 1000
+    text = f"{rows:,} rows scanned in {ms:.0f} ms"
+    matches = sum(m.matches for m in ops if m.op in ("search", "find"))
+    if any(m.op in ("search", "find") for m in ops):
+        text += f", {matches:,} matches"
+    return text
+
+
+def rolling(op, kind=None):
+    """(numero de operacoes, media em ms) das ultimas operacoes op no HISTORY"""
+    times = [m.seconds for m in list(HISTORY) if m.op == op and (kind is None or m.kind == kind)]
+    if not times:
+        return 0, 0.0
+    return len(times), sum(times) / len(times) * 1000
+
+
+# --- perfil (cProfile) ---
+
+@contextmanager
+def profiled():
+    """Perfil do bloco (ex: uma thread de trabalho dos GUIs), junto ao dump final"""
+    if not _profile_path:
+        yield
+        return
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:
+        # Python 3.12+: so um profiler ativo, e o da thread principal ja ve todas as threads
+        yield
+        return
+    try:
+        yield
+    finally:
+        prof.disable()
+        with _lock:
+            _profiles.append(prof)
+
+
+def _dump_profile():
+    with _lock:
+        profiles = list(_profiles)
+    for prof in profiles:
+        prof.disable()
+    if profiles:
+        stats = pstats.Stats(profiles[0])
+        for prof in profiles[1:]:
+            stats.add(prof)
+        stats.dump_stats(_profile_path)
+
+
+def enable(mode):
+    """mode: "json[:ficheiro]" ou "cprofile[:ficheiro]" (vazio = cprofile)"""
+    global _json_path, _profile_path
+    name, _, target = (mode or "cprofile").partition(":")
+    if name == "json":
+        _json_path = target or JSON_FILE
+    elif name == "cprofile":
+        if _profile_path:
+            return
+        _profile_path = target or PROFILE_FILE
+        # a thread principal fica com perfil ate ao fim do processo
+        prof = cProfile.Profile()
+        _profiles.append(prof)
+        prof.enable()
+        atexit.register(_dump_profile)
+    else:
+        raise ValueError(f"unknown profile mode {mode!r} (expected json or cprofile)")
+
+
+def configure(argv):
+    """Le GEST_PROFILE e tira --profile / --profile=modo de argv"""
+    if os.environ.get("GEST_PROFILE"):
+        enable(os.environ["GEST_PROFILE"])
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            argv.remove(arg)
+            enable(arg.partition("=")[2])
@@ -0,0 +1,54 @@
+"""
+Relatorios que juntam product.csv, supplier.csv e stock.csv (hash join)
+- Constroi um dict com o ficheiro mais pequeno e le o maior em streaming
+- Uma passagem por ficheiro, sem ciclos dentro de ciclos
+- products_with_supplier: id,name,supplier id,supplier name,about
+- stock_by_supplier: supplier id,supplier name,units (saldos do stock.csv)
+- REPORTS inclui tambem os relatorios de agrupamento / top N do aggregate.py
+"""
+
+import aggregate
+import storage
+
+
+def _names(kind, csvfile=None):
+    # id -> name (fica em memoria so o lado pequeno do join)
+    return {rec.id: rec.name for rec in storage.iter_records(kind, csvfile)}
+
+
+def products_with_supplier(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Gera (id, name, supplier id, supplier name, about); supplier name vazio se nao existir"""
+    # stock_file nao e usado: todos os relatorios aceitam os mesmos ficheiros
+    suppliers = _names("supplier", supplier_file)
+    for rec in storage.iter_records("product", product_file, progress=progress):
+        yield (rec.id, rec.name, rec.supplier_id, suppliers.get(rec.supplier_id, ""), rec.about)
+
+
+def stock_by_supplier(product_file=None, supplier_file=None, stock_file=None, progress=None):
+    """Lista de (supplier id, supplier name, units) ordenada por supplier id"""
+    # stock.csv e o maior: os saldos por produto (ledger, incremental) sao o dict pequeno
+    units = dict(storage.balances(stock_file, progress=progress))
+    totals = {}
+    for rec in storage.iter_records("product", product_file):
+        if rec.id in units:
+            totals[rec.supplier_id] = totals.get(rec.supplier_id, 0) + units.pop(rec.id)
+    suppliers = _names("supplier", supplier_file)
+    rows = [(sid, suppliers.get(sid, ""), total) for sid, total in totals.items()]
+    if units:
+        # stock de produtos que nao existem no product.csv
+        rows.append(("", "(unknown product)", sum(units.values())))
+    rows.sort()
+    return rows
+
+
+REPORTS = {
+    "products with supplier name": products_with_supplier,
+    "stock on hand by supplier": stock_by_supplier,
+    **aggregate.REPORTS,
+}
+
+
+def run(name, progress=None, **files):
+    """Linhas de texto (csv) do relatorio name (uma das chaves de REPORTS)"""
+    for row in REPORTS[name](progress=progress, **files):
+        yield ",".join(str(v) for v in row)
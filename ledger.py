@@ -0,0 +1,200 @@
+"""
+Saldos do stock a partir do ledger stock.csv (linhas: id entrada,id produto,unidades)
+- balances(csv) le o ficheiro uma vez e devolve {id produto: unidades}
+- Modo incremental: guarda em <csv>.bal o ultimo byte processado e os saldos,
+  na proxima chamada so le as linhas acrescentadas depois disso
+- Se o ficheiro foi truncado ou substituido volta a calcular tudo
+- Depois de compactar (compact.py) os movimentos antigos estao no snapshot <csv>.snap:
+  balances() soma o snapshot com as linhas que ficaram no csv
+"""
+
+import json
+import os
+
+import csvindex
+import csvscan
+import instrument
+import parallel
+
+CHECK_SIZE = 64  # bytes antes do offset usados para ver se o inicio do ficheiro mudou
+PROGRESS_ROWS = 10000
+
+# cache em memoria: caminho do csv -> estado
+_cache = {}
+# caminho do snapshot -> ((tamanho, mtime), snapshot)
+_snapshots = {}
+
+
+def state_path(csvfile):
+    return csvfile + ".bal"
+
+
+def snapshot_path(csvfile):
+    return csvfile + ".snap"
+
+
+def read_snapshot(csvfile):
+    """Conteudo do <csv>.snap tal como esta no disco (None se nao existir); nao alterar"""
+    path = os.path.abspath(snapshot_path(csvfile))
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            st = os.fstat(fh.fileno())
+            stamp = (st.st_size, st.st_mtime_ns)
+            cached = _snapshots.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            snap = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    _snapshots[path] = (stamp, snap)
+    return snap
+
+
+def applied(snap, csvfile):
+    """
+    True se o csv ja e o que ficou depois da compactacao do snap.
+    False se a compactacao nao chegou ao fim (o csv ainda comeca pelas linhas arquivadas).
+    """
+    try:
+        fh = open(csvfile, "rb")
+    except OSError:
+        return True
+    with fh:
+        st = os.fstat(fh.fileno())
+        if [st.st_dev, st.st_ino] == snap["ident"]:
+            return True
+        head = bytes.fromhex(snap["head"])
+        return fh.read(len(head)) != head
+
+
+def load_snapshot(csvfile):
+    """Snapshot que vale para o csv atual (ou None): saldos, last_id, rows, units, received"""
+    snap = read_snapshot(csvfile)
+    if snap is not None and not applied(snap, csvfile):
+        snap = snap.get("previous")
+    return snap
+
+
+def archive_range(csvfile):
+    """(arquivo, offset final ou None) com as linhas compactadas que ja nao estao no csv, ou None"""
+    snap = read_snapshot(csvfile)
+    if snap is None:
+        return None
+    if applied(snap, csvfile):
+        return (snap["archive"], None) if snap.get("archive") else None
+    if snap.get("archive"):
+        # compactacao interrompida: as linhas dela ainda estao no csv
+        return snap["archive"], snap["archive_start"]
+    previous = snap.get("previous")
+    return (previous["archive"], None) if previous and previous.get("archive") else None
+
+
+def parse_units(text):
+    """Unidades de um movimento (int, ou float com decimais); None se nao for um numero"""
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+def fold(balances, raw):
+    """Soma uma linha (bytes) do ledger aos saldos; devolve False se a linha for invalida"""
+    line = csvindex.decode_line(raw)
+    if not line:
+        return True
+    parts = line.split(",")
+    if len(parts) < 3:
+        return False
+    units = parse_units(parts[2])
+    if units is None:
+        return False
+    product = parts[1].strip()
+    balances[product] = balances.get(product, 0) + units
+    return True
+
+
+def _check_bytes(fh, offset):
+    start = max(0, offset - CHECK_SIZE)
+    fh.seek(start)
+    return fh.read(offset - start).hex()
+
+
+def _load_state(csvfile):
+    state = _cache.get(os.path.abspath(csvfile))
+    if state is not None:
+        return state
+    try:
+        with open(state_path(csvfile), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(csvfile, state):
+    _cache[os.path.abspath(csvfile)] = state
+    tmp = state_path(csvfile) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, state_path(csvfile))
+
+
+def balances(csvfile, incremental=True, progress=None):
+    """Unidades em stock por id de produto (snapshot + csv); progress(feito, total) em bytes"""
+    snap = load_snapshot(csvfile)
+    if not os.path.exists(csvfile):
+        return dict(snap["balances"]) if snap else {}
+    with open(csvfile, "rb") as fh:
+        state = _load_state(csvfile) if incremental else None
+        size = os.fstat(fh.fileno()).st_size
+        if state is not None:
+            offset = state["offset"]
+            if offset > size or _check_bytes(fh, offset) != state["check"]:
+                state = None
+        if state is None:
+            state = {"offset": 0, "check": "", "balances": {}, "bad": 0}
+        result = dict(state["balances"])
+        offset = state["offset"]
+        bad = state["bad"]
+        start = offset
+        rows = 0
+        # muitas linhas novas: as completas sao somadas em varios processos
+        end = csvscan.end_of_lines(csvfile)
+        part = parallel.balances(csvfile, offset, end, progress) if end > offset else None
+        if part is not None:
+            for product, units in part[0].items():
+                result[product] = result.get(product, 0) + units
+            bad += part[1]
+            offset = start = end
+        fh.seek(offset)
+        pending = b""
+        for raw in fh:
+            rows += 1
+            if progress and rows % PROGRESS_ROWS == 0:
+                progress(offset, size)
+            if not raw.endswith(b"\n"):
+                # ultima linha ainda sem fim de linha: conta mas nao fica no estado
+                pending = raw
+                break
+            if not fold(result, raw):
+                bad += 1
+            offset += len(raw)
+        if offset != state["offset"] or not incremental:
+            state["balances"] = dict(result)
+            state["bad"] = bad
+            state["offset"] = offset
+            state["check"] = _check_bytes(fh, offset)
+            _save_state(csvfile, state)
+    instrument.add(bytes=offset - start + len(pending), rows=rows)
+    if pending:
+        fold(result, pending)
+    if snap:
+        # o estado (.bal) so tem as linhas do csv: o snapshot e somado aqui
+        totals = dict(snap["balances"])
+        for product, units in result.items():
+            totals[product] = totals.get(product, 0) + units
+        result = totals
+    return result
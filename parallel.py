@@ -0,0 +1,205 @@
+"""
+Leitura de CSV grandes com varios processos (search, query e saldos do stock)
+- O ficheiro e cortado em blocos de bytes alinhados no inicio de linhas (ranges)
+- Cada bloco e lido num processo do pool; os resultados voltam pela ordem do ficheiro
+- Ficheiros com menos de PARALLEL_MIN bytes (ou so 1 CPU) ficam num so processo:
+  as funcoes devolvem None e quem chama usa o caminho normal
+- Usa fork (Linux/macOS): com spawn cada processo teria de importar outra vez o script
+  principal e os modulos; sem fork fica tudo num so processo
+- O pool e criado uma vez (na primeira leitura grande) e fica para as seguintes.
+  Um fork com outras threads a correr pode bloquear o processo filho (locks copiados
+  a meio), por isso o pool so e criado se o processo so tiver uma thread; senao
+  (ex: leituras em segundo plano nos GUIs) as funcoes devolvem None, como nos ficheiros
+  pequenos, e quem chama le em streaming (csvscan)
+- GEST_WORKERS (numero de processos) e GEST_PARALLEL_MIN (bytes) mudam os valores por omissao
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import csvindex
+import csvscan
+import instrument
+
+PARALLEL_MIN = int(os.environ.get("GEST_PARALLEL_MIN", 64 << 20))
+WORKERS = int(os.environ.get("GEST_WORKERS", 0)) or os.cpu_count() or 1
+RANGE_SIZE = 32 << 20  # maximo por bloco (memoria dos resultados de cada bloco)
+MIN_RANGE = 1 << 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def _can_fork():
+    # o fork so e seguro sem outras threads (o pool ja criado continua a servir)
+    return _pool is not None or threading.active_count() == 1
+
+
+def workers_for(size, start=0):
+    """Numero de processos a usar para ler size bytes (1 = sem pool)"""
+    if WORKERS < 2 or size - start < PARALLEL_MIN or _context() is None or not _can_fork():
+        return 1
+    return WORKERS
+
+
+def _get_pool():
+    """O pool partilhado, criado no primeiro uso; None se ja nao for seguro criar"""
+    global _pool
+    with _pool_lock:
+        if _pool is None and threading.active_count() == 1:
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=_context())
+        return _pool
+
+
+def _drop_pool(pool):
+    # um processo do pool morreu: o pool nao serve mais
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ranges(csvfile, start, end, parts):
+    """[(inicio, fim), ...] com cada inicio no principio de uma linha"""
+    size = end - start
+    step = max(MIN_RANGE, min(RANGE_SIZE, -(-size // parts)))
+    bounds = [start]
+    with open(csvfile, "rb") as fh:
+        pos = start + step
+        while pos < end:
+            fh.seek(pos - 1)
+            fh.readline()  # ate ao fim da linha onde pos calhou
+            pos = fh.tell()
+            if pos >= end:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+            pos += step
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _ordered(pool, fn, tasks, window):
+    # como pool.map, mas so com window blocos em curso (a memoria nao cresce com o ficheiro)
+    tasks = iter(tasks)
+    pending = deque()
+    try:
+        for args in tasks:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for args in tasks:
+                pending.append(pool.submit(fn, *args))
+                break
+            yield result
+    finally:
+        # no fim, cancelado ou com erro: nao esperar pelos blocos que faltam
+        for future in pending:
+            future.cancel()
+
+
+def _run(pool, csvfile, fn, extra, start, end, progress):
+    """Gera os resultados de fn(csvfile, inicio, fim, *extra) por bloco, pela ordem do ficheiro"""
+    parts = ranges(csvfile, start, end, WORKERS * 4)
+    total = end - start
+    done = 0
+    try:
+        for (first, last), (result, nbytes, rows) in zip(
+                parts, _ordered(pool, fn, [(csvfile, a, b) + extra for a, b in parts], WORKERS * 2)):
+            instrument.add(bytes=nbytes, rows=rows)
+            done += last - first
+            if progress:
+                progress(done, total)
+            yield result
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        raise
+
+
+def _size(csvfile):
+    try:
+        return os.path.getsize(csvfile)
+    except OSError:
+        return 0
+
+
+# --- funcoes que correm nos processos do pool: devolvem (resultado, bytes, linhas) ---
+
+def _search_range(csvfile, start, end, term, ignore_case, unquote):
+    m = instrument.Measure("scan")
+    with instrument.active(m):
+        lines = list(csvscan.scan_matches(csvfile, term, ignore_case, unquote, start, end))
+    return lines, m.bytes, m.rows
+
+
+def _query_range(csvfile, start, end, kind, text, ignore_case):
+    import query
+    q = query.compile(kind, text, ignore_case)
+    m = instrument.Measure("scan")
+    with instrument.active(m):
+        if q.literal:
+            lines = csvscan.scan_matches(csvfile, q.literal, True, False, start, end)
+        else:
+            lines = (csvindex.decode_line(raw) for _, raw in csvscan.iter_lines(csvfile, start, end))
+        found = [q.output(line) for line in lines if q.matches(line)]
+    return found, m.bytes, m.rows
+
+
+def _balances_range(csvfile, start, end):
+    import ledger
+    totals = {}
+    bad = rows = 0
+    for _, raw in csvscan.iter_lines(csvfile, start, end):
+        rows += 1
+        if not ledger.fold(totals, raw):
+            bad += 1
+    return (totals, bad), end - start, rows
+
+
+# --- usadas pelo csvscan / storage / ledger ---
+
+def search(csvfile, term, ignore_case=True, unquote=False, progress=None):
+    """Como csvscan.iter_matches (sem indice); None se o ficheiro for pequeno"""
+    size = _size(csvfile)
+    pool = _get_pool() if workers_for(size) > 1 else None
+    if pool is None:
+        return None
+    return (line for lines in _run(pool, csvfile, _search_range, (term, ignore_case, unquote), 0, size, progress)
+            for line in lines)
+
+
+def query(csvfile, kind, text, ignore_case=True, progress=None):
+    """Linhas do storage.query (sem indice de id); None se o ficheiro for pequeno"""
+    size = _size(csvfile)
+    pool = _get_pool() if workers_for(size) > 1 else None
+    if pool is None:
+        return None
+    return (line for lines in _run(pool, csvfile, _query_range, (kind, text, ignore_case), 0, size, progress)
+            for line in lines)
+
+
+def balances(csvfile, start, end, progress=None):
+    """(saldos, linhas invalidas) das linhas completas entre start e end; None se for pouco"""
+    pool = _get_pool() if workers_for(end, start) > 1 else None
+    if pool is None:
+        return None
+    totals = {}
+    bad = 0
+    for part, part_bad in _run(pool, csvfile, _balances_range, (), start, end, progress):
+        for product, units in part.items():
+            totals[product] = totals.get(product, 0) + units
+        bad += part_bad
+    return totals, bad
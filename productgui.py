@@ -4,7 +4,9 @@ GUI Product Manager
 - Mantém o mesmo formato CSV usado no script original (linhas: id,name,supplier id,about) para integrar no Excel
 - Substitui vírgulas por `;` nos campos para não quebrar o CSV
 - Menu: File -> Open CSV, Exit
-- Actions -> Add, List, Report
+- Actions -> Add, List, Report, Find id (usa o indice <csv>.idx), Build search index (<csv>.tri)
+- Actions -> Reports: relatorios que juntam product/supplier/stock (joins.py) e de
+  agrupamento / top N (aggregate.py)
 
 Guardar como: gui_product_manager.py
 Executar: python gui_product_manager.py
@@ -12,10 +14,17 @@ Executar: python gui_product_manager.py
 
 import tkinter as tk
 from tkinter import ttk, filedialog, simpledialog, messagebox
-import csv
-import os
+import sys
+
+import instrument
+import joins
+import storage
+import trigram
+from tableview import CsvTable
+from worker import TaskBar
 
 DEFAULT_FILE = "product.csv"
+FIELDS = ["id number", "name", "supplier id", "about"]
 
 class ProductGUI(tk.Tk):
     def __init__(self):
@@ -43,6 +52,13 @@ class ProductGUI(tk.Tk):
         actions.add_command(label="Add", command=self.add_item)
         actions.add_command(label="List", command=self.list_items)
         actions.add_command(label="Report (search)", command=self.report_items)
+        actions.add_command(label="Find id", command=self.find_item)
+        reports = tk.Menu(actions, tearoff=0)
+        for name in joins.REPORTS:
+            reports.add_command(label=name.capitalize(), command=lambda n=name: self.join_report(n))
+        actions.add_cascade(label="Reports", menu=reports)
+        actions.add_separator()
+        actions.add_command(label="Build search index", command=self.build_index)
         menubar.add_cascade(label="Actions", menu=actions)
 
         helpmenu = tk.Menu(menubar, tearoff=0)
@@ -64,17 +80,34 @@ class ProductGUI(tk.Tk):
         btn_list = tk.Button(top, text="List", command=self.list_items,bg="#FFFF00")
         btn_list.pack(side=tk.RIGHT, padx=4)
 
-        # Text area to show CSV contents or results
-        self.text = tk.Text(self, wrap=tk.NONE,bg="#FFFF00")
-        self.text.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0,8))
+        # Text area to show search results
+        self.text_frame = tk.Frame(self, bg="#FFFF00")
+        self.text = tk.Text(self.text_frame, wrap=tk.NONE,bg="#FFFF00")
 
         # Add horizontal and vertical scrollbars
-        xscroll = tk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.text.xview)
+        xscroll = tk.Scrollbar(self.text_frame, orient=tk.HORIZONTAL, command=self.text.xview)
         xscroll.pack(side=tk.BOTTOM, fill=tk.X)
-        yscroll = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.text.yview)
+        yscroll = tk.Scrollbar(self.text_frame, orient=tk.VERTICAL, command=self.text.yview)
         yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(fill=tk.BOTH, expand=True)
         self.text.configure(xscrollcommand=xscroll.set, yscrollcommand=yscroll.set)
 
+        # Table for the CSV contents (List): only the visible rows are loaded
+        self.table = CsvTable(self, FIELDS, bg="#FFFF00")
+
+        # Status, progress and Cancel for the reads that run in the background
+        self.taskbar = TaskBar(self)
+        self.taskbar.pack(side=tk.BOTTOM, fill=tk.X, padx=8, pady=(0,6))
+        self.show_text()
+
+    def show_text(self):
+        self.table.pack_forget()
+        self.text_frame.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0,8))
+
+    def show_table(self):
+        self.text_frame.pack_forget()
+        self.table.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0,8))
+
     def open_csv(self):
         f = filedialog.askopenfilename(title="Open CSV file", filetypes=[("CSV files","*.csv"), ("All files","*.*")])
         if f:
@@ -89,11 +122,8 @@ class ProductGUI(tk.Tk):
         messagebox.showinfo("About", "Product CSV Manager\nJanela amarela com menus\nMantem formato CSV para integrar no Excel")
 
     def ensure_file(self):
-        # Create file if it doesn't exist
-        if not os.path.exists(self.csvfile):
-            with open(self.csvfile, "w", newline='', encoding='utf-8-sig') as fh:
-                # no header by design (keeps behavior of original script)
-                pass
+        # Create file if it doesn't exist (no header by design, keeps behavior of original script)
+        storage.ensure_file("product", self.csvfile)
 
     def sanitize(self, s: str) -> str:
         # Replace commas so they don't break CSV columns (original script replaced with ';')
@@ -107,7 +137,7 @@ class ProductGUI(tk.Tk):
         dlg.grab_set()
         dlg.configure(bg="#FFF9A8")
 
-        labels = ["id number", "name", "supplier id", "about"]
+        labels = FIELDS
         entries = []
         for i, lab in enumerate(labels):
             tk.Label(dlg, text=lab + ":", bg="#FFF9A8").grid(row=i, column=0, sticky=tk.W, padx=8, pady=6)
@@ -120,13 +150,11 @@ class ProductGUI(tk.Tk):
             if not vals[0]:
                 messagebox.showwarning("Validation", "id number is required")
                 return
-            line = ",".join(vals)
             try:
-                with open(self.csvfile, "a", newline='', encoding='utf-8-sig') as fh:
-                    fh.write(line + "\n")
+                storage.append("product", vals, self.csvfile)
                 dlg.destroy()
                 messagebox.showinfo("Saved", "Linha adicionada ao CSV")
-                self.list_items()
+                self.refresh_items()
             except Exception as ex:
                 messagebox.showerror("Error", str(ex))
 
@@ -144,36 +172,128 @@ class ProductGUI(tk.Tk):
 
     def list_items(self):
         self.ensure_file()
-        try:
-            with open(self.csvfile, "r", encoding='utf-8-sig') as fh:
-                data = fh.read()
-        except Exception as ex:
-            data = f"Erro a ler ficheiro: {ex}"
-        self.text.delete(1.0, tk.END)
-        self.text.insert(tk.END, data)
+        csvfile = self.csvfile
+
+        def work(task):
+            return storage.table_rows("product", csvfile, task.progress)
+
+        def on_items(items):
+            self.table.set_source(items[0])
+            self.show_table()
+
+        def on_done(error, cancelled):
+            if error:
+                self.show_text()
+                self.text.delete(1.0, tk.END)
+                self.text.insert(tk.END, f"Erro a ler ficheiro: {error}")
+                self.taskbar.set_text("")
+            elif cancelled:
+                self.taskbar.set_text("List cancelled")
+            else:
+                self.taskbar.set_text(f"{self.table.total()} rows")
+
+        self.taskbar.run(work, on_items, on_done, text="Reading...")
+
+    def refresh_items(self):
+        """Acrescenta a tabela so as linhas novas; List completo se o ficheiro mudou por fora"""
+        source = self.table.source
+        if getattr(source, "csvfile", self.csvfile) == self.csvfile and self.table.refresh():
+            self.show_table()
+            self.taskbar.set_text(f"{self.table.total()} rows")
+        else:
+            self.list_items()
 
     def report_items(self):
         self.ensure_file()
-        q = simpledialog.askstring("Find what?", "Texto a procurar:", parent=self)
+        q = simpledialog.askstring("Find what?", "Texto a procurar\n(ou campos, ex: name:os supplier:000000001):", parent=self)
         if q is None:
             return
         q = q.strip()
-        results = []
-        try:
-            with open(self.csvfile, "r", encoding='utf-8-sig') as fh:
-                for line in fh:
-                    if q.lower() in line.lower():
-                        results.append(line.rstrip('\n'))
-        except Exception as ex:
-            messagebox.showerror("Error", str(ex))
+        csvfile = self.csvfile
+        self.show_text()
+        self.text.delete(1.0, tk.END)
+        found = [0]
+
+        def work(task):
+            # the lines come back in batches while the file is being read
+            return storage.query("product", q, csvfile, progress=task.progress)
+
+        def on_items(lines):
+            self.text.insert(tk.END, ("\n" if found[0] else "") + "\n".join(lines))
+            found[0] += len(lines)
+            self.taskbar.set_text(f"Searching... {found[0]} matches")
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                return
+            if not found[0]:
+                self.text.insert(tk.END, "(no matches)")
+            self.taskbar.set_text(f"{found[0]} matches" + (" (cancelled)" if cancelled else ""))
+
+        self.taskbar.run(work, on_items, on_done, text="Searching...")
+
+    def find_item(self):
+        self.ensure_file()
+        q = simpledialog.askstring("Find id", "id number:", parent=self)
+        if q is None:
             return
+        csvfile = self.csvfile
+        q = q.strip()
+
+        def on_items(items):
+            self.show_text()
+            self.text.delete(1.0, tk.END)
+            self.text.insert(tk.END, items[0] if items[0] is not None else "(no matches)")
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+            self.taskbar.set_text("")
+
+        # the first lookup may have to (re)build the id index
+        self.taskbar.run(lambda task: storage.find("product", q, csvfile), on_items, on_done, text="Looking up id...")
+
+    def build_index(self):
+        # Indice de trigramas: o Report passa a ler so as linhas candidatas
+        self.ensure_file()
+        csvfile = self.csvfile
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                self.taskbar.set_text("")
+            elif cancelled:
+                self.taskbar.set_text("Search index cancelled")
+            else:
+                self.taskbar.set_text("Indice de pesquisa criado: " + trigram.index_path(csvfile))
+
+        self.taskbar.run(lambda task: storage.build_search_index("product", csvfile, task.progress), None, on_done,
+                         text="Building search index...")
+
+    def join_report(self, name):
+        csvfile = self.csvfile
+        self.show_text()
         self.text.delete(1.0, tk.END)
-        if results:
-            self.text.insert(tk.END, "\n".join(results))
-        else:
-            self.text.insert(tk.END, "(no matches)")
+        count = [0]
+
+        def on_items(lines):
+            self.text.insert(tk.END, ("\n" if count[0] else "") + "\n".join(lines))
+            count[0] += len(lines)
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                return
+            if not count[0]:
+                self.text.insert(tk.END, "(no rows)")
+            self.taskbar.set_text(f"{name}: {count[0]} rows" + (" (cancelled)" if cancelled else ""))
+
+        self.taskbar.run(lambda task: joins.run(name, task.progress, product_file=csvfile),
+                         on_items, on_done, text=name + "...")
 
 if __name__ == '__main__':
+    instrument.configure(sys.argv)
     app = ProductGUI()
     app.list_items()
     app.mainloop()
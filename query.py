@@ -0,0 +1,165 @@
+"""
+Pesquisa por campos para os Report das CLI e dos GUIs
+    name:ibm supplier:000000001 units>=5 "texto livre"
+- campo:valor  o campo contem valor (sem distinguir maiusculas); nos campos de id
+               (id, supplier, product) tem de ser o id inteiro
+- campo=valor  o campo e igual a valor (sem distinguir maiusculas)
+- campo!=valor, campo>=n, campo<=n, campo>n, campo<n (numeros, ex: units>=5)
+- palavras sem campo: tem de aparecer em qualquer parte da linha (como o search antigo)
+- Um texto sem nenhum campo conhecido continua a ser um termo unico (storage.search)
+- compile() faz o parse uma vez e devolve um Query com matches(linha): so separa as
+  colunas que precisa e para na primeira condicao falhada
+"""
+
+import csv
+import re
+import shlex
+from collections import namedtuple
+
+import storage
+
+ALIASES = {"supplier": "supplier_id", "product": "product_id"}
+ID_FIELDS = ("id", "supplier_id", "product_id")
+NUMERIC_OPS = (">=", "<=", ">", "<")
+TOKEN = re.compile(r"^([A-Za-z_]+)(:|!=|>=|<=|=|>|<)(.*)$", re.S)
+
+# field: nome no registo; index: coluna no csv; op: ":", "=", "!=", ">=", ...
+Condition = namedtuple("Condition", "field index op value")
+
+
+def fields(kind):
+    """Nomes aceites para os campos de kind -> nome do campo no registo"""
+    names = {f: f for f in storage.DATASETS[kind].record._fields}
+    names.update((alias, f) for alias, f in ALIASES.items() if f in names)
+    return names
+
+
+def is_query(kind, text):
+    """True se o texto usa pelo menos um campo conhecido (senao e um termo de pesquisa simples)"""
+    known = fields(kind)
+    for token in text.split():
+        m = TOKEN.match(token)
+        if m and m.group(1).lower() in known:
+            return True
+    return False
+
+
+def _number(text):
+    value = storage.parse_units(text)
+    if value is None:
+        raise ValueError(f"expected a number, got {text!r}")
+    return value
+
+
+class Query:
+    def __init__(self, kind, text, ignore_case=True):
+        self.kind = kind
+        self.text = text
+        self.ignore_case = ignore_case
+        self.words = []
+        self.conditions = []
+        ds = storage.DATASETS[kind]
+        self.ncols = len(ds.record._fields)
+        self.quote = ds.quote
+        known = fields(kind)
+        for token in shlex.split(text):
+            m = TOKEN.match(token)
+            if not m:
+                self.words.append(token)
+                continue
+            name, op, value = m.groups()
+            field = known.get(name.lower())
+            if field is None:
+                raise ValueError(f"unknown field {name!r} for {kind} (fields: {', '.join(sorted(known))})")
+            if op in NUMERIC_OPS:
+                value = _number(value)
+            self.conditions.append(Condition(field, ds.record._fields.index(field), op, value))
+        # colunas da esquerda primeiro: o split pode parar mais cedo
+        self.conditions.sort(key=lambda c: c.index)
+        self.id_key = next((c.value for c in self.conditions if c.index == 0 and c.op == ":"), None)
+        self.literal = self._literal()
+        self.matches = self._compile()
+        self.key = self._key()
+
+    def _literal(self):
+        # texto que tem de estar na linha: serve para filtrar blocos inteiros antes do parse
+        texts = [c.value for c in self.conditions if c.op in (":", "=")] + self.words
+        texts = [t for t in texts if t]
+        return max(texts, key=len) if texts else None
+
+    def _key(self):
+        # a mesma pesquisa escrita de outra forma (ordem, alias, maiusculas) da a mesma chave
+        words = sorted(w.lower() for w in self.words) if self.ignore_case else sorted(self.words)
+        conditions = []
+        for c in self.conditions:
+            value = c.value
+            if isinstance(value, str) and not (c.op == ":" and c.field in ID_FIELDS):
+                value = value.lower()  # estas comparacoes ja nao distinguem maiusculas
+            conditions.append((c.index, c.op, value))
+        return (self.kind, self.ignore_case, tuple(words), tuple(sorted(conditions)))
+
+    def _test(self, cond):
+        i, value = cond.index, cond.value
+        if cond.op == ":" and cond.field in ID_FIELDS:
+            return lambda parts: parts[i].strip() == value
+        if cond.op == ":":
+            value = value.lower()
+            return lambda parts: value in parts[i].lower()
+        if cond.op == "=":
+            value = value.lower()
+            return lambda parts: parts[i].strip().lower() == value
+        if cond.op == "!=":
+            value = value.lower()
+            return lambda parts: parts[i].strip().lower() != value
+        compare = {">=": lambda a: a >= value, "<=": lambda a: a <= value,
+                   ">": lambda a: a > value, "<": lambda a: a < value}[cond.op]
+
+        def test(parts):
+            number = storage.parse_units(parts[i])
+            return number is not None and compare(number)
+        return test
+
+    def _compile(self):
+        ignore_case = self.ignore_case
+        words = [w.lower() for w in self.words] if ignore_case else list(self.words)
+        tests = [self._test(c) for c in self.conditions]
+        last = self.conditions[-1].index if self.conditions else -1
+        # split so ate a ultima coluna usada (a ultima do registo fica com o resto)
+        maxsplit = min(last + 1, self.ncols - 1)
+        ncols = self.ncols
+        quote = self.quote
+
+        def split(line):
+            if quote and '"' in line:
+                parts = next(csv.reader([line]), [])
+                if len(parts) > ncols:
+                    parts[ncols - 1:] = [",".join(parts[ncols - 1:])]
+            else:
+                parts = line.split(",", maxsplit)
+            if len(parts) <= last:
+                parts += [""] * (last + 1 - len(parts))
+            return parts
+
+        def matches(line):
+            if words:
+                hay = line.lower() if ignore_case else line
+                for word in words:
+                    if word not in hay:
+                        return False
+            if tests:
+                parts = split(line)
+                for test in tests:
+                    if not test(parts):
+                        return False
+            return True
+        return matches
+
+    def output(self, line):
+        # como o storage.search: o supplier aparece sem as aspas do csv
+        if self.quote and '"' in line:
+            return ",".join(next(csv.reader([line]), []))
+        return line
+
+
+def compile(kind, text, ignore_case=True):
+    return Query(kind, text, ignore_case)
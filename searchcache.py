@@ -0,0 +1,165 @@
+"""
+Cache LRU dos resultados das pesquisas (storage.search / storage.query no backend csv)
+- Chave: (ficheiro: dispositivo + inode + caminho, pesquisa normalizada)
+- A versao do ficheiro e um csvscan.Tail (offset, bytes de controlo, mtime):
+  igual -> devolve a lista guardada; cresceu -> so procura nas linhas novas e junta-as;
+  truncado/substituido -> a entrada e descartada
+- A cache so guarda ate a ultima linha completa (\n); uma linha ainda incompleta no fim
+  e lida em cada pesquisa (e nao e guardada), e volta a ser lida quando acabar
+- Os resultados so ficam guardados quando a pesquisa chega ao fim (cancelar nao guarda)
+  e se o ficheiro nao mudou entretanto
+- Limites: GEST_CACHE_ENTRIES pesquisas (por omissao 64, 0 desliga a cache) e
+  GEST_CACHE_BYTES de linhas guardadas (por omissao 32 MiB); configure() muda os dois
+- stats() / summary() com hits, misses e extends (mostrado na barra de estado dos GUIs)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import csvscan
+
+MAX_ENTRIES = int(os.environ.get("GEST_CACHE_ENTRIES", 64))
+MAX_BYTES = int(os.environ.get("GEST_CACHE_BYTES", 32 << 20))
+LINE_OVERHEAD = 56  # str vazia + ponteiro na lista
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "extends": 0, "evictions": 0}
+_size = 0
+
+
+class Entry:
+    def __init__(self, tail, lines, size):
+        self.tail = tail
+        self.lines = lines
+        self.size = size
+        self.lock = threading.Lock()
+
+
+def configure(entries=None, max_bytes=None):
+    """Muda os limites (e descarta o que passar deles)"""
+    global MAX_ENTRIES, MAX_BYTES
+    if entries is not None:
+        MAX_ENTRIES = entries
+    if max_bytes is not None:
+        MAX_BYTES = max_bytes
+    with _lock:
+        _evict()
+
+
+def clear():
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
+
+
+def stats():
+    with _lock:
+        return dict(_counters, entries=len(_entries), bytes=_size)
+
+
+def summary():
+    """Texto curto, ex: "cache 12 hits (3 extended), 4 misses" (vazio se nao houve pesquisas)"""
+    s = stats()
+    if not s["hits"] and not s["misses"]:
+        return ""
+    text = f"cache {s['hits']} hits"
+    if s["extends"]:
+        text += f" ({s['extends']} extended)"
+    return text + f", {s['misses']} misses"
+
+
+def _evict():
+    global _size
+    while _entries and (len(_entries) > MAX_ENTRIES or _size > MAX_BYTES):
+        _, entry = _entries.popitem(last=False)
+        _size -= entry.size
+        _counters["evictions"] += 1
+
+
+def _store(key, entry):
+    global _size
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _size -= old.size
+        _entries[key] = entry
+        _size += entry.size
+        _evict()
+
+
+def _drop(key, entry):
+    global _size
+    with _lock:
+        if _entries.get(key) is entry:
+            del _entries[key]
+            _size -= entry.size
+
+
+def _lines_size(lines):
+    return sum(len(line) for line in lines) + LINE_OVERHEAD * len(lines)
+
+
+def cached(csvfile, query, full, extend):
+    """
+    Resultados de uma pesquisa em csvfile, pela cache.
+    query: pesquisa normalizada (tuplo); full(): gera todos os resultados;
+    extend(inicio, fim): gera os resultados so entre esses bytes (linhas completas).
+    """
+    global _size
+    if MAX_ENTRIES <= 0:
+        return full()
+    try:
+        st = os.stat(csvfile)
+    except OSError:
+        return full()
+    key = (st.st_dev, st.st_ino, os.path.abspath(csvfile)) + tuple(query)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+    if entry is not None:
+        with entry.lock:
+            status = entry.tail.status()
+            end = csvscan.end_of_lines(csvfile) if status == "grown" else 0
+            if end > entry.tail.offset:
+                new = list(extend(entry.tail.offset, end))
+                # lista nova: quem ainda esta a ler a antiga nao ve a mudanca
+                entry.lines = entry.lines + new
+                entry.tail.mark(end)
+                with _lock:
+                    added = _lines_size(new)
+                    entry.size += added
+                    if _entries.get(key) is entry:
+                        _size += added
+                    _counters["extends"] += 1
+                    _evict()
+            if status != "reset":
+                lines = entry.lines
+                size = entry.tail.size() if status == "grown" else 0
+                if size > entry.tail.offset:
+                    # linha incompleta no fim: entra neste resultado, mas nao na cache
+                    lines = lines + list(extend(entry.tail.offset, size))
+                with _lock:
+                    _counters["hits"] += 1
+                return iter(lines)
+        _drop(key, entry)
+    with _lock:
+        _counters["misses"] += 1
+    return _fill(csvfile, key, full)
+
+
+def _fill(csvfile, key, full):
+    tail = csvscan.Tail(csvfile, csvscan.end_of_lines(csvfile))
+    lines = []
+    size = 0
+    for line in full():
+        if size <= MAX_BYTES:
+            lines.append(line)
+            size += len(line) + LINE_OVERHEAD
+        yield line
+    # "same": o ficheiro nao mudou durante a pesquisa e nao tem uma linha incompleta no fim
+    if size <= MAX_BYTES and tail.status() == "same":
+        _store(key, Entry(tail, lines, size))
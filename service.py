@@ -0,0 +1,488 @@
+"""
+Servico local (HTTP/JSON em localhost, asyncio) dono do product.csv, supplier.csv e stock.csv
+- O servidor le cada CSV uma vez e fica com as linhas, os ids e os saldos do stock em memoria
+- Antes de cada pedido le so os bytes acrescentados por fora (csvscan.Tail); se o ficheiro
+  foi truncado/substituido (ex: compact.py) volta a ler tudo
+- Os pedidos sao tratados um de cada vez no event loop: as escritas ficam em serie
+- Os GUIs e as CLI passam a ser clientes quando o servico esta configurado:
+      [storage]
+      service = http://127.0.0.1:8765
+  ou GEST_SERVICE=http://127.0.0.1:8765 (o storage.py envia os pedidos para aqui)
+- Pedidos (GET com parametros no url, POST com corpo JSON):
+      GET  /<kind>/total                     {"total": linhas}
+      GET  /<kind>/rows?start=0&stop=50      {"rows": [[campos], ...]}
+      GET  /<kind>/lines?start=0&stop=10000  {"lines": [...], "start": 0, "total": n}
+      GET  /<kind>/search?q=ibm&ignore_case=1&fields=1
+      GET  /<kind>/find?id=12                {"line": "..." ou null}
+      GET  /stock/balances                   {"balances": {produto: unidades}}
+      GET  /stock/movements?start=...&end=...  {"lines": [...]} (bisect nas horas das linhas,
+                                             mais as linhas do arquivo do compact.py)
+      GET  /stock/snapshot                   {"snapshot": {...} ou null} (ledger.load_snapshot)
+      POST /<kind>/add   {"values": [...]}   {"written": 1} (400 {"error": ...} se invalido)
+      POST /<kind>/add_rows {"rows": [...]}  {"written": n, "rejected": [[linha, erro], ...]}
+      GET  /stats
+- So para o backend csv
+
+Executar: python service.py [--host 127.0.0.1] [--port 8765] [--dir pasta-dos-csv]
+"""
+
+import argparse
+import asyncio
+import bisect
+import csv
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import csvindex
+import csvscan
+import instrument
+import ledger
+import query as querylang
+import storage
+import timeline
+
+HOST = "127.0.0.1"
+PORT = 8765
+TIMEOUT = 30
+PAGE_SIZE = 10000  # linhas por pedido no iter_lines (a memoria do cliente nao cresce com o ficheiro)
+
+
+# --- servidor ---
+
+class Table:
+    """Linhas de um CSV em memoria, postas em dia com o ficheiro antes de cada pedido"""
+
+    def __init__(self, kind, csvfile):
+        self.kind = kind
+        self.csvfile = csvfile
+        self.quote = storage.DATASETS[kind].quote
+        self.loads = 0
+        self.reset()
+
+    def reset(self):
+        self.lines = []
+        self.shown = []  # como o storage.search as devolve (supplier sem as aspas do csv)
+        self.lower = None  # shown em minusculas, criado na primeira pesquisa sem maiusculas
+        self.ids = {}
+        self.balances = {} if self.kind == "stock" else None
+        self.times = [] if self.kind == "stock" else None  # hora de cada linha (vazias: a anterior)
+        self.tail = csvscan.Tail(self.csvfile, 0)
+        self.loads += 1
+
+    def sync(self):
+        data = self.tail.read()
+        if data is None:
+            self.reset()
+            data = self.tail.read()
+        if data:
+            self._extend(data)
+
+    def _extend(self, data):
+        lines, shown, ids, balances, times = self.lines, self.shown, self.ids, self.balances, self.times
+        first = len(lines)
+        for raw in data.splitlines(keepends=True):
+            line = csvindex.decode_line(raw)
+            key = csvindex.first_field(raw)
+            if key and key not in ids:
+                ids[key] = len(lines)
+            lines.append(line)
+            shown.append(csvindex.unquote_line(line) if self.quote and '"' in line else line)
+            if balances is not None:
+                ledger.fold(balances, raw)
+                stamp = timeline.line_time(raw)
+                times.append(stamp if stamp is not None else (times[-1] if times else ""))
+        if self.lower is not None:
+            self.lower.extend(line.lower() for line in shown[first:])
+
+    def rows(self, start, stop):
+        return [next(csv.reader([line]), []) for line in self.lines[start:stop]]
+
+    def search(self, term, ignore_case=True):
+        if ignore_case:
+            if self.lower is None:
+                self.lower = [line.lower() for line in self.shown]
+            term = term.lower()
+            return [line for line, hay in zip(self.shown, self.lower) if term in hay]
+        return [line for line in self.shown if term in line]
+
+    def query(self, text, ignore_case=True):
+        if not querylang.is_query(self.kind, text):
+            return self.search(text, ignore_case)
+        q = querylang.compile(self.kind, text, ignore_case)
+        if q.id_key is not None:
+            lines = [self.find(q.id_key)] if q.id_key in self.ids else []
+        else:
+            lines = self.lines
+        return [q.output(line) for line in lines if q.matches(line)]
+
+    def find(self, record_id):
+        i = self.ids.get(record_id)
+        return None if i is None else self.lines[i]
+
+    def movements(self, start=None, end=None):
+        lo = bisect.bisect_left(self.times, start) if start else 0
+        hi = bisect.bisect_left(self.times, end) if end else len(self.times)
+        lines = [line for line in self.lines[lo:hi] if line]
+        archived = ledger.archive_range(self.csvfile)
+        if archived:
+            # linhas compactadas (compact.py): lidas do arquivo, como no storage.movements
+            lines[:0] = timeline.iter_range(archived[0], start, end, limit=archived[1])
+        return lines
+
+    def stock_balances(self):
+        snap = ledger.load_snapshot(self.csvfile)
+        totals = dict(snap["balances"]) if snap else {}
+        for product, units in self.balances.items():
+            totals[product] = totals.get(product, 0) + units
+        return totals
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _flag(params, name):
+    return params.get(name, "1") not in ("0", "false", "")
+
+
+def _int(params, name, default=None):
+    try:
+        return int(params[name]) if name in params else default
+    except ValueError:
+        raise HttpError(400, f"{name} must be an integer")
+
+
+def _list(data, name):
+    value = data.get(name, [])
+    if not isinstance(value, list):
+        raise HttpError(400, f"{name} must be a JSON list")
+    return value
+
+
+class Server:
+    """Despacho dos pedidos: um Table por kind, tudo na thread do event loop"""
+
+    def __init__(self, folder="."):
+        self.tables = {kind: Table(kind, os.path.join(folder, ds.file)) for kind, ds in storage.DATASETS.items()}
+        self.requests = 0
+        self.started = time.time()
+
+    def table(self, kind):
+        table = self.tables.get(kind)
+        if table is None:
+            raise HttpError(404, f"unknown kind {kind!r}")
+        table.sync()
+        return table
+
+    def handle(self, method, target, body):
+        """(status, objeto JSON) para um pedido"""
+        self.requests += 1
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HttpError(400, "the request body must be a JSON object")
+            if parts == ["stats"]:
+                return 200, self.stats()
+            if len(parts) != 2:
+                raise HttpError(404, f"no such path {url.path!r}")
+            kind, action = parts
+            handler = getattr(self, f"{method.lower()}_{action}", None)
+            if handler is None:
+                raise HttpError(404 if method in ("GET", "POST") else 405, f"no {method} {url.path}")
+            return 200, handler(self.table(kind), params, data)
+        except HttpError as ex:
+            return ex.status, {"error": str(ex)}
+        except ValueError as ex:
+            return 400, {"error": str(ex)}
+        except Exception as ex:
+            # um pedido errado nao pode fechar a ligacao nem parar o servidor
+            return 500, {"error": f"{type(ex).__name__}: {ex}"}
+
+    def get_total(self, table, params, data):
+        return {"total": len(table.lines)}
+
+    def get_rows(self, table, params, data):
+        start = _int(params, "start", 0)
+        return {"rows": table.rows(start, _int(params, "stop", len(table.lines)))}
+
+    def get_lines(self, table, params, data):
+        start = _int(params, "start", 0)
+        if start > len(table.lines):
+            start = 0  # o cliente tinha mais linhas do que ha agora: ficheiro substituido
+        stop = _int(params, "stop", len(table.lines))
+        return {"lines": table.lines[start:stop], "start": start, "total": len(table.lines)}
+
+    def get_search(self, table, params, data):
+        text = params.get("q", "")
+        ignore_case = _flag(params, "ignore_case")
+        if params.get("fields") == "1":
+            return {"lines": table.query(text, ignore_case)}
+        return {"lines": table.search(text, ignore_case)}
+
+    def get_find(self, table, params, data):
+        return {"line": table.find(params.get("id", ""))}
+
+    def get_balances(self, table, params, data):
+        if table.kind != "stock":
+            raise HttpError(404, "balances are only available for stock")
+        return {"balances": table.stock_balances()}
+
+    def get_movements(self, table, params, data):
+        if table.kind != "stock":
+            raise HttpError(404, "movements are only available for stock")
+        return {"lines": table.movements(params.get("start"), params.get("end"))}
+
+    def get_snapshot(self, table, params, data):
+        if table.kind != "stock":
+            raise HttpError(404, "the snapshot is only available for stock")
+        return {"snapshot": ledger.load_snapshot(table.csvfile)}
+
+    def post_add(self, table, params, data):
+        result = storage.append_rows(table.kind, [_list(data, "values")], table.csvfile)
+        if result.rejected:
+            raise HttpError(400, result.rejected[0][1])
+        return {"written": result.written}
+
+    def post_add_rows(self, table, params, data):
+        result = storage.append_rows(table.kind, _list(data, "rows"), table.csvfile)
+        return {"written": result.written, "rejected": result.rejected}
+
+    def stats(self):
+        return {"requests": self.requests, "uptime": round(time.time() - self.started, 1),
+                "tables": {kind: {"lines": len(t.lines), "loads": t.loads} for kind, t in self.tables.items()}}
+
+
+async def _reply(writer, status, payload):
+    data = json.dumps(payload).encode("utf-8")
+    writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                 % (status, http.client.responses.get(status, "").encode(), len(data)))
+    writer.write(data)
+    await writer.drain()
+
+
+async def _serve_connection(server, reader, writer):
+    # HTTP/1.1 minimo: Content-Length e keep-alive (sem chunked)
+    # um pedido mal formado recebe 400 e a ligacao e fechada (nao se sabe onde acaba)
+    try:
+        while True:
+            request = await reader.readline()
+            if not request.strip():
+                break
+            try:
+                method, target, version = request.decode("latin-1").split()
+            except ValueError:
+                await _reply(writer, 400, {"error": "malformed request line"})
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = headers.get("content-length") or "0"
+            if not (length.isascii() and length.isdigit()):
+                await _reply(writer, 400, {"error": f"invalid Content-Length {length!r}"})
+                break
+            body = await reader.readexactly(int(length))
+            await _reply(writer, *server.handle(method, target, body))
+            if headers.get("connection", "").lower() == "close" or version == "HTTP/1.0":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except (ValueError, asyncio.LimitOverrunError):
+        # linha do pedido ou cabecalho maior que o limite do StreamReader
+        try:
+            await _reply(writer, 400, {"error": "request line or header too long"})
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT, folder=".", ready=None):
+    """Corre o servidor ate ser cancelado; ready(endereco) e chamado quando aceita ligacoes"""
+    # o servidor le os ficheiros, nao e cliente de si proprio (o post_add bloquearia o event loop)
+    storage.SERVICE = ""
+    server = Server(folder)
+    for table in server.tables.values():
+        table.sync()  # a primeira leitura e feita ja, nao no primeiro pedido
+    listener = await asyncio.start_server(lambda r, w: _serve_connection(server, r, w), host, port)
+    if ready:
+        ready(listener.sockets[0].getsockname())
+    async with listener:
+        await listener.serve_forever()
+
+
+# --- cliente (usado pelo storage.py quando o servico esta configurado) ---
+
+_local = threading.local()
+
+
+class _Connection:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.url = url
+        self.conn = http.client.HTTPConnection(parts.hostname or HOST, parts.port or PORT, timeout=TIMEOUT)
+
+
+def request(method, path, params=None, body=None):
+    """Objeto JSON da resposta; ValueError se o pedido for recusado, OSError sem servico"""
+    url = storage.SERVICE
+    cached = getattr(_local, "connection", None)
+    if cached is None or cached.url != url:
+        cached = _local.connection = _Connection(url)
+    if params:
+        path += "?" + urlencode(params)
+    payload = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+    for attempt in range(2):
+        try:
+            cached.conn.request(method, path, payload, headers)
+            response = cached.conn.getresponse()
+            data = response.read()
+            break
+        except (http.client.HTTPException, ConnectionError):
+            # ligacao fechada pelo servidor (ex: reiniciado): tenta uma vez com uma nova
+            cached.conn.close()
+            if attempt:
+                raise
+    instrument.add(bytes=len(data))
+    result = json.loads(data)
+    if response.status != 200:
+        raise ValueError(result.get("error", f"service error {response.status}"))
+    return result
+
+
+def append(kind, values):
+    request("POST", f"/{kind}/add", body={"values": list(values)})
+
+
+def append_rows(kind, rows):
+    result = storage.AppendResult()
+    body, numbers = [], []
+    for n, row in enumerate(rows, 1):
+        if isinstance(row, ValueError):
+            result.rejected.append((n, str(row)))  # linha que nem se leu: nao vai para o servidor
+        else:
+            numbers.append(n)
+            body.append(list(row) if isinstance(row, tuple) else row)
+    answer = request("POST", f"/{kind}/add_rows", body={"rows": body})
+    result.written = answer["written"]
+    result.rejected += [(numbers[n - 1], error) for n, error in answer["rejected"]]
+    result.rejected.sort()
+    instrument.add(rows=result.written)
+    return result
+
+
+def iter_lines(kind, start=0):
+    """Gera as linhas desde start, PAGE_SIZE de cada vez"""
+    while True:
+        answer = request("GET", f"/{kind}/lines", {"start": start, "stop": start + PAGE_SIZE})
+        if answer["start"] != start:
+            return  # ficheiro substituido a meio da leitura
+        lines = answer["lines"]
+        instrument.add(rows=len(lines))
+        yield from lines
+        start += len(lines)
+        if not lines or start >= answer["total"]:
+            return
+
+
+def iter_records(kind):
+    for line in iter_lines(kind):
+        rec = storage.parse_line(kind, line)
+        if rec is not None:
+            yield rec
+
+
+def search(kind, text, ignore_case=True, fields=False):
+    params = {"q": text, "ignore_case": int(ignore_case)}
+    if fields:
+        params["fields"] = 1
+    lines = request("GET", f"/{kind}/search", params)["lines"]
+    return iter(lines)
+
+
+def find(kind, record_id):
+    return request("GET", f"/{kind}/find", {"id": record_id})["line"]
+
+
+def balances():
+    return request("GET", "/stock/balances")["balances"]
+
+
+def snapshot():
+    return request("GET", "/stock/snapshot")["snapshot"]
+
+
+def movements(start=None, end=None):
+    params = {name: value for name, value in (("start", start), ("end", end)) if value}
+    lines = request("GET", "/stock/movements", params)["lines"]
+    instrument.add(rows=len(lines))
+    return lines
+
+
+def tail(kind, position):
+    """(texto das linhas desde a linha position, nova posicao)"""
+    answer = request("GET", f"/{kind}/lines", {"start": position or 0})
+    text = "".join(line + "\n" for line in answer["lines"])
+    return text, answer["total"]
+
+
+def total(kind):
+    return request("GET", f"/{kind}/total")["total"]
+
+
+class RemoteRows:
+    """Fonte de linhas do tableview.CsvTable a partir do servico"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = total(kind)
+
+    def total(self):
+        return self.count
+
+    def refresh(self):
+        count = total(self.kind)
+        if count < self.count:
+            return False  # ficheiro substituido: a tabela volta a ser criada
+        self.count = count
+        return True
+
+    def rows(self, start, stop):
+        rows = request("GET", f"/{self.kind}/rows", {"start": start, "stop": stop})["rows"]
+        instrument.add(rows=len(rows))
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local JSON service for product/supplier/stock")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--dir", default=".", help="folder with the csv files")
+    args = parser.parse_args(argv)
+    if storage.BACKEND != "csv":
+        parser.error("the service serves the csv files (set GEST_BACKEND=csv)")
+    try:
+        asyncio.run(serve(args.host, args.port, args.dir,
+                          lambda addr: print(f"serving on http://{addr[0]}:{addr[1]}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    instrument.configure(sys.argv)
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+Backend SQLite (opcional) para product/supplier/stock
+- Ativado em gest.ini ([storage] backend = sqlite) ou com GEST_BACKEND=sqlite (ver storage.py)
+- Uma tabela por dataset, em modo WAL, com indices em id, supplier_id, product_id e time
+- Uma ligacao por thread e por base de dados, aberta no primeiro uso e reutilizada
+  (os GUIs e o --batch fazem muitas chamadas)
+- Quando a tabela e criada importa o CSV que ja existir (product.csv, ...) tal como esta,
+  sem recusar linhas: os saldos com sqlite ficam iguais aos do csv
+- import_csv recusa os ids que ja estao na tabela (pode ser executado mais de uma vez)
+- Uma tabela criada antes de haver a coluna time do stock ganha a coluna (ALTER TABLE)
+- export_csv / import_csv mantem o formato CSV compativel com o Excel
+
+Executar: python sqlbackend.py export supplier supplier.csv
+          python sqlbackend.py import stock stock.csv
+"""
+
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+import threading
+
+import instrument
+import storage
+import timeline
+import validate
+from query import ID_FIELDS
+
+INDEXES = {
+    "product": ["id", "supplier_id"],
+    "supplier": ["id"],
+    "stock": ["id", "product_id", "time"],
+}
+
+
+_local = threading.local()
+
+
+def connect(database=None):
+    """Ligacao desta thread a base de dados (a mesma em todas as chamadas da thread)"""
+    database = os.path.abspath(database or storage.DATABASE)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(database)
+    if conn is None:
+        conn = connections[database] = sqlite3.connect(database, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def columns(kind):
+    return storage.DATASETS[kind].record._fields
+
+
+def ensure_table(conn, kind, csvfile=None, load=True):
+    """Cria a tabela (e indices) se nao existir; nesse caso importa o CSV existente (load=False: so cria)"""
+    have = [row[1] for row in conn.execute(f"PRAGMA table_info({kind})")]
+    if have:
+        missing = [c for c in columns(kind) if c not in have]
+        if missing:
+            with conn:
+                for col in missing:
+                    conn.execute(f"ALTER TABLE {kind} ADD COLUMN {col} TEXT")
+                    if col in INDEXES[kind]:
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS {kind}_{col} ON {kind} ({col})")
+        return
+    cols = ", ".join(f"{c} TEXT" for c in columns(kind))
+    with conn:
+        conn.execute(f"CREATE TABLE {kind} ({cols})")
+        for col in INDEXES[kind]:
+            conn.execute(f"CREATE INDEX {kind}_{col} ON {kind} ({col})")
+    csvfile = csvfile or storage.DATASETS[kind].file
+    if load and os.path.exists(csvfile):
+        insert_rows(kind, _csv_rows(kind, csvfile), conn=conn)
+
+
+def _csv_rows(kind, csvfile):
+    # linhas do csv como estao (campos a mais juntam-se no ultimo, como no storage.parse_line)
+    width = len(columns(kind))
+    for _, fields in validate.iter_fields(kind, csvfile):
+        if len(fields) < width:
+            fields += [""] * (width - len(fields))
+        elif len(fields) > width:
+            fields[width - 1:] = [",".join(fields[width - 1:])]
+        yield fields
+
+
+def insert_rows(kind, rows, batch_size=storage.BATCH_SIZE, fsync="none", conn=None):
+    """rows: listas de valores ja limpos (storage.clean); commit por lote com fsync="batch" """
+    conn = conn or connect()
+    ensure_table(conn, kind)
+    marks = ", ".join("?" for _ in columns(kind))
+    sql = f"INSERT INTO {kind} VALUES ({marks})"
+    count = 0
+    batch = []
+    for vals in rows:
+        batch.append(vals)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+            if fsync == "batch":
+                conn.commit()
+    conn.executemany(sql, batch)
+    count += len(batch)
+    conn.commit()
+    instrument.add(rows=count)
+    return count
+
+
+def append_rows(kind, rows, csvfile=None, batch_size=storage.BATCH_SIZE, fsync="none", conn=None):
+    """
+    Limpa as linhas (storage.clean) e insere as validas; devolve um storage.AppendResult.
+    Recusa os ids que ja estao na tabela, repetidos no lote ou no arquivo do csv compactado.
+    """
+    conn = conn or connect()
+    ensure_table(conn, kind)
+    result = storage.AppendResult()
+    archived = storage.archived_ids(storage.path(kind, csvfile))
+    clock = timeline.Clock(last_time(conn)) if storage.DATASETS[kind].stamped else None
+    rows = storage.clean_rows(kind, rows, result, lambda key: key in archived or exists(kind, key, conn), clock)
+    result.written = insert_rows(kind, rows, batch_size, fsync, conn)
+    return result
+
+
+def exists(kind, record_id, conn=None):
+    """True se ja ha um registo com este id (indice em id)"""
+    conn = conn or connect()
+    return conn.execute(f"SELECT 1 FROM {kind} WHERE id = ? LIMIT 1", (record_id,)).fetchone() is not None
+
+
+def _select(kind, where="", params=(), conn=None):
+    conn = conn or connect()
+    ensure_table(conn, kind)
+    cols = ", ".join(columns(kind))
+    return conn.execute(f"SELECT {cols} FROM {kind} {where} ORDER BY rowid", params)
+
+
+def _trim(kind, vals):
+    # linhas sem hora ficam com 3 campos, como no csv
+    if storage.DATASETS[kind].stamped and not vals[-1]:
+        return vals[:-1]
+    return vals
+
+
+def format_line(kind, vals):
+    # mesma linha que o backend CSV escreveria
+    vals = _trim(kind, vals)
+    if storage.DATASETS[kind].quote:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="").writerow(vals)
+        return buf.getvalue()
+    return ",".join(vals)
+
+
+def _line_expr(kind):
+    return " || ',' || ".join(f"coalesce({c}, '')" for c in columns(kind))
+
+
+def iter_records(kind, conn=None):
+    make = storage.DATASETS[kind].record._make
+    for row in _select(kind, conn=conn):
+        row = list(row)
+        if kind == "stock":
+            row[2] = storage.parse_units(row[2] or "")
+        instrument.add(rows=1)
+        yield make(row)
+
+
+def iter_lines(kind, conn=None, where="", params=()):
+    for row in _select(kind, where, params, conn):
+        instrument.add(rows=1)
+        yield format_line(kind, ["" if v is None else v for v in row])
+
+
+def search(kind, term, ignore_case=True, conn=None):
+    """Linhas que contem term (o texto da linha como no CSV, sem aspas)"""
+    line = _line_expr(kind)
+    if ignore_case:
+        where, params = f"WHERE instr(lower({line}), lower(?)) > 0", (term,)
+    else:
+        where, params = f"WHERE instr({line}, ?) > 0", (term,)
+    for row in _select(kind, where, params, conn):
+        yield ",".join(_trim(kind, ["" if v is None else v for v in row]))
+
+
+def query(kind, q, conn=None):
+    """Linhas que passam no query.Query q (as condicoes viram um WHERE; id = ? usa o indice)"""
+    clauses, params = [], []
+    line = _line_expr(kind)
+    for word in q.words:
+        if q.ignore_case:
+            clauses.append(f"instr(lower({line}), lower(?)) > 0")
+        else:
+            clauses.append(f"instr({line}, ?) > 0")
+        params.append(word)
+    for cond in q.conditions:
+        col = cond.field
+        if cond.op == ":" and col in ID_FIELDS:
+            clauses.append(f"{col} = ?")
+        elif cond.op == ":":
+            clauses.append(f"instr(lower({col}), lower(?)) > 0")
+        elif cond.op in ("=", "!="):
+            clauses.append(f"lower(trim({col})) {cond.op} lower(?)")
+        else:
+            clauses.append(f"(trim({col}) <> '' AND CAST({col} AS REAL) {cond.op} ?)")
+        params.append(cond.value)
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    for row in _select(kind, where, params, conn):
+        instrument.add(rows=1)
+        yield ",".join(_trim(kind, ["" if v is None else v for v in row]))
+
+
+def find(kind, record_id, conn=None):
+    row = _select(kind, "WHERE id = ?", (record_id,), conn).fetchone()
+    if row is None:
+        return None
+    return format_line(kind, ["" if v is None else v for v in row])
+
+
+def balances(conn=None):
+    conn = conn or connect()
+    ensure_table(conn, "stock")
+    totals = {}
+    for product, units in conn.execute("SELECT product_id, units FROM stock"):
+        units = storage.parse_units(units or "")
+        if units is not None:
+            totals[product.strip()] = totals.get(product.strip(), 0) + units
+    return totals
+
+
+def movements(start=None, end=None, conn=None):
+    """Linhas do stock com start <= time < end (indice em time; sem start tambem as sem hora)"""
+    clauses, params = [], []
+    if start:
+        clauses.append("time >= ?")
+        params.append(start)
+    if end:
+        clauses.append("coalesce(time, '') < ?")
+        params.append(end)
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    return iter_lines("stock", conn, where, params)
+
+
+def last_time(conn=None):
+    """Hora mais recente do stock ("" se nenhuma linha tiver hora)"""
+    conn = conn or connect()
+    ensure_table(conn, "stock")
+    return conn.execute("SELECT coalesce(max(time), '') FROM stock").fetchone()[0]
+
+
+def last_rowid(kind, conn=None):
+    conn = conn or connect()
+    ensure_table(conn, kind)
+    return conn.execute(f"SELECT coalesce(max(rowid), 0) FROM {kind}").fetchone()[0]
+
+
+def tail(kind, rowid, conn=None):
+    """(texto das linhas com rowid > rowid, ultimo rowid)"""
+    conn = conn or connect()
+    last = last_rowid(kind, conn)
+    if last < rowid:
+        rowid = 0  # tabela recriada: volta ao inicio
+    lines = iter_lines(kind, conn, "WHERE rowid > ? AND rowid <= ?", (rowid, last))
+    return "".join(line + "\n" for line in lines), last
+
+
+class SqlRows:
+    """Fonte de linhas para o tableview.CsvTable (rowid = numero da linha + 1)"""
+
+    def __init__(self, kind, database=None):
+        self.kind = kind
+        self.conn = connect(database)
+        ensure_table(self.conn, kind)
+        self.count = last_rowid(kind, self.conn)
+
+    def total(self):
+        return self.count
+
+    def refresh(self):
+        # as linhas novas sao as de rowid > count: basta contar outra vez
+        self.count = last_rowid(self.kind, self.conn)
+        return True
+
+    def rows(self, start, stop):
+        cur = _select(self.kind, "WHERE rowid > ? AND rowid <= ?", (start, stop), self.conn)
+        rows = [["" if v is None else v for v in row] for row in cur]
+        instrument.add(rows=len(rows))
+        return rows
+
+
+def export_csv(kind, csvfile, conn=None):
+    """Grava a tabela num CSV novo (substitui o ficheiro no fim)"""
+    ds = storage.DATASETS[kind]
+    tmp = csvfile + ".tmp"
+    with open(tmp, "wb") as fh:
+        if ds.bom:
+            fh.write(storage.BOM)
+        for line in iter_lines(kind, conn):
+            fh.write((line + "\n").encode(storage.ENCODING))
+    os.replace(tmp, csvfile)
+
+
+def import_csv(kind, csvfile, conn=None):
+    """
+    Acrescenta as linhas de um CSV a tabela; devolve um storage.AppendResult.
+    Passam pela mesma limpeza do append_rows (ids repetidos recusados), mas sem mudar as horas.
+    """
+    conn = conn or connect()
+    ensure_table(conn, kind, load=False)
+    result = storage.AppendResult()
+    rows = (fields for _, fields in validate.iter_fields(kind, csvfile))
+    rows = storage.clean_rows(kind, rows, result, lambda key: exists(kind, key, conn))
+    result.written = insert_rows(kind, rows, conn=conn)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CSV export/import for the SQLite backend")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("kind", choices=sorted(storage.DATASETS))
+    parser.add_argument("csvfile")
+    parser.add_argument("--db", default=None, help="default: from gest.ini / GEST_DB")
+    args = parser.parse_args(argv)
+    conn = connect(args.db)
+    if args.action == "export":
+        export_csv(args.kind, args.csvfile, conn)
+    else:
+        result = import_csv(args.kind, args.csvfile, conn)
+        for n, error in result.rejected:
+            print(f"row {n}: {error}", file=sys.stderr)
+        print(f"{result.written} rows imported, {len(result.rejected)} rejected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
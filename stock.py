@@ -1,10 +1,29 @@
-print("\033c\033[43;30m\n")
+import sys
+
+import aggregate
+import colcache
+import compact
+import gestcli
+import instrument
+import joins
+import storage
+import timeline
+last=None
+kind="stock"
 files="stock.csv"
 def menu():
     value="""0...add
 1...list
 2...report
-3...exit"""
+3...exit
+4...find id
+5...balances
+6...build search index
+7...join reports
+8...tail (new lines since list)
+9...low stock
+10...compact ledger
+11...movements by time"""
     print(value)
     a=input().strip()
     return int(a)
@@ -15,37 +34,127 @@ def adds():
     b=input().replace(",",";")
     print("units?")
     c=input().replace(",",";")
-    a=a+","+b+","+c+"\n"
-    f1=open(files,"a")
-    f1.write(a)
-    f1.close()
+    try:
+        storage.append(kind,[a,b,c],files)
+    except ValueError as g:
+        print(g)
 def lists():
-    f1=open(files,"r")
-    a=f1.read()
-    f1.close()
+    global last
     print("\033c\033[43;30m\n")
-    print(a)
+    last=storage.tail_position(kind,files)
+    for a in storage.iter_text(kind,files):
+        print(a,end="")
+    print()
+def tails():
+    global last
+    print("\033c\033[43;30m\n")
+    a,last=storage.tail(kind,files,last)
+    print(a,end="")
+    print()
 def reports():
-    f1=open(files,"r")
-    a=f1.read()
-    f1.close()
-    b=a.split("\n")
-    a=""
     print("\033c\033[43;30m\n")
-    print("find wat?")
+    print("find wat? (text, or fields: product:00000000 units>=5)")
     c=input()
-    for d in b:
-        f=d.find(c)
-        if f>-1:
+    try:
+        for d in storage.query(kind,c,files,False):
             print(d)
-w=True
-while w:
-    a=menu()
-    if a==0:
-        adds()
-    if a==1:
-        lists()
-    if a==2:
-        reports()
-    if a>2:
-        break
\ No newline at end of file
+    except ValueError as g:
+        print(g)
+def finds():
+    print("\033c\033[43;30m\n")
+    print("id number?")
+    c=input()
+    d=storage.find(kind,c,files)
+    if d is None:
+        print("not found")
+    else:
+        print(d)
+def balance():
+    print("\033c\033[43;30m\n")
+    b=storage.balances(files)
+    for c in sorted(b):
+        print(c+","+str(b[c]))
+def low():
+    print("\033c\033[43;30m\n")
+    print("units below?")
+    c=float(input().strip())
+    for d,e in colcache.stock_below(c,files):
+        print(d+","+str(e))
+    print("total units received: "+str(colcache.total_units(files,True)))
+def compacts():
+    print("\033c\033[43;30m\n")
+    try:
+        b=compact.compact(files)
+    except ValueError as g:
+        print(g)
+        return
+    if b is None:
+        print("nothing to compact")
+    else:
+        print(str(b["rows"])+" entries in snapshot, last id "+str(b["last_id"]))
+def movements():
+    print("\033c\033[43;30m\n")
+    print("since? (7d, 12h, today, 2026-10-01)")
+    b=input()
+    print("until? (empty for now)")
+    c=input()
+    print("per hour/day/week/month/year? (empty lists the movements)")
+    d=input().strip()
+    try:
+        b=timeline.parse_time(b)
+        c=timeline.parse_time(c)
+        if d:
+            for e in aggregate.by_period(b,c,d,files):
+                print(",".join(str(f) for f in e))
+        else:
+            for e in storage.movements(b,c,files):
+                print(e)
+    except ValueError as g:
+        print(g)
+def indexes():
+    print("\033c\033[43;30m\n")
+    storage.build_search_index(kind,files)
+    print("search index ok")
+def joined():
+    print("\033c\033[43;30m\n")
+    b=list(joins.REPORTS)
+    for c in range(len(b)):
+        print(str(c)+"..."+b[c])
+    c=int(input().strip())
+    print("\033c\033[43;30m\n")
+    for d in joins.run(b[c]):
+        print(d)
+def main():
+    print("\033c\033[43;30m\n")
+    w=True
+    while w:
+        a=menu()
+        if a==0:
+            adds()
+        if a==1:
+            lists()
+        if a==2:
+            reports()
+        if a==4:
+            finds()
+        if a==5:
+            balance()
+        if a==6:
+            indexes()
+        if a==7:
+            joined()
+        if a==8:
+            tails()
+        if a==9:
+            low()
+        if a==10:
+            compacts()
+        if a==11:
+            movements()
+        if a==3 or a>11:
+            break
+if __name__=="__main__":
+    instrument.configure(sys.argv)
+    if len(sys.argv)>1:
+        sys.exit(gestcli.main(kind,sys.argv[1:],files))
+    main()
@@ -1,6 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import os
+import sys
+
+import aggregate
+import colcache
+import compact
+import instrument
+import joins
+import storage
+import timeline
+import trigram
+from tableview import CsvTable
+from worker import TaskBar
+
+FIELDS = ["id", "product", "units", "time"]
 
 class StockGUI:
     def __init__(self, root):
@@ -10,9 +23,7 @@ class StockGUI:
         self.files = "stock.csv"
         
         # Criar ficheiro se não existir
-        if not os.path.exists(self.files):
-            with open(self.files, "w") as f:
-                f.write("")
+        storage.ensure_file("stock", self.files)
         
         self.setup_gui()
     
@@ -48,9 +59,35 @@ class StockGUI:
                                     command=self.reports, width=20)
         self.report_btn.grid(row=2, column=0, pady=5)
         
+        self.find_btn = ttk.Button(buttons_frame, text="4 - Procurar ID", 
+                                  command=self.finds, width=20)
+        self.find_btn.grid(row=3, column=0, pady=5)
+        
+        self.balance_btn = ttk.Button(buttons_frame, text="5 - Saldos", 
+                                     command=self.balances, width=20)
+        self.balance_btn.grid(row=4, column=0, pady=5)
+        
+        self.index_btn = ttk.Button(buttons_frame, text="6 - Criar Índice", 
+                                   command=self.build_index, width=20)
+        self.index_btn.grid(row=5, column=0, pady=5)
+        
+        self.reports_btn = ttk.Button(buttons_frame, text="7 - Relatórios", 
+                                     command=self.show_reports_menu, width=20)
+        self.reports_btn.grid(row=6, column=0, pady=5)
+        
+        # Relatórios que juntam stock/product/supplier (joins.py) e top N / agrupamento (aggregate.py)
+        self.reports_menu = tk.Menu(self.root, tearoff=0)
+        for name in joins.REPORTS:
+            self.reports_menu.add_command(label=name.capitalize(),
+                                          command=lambda n=name: self.join_report(n))
+        self.reports_menu.add_separator()
+        self.reports_menu.add_command(label="Stock baixo...", command=self.low_stock)
+        self.reports_menu.add_command(label="Movimentos por período...", command=self.period_summary)
+        self.reports_menu.add_command(label="Compactar movimentos...", command=self.compact_ledger)
+        
         self.exit_btn = ttk.Button(buttons_frame, text="3 - Sair", 
                                   command=self.root.quit, width=20)
-        self.exit_btn.grid(row=3, column=0, pady=5)
+        self.exit_btn.grid(row=7, column=0, pady=5)
         
         # Área de texto para exibir dados
         text_frame = ttk.Frame(main_frame)
@@ -59,17 +96,34 @@ class StockGUI:
         text_frame.rowconfigure(0, weight=1)
         
         self.text_area = tk.Text(text_frame, width=60, height=20, wrap=tk.WORD,bg='yellow')
-        scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.text_area.yview)
-        self.text_area.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.text_area.yview)
+        self.text_area.configure(yscrollcommand=self.scrollbar.set)
         
         self.text_area.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        # Tabela para listar o stock (só as linhas visíveis são lidas)
+        self.table = CsvTable(text_frame, FIELDS, bg='yellow')
+        self.table.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.table.grid_remove()
         
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set("Pronto")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        # (com barra de progresso e Cancelar para as leituras em segundo plano)
+        self.taskbar = TaskBar(main_frame, textvariable=self.status_var)
+        self.taskbar.cancel_btn.configure(text="Cancelar")
+        self.taskbar.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+    
+    def show_text(self):
+        self.table.grid_remove()
+        self.text_area.grid()
+        self.scrollbar.grid()
+    
+    def show_table(self):
+        self.text_area.grid_remove()
+        self.scrollbar.grid_remove()
+        self.table.grid()
     
     def adds(self):
         """Adicionar novo item ao stock"""
@@ -105,13 +159,11 @@ class StockGUI:
                 return
             
             # Escrever no ficheiro CSV
-            line = f"{id_val},{product_val},{units_val}\n"
             try:
-                with open(self.files, "a") as f:
-                    f.write(line)
+                storage.append("stock", [id_val, product_val, units_val], self.files)
                 self.status_var.set("Item adicionado com sucesso!")
                 add_window.destroy()
-                self.lists()  # Atualizar a lista
+                self.refresh_list()  # Atualizar a lista (so as linhas novas)
             except Exception as e:
                 messagebox.showerror("Erro", f"Erro ao guardar: {str(e)}")
         
@@ -126,24 +178,39 @@ class StockGUI:
         id_entry.focus()
     
     def lists(self):
-        """Listar todo o stock"""
-        try:
-            with open(self.files, "r") as f:
-                content = f.read()
-            
-            self.text_area.delete(1.0, tk.END)
-            if content.strip():
-                self.text_area.insert(1.0, content)
+        """Listar todo o stock (os offsets das linhas são lidos numa thread)"""
+        def on_items(items):
+            self.table.set_source(items[0])
+            if self.table.total():
+                self.show_table()
             else:
+                self.show_text()
+                self.text_area.delete(1.0, tk.END)
                 self.text_area.insert(1.0, "Nenhum item em stock.")
-            
-            self.status_var.set("Stock listado com sucesso!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao ler ficheiro: {str(e)}")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro ao ler ficheiro: {str(error)}")
+                self.status_var.set("Pronto")
+            elif cancelled:
+                self.status_var.set("Listagem cancelada")
+            else:
+                self.status_var.set(f"Stock listado com sucesso! ({self.table.total()} linhas)")
+        
+        self.taskbar.run(lambda task: storage.table_rows("stock", self.files, task.progress),
+                         on_items, on_done, text="A ler o stock...")
+    
+    def refresh_list(self):
+        """Acrescentar à tabela só as linhas novas (lista completa se o ficheiro mudou por fora)"""
+        if self.table.refresh() and self.table.total():
+            self.show_table()
+            self.status_var.set(f"Stock atualizado ({self.table.total()} linhas)")
+        else:
+            self.lists()
     
     def reports(self):
         """Procurar itens no stock"""
-        search_term = simpledialog.askstring("Procurar", "Encontrar o quê?")
+        search_term = simpledialog.askstring("Procurar", "Encontrar o quê?\n(ou campos, ex: product:00000000 units>=5)")
         
         if search_term is None:  # Usuário cancelou
             return
@@ -152,27 +219,208 @@ class StockGUI:
             messagebox.showwarning("Aviso", "Por favor, insira um termo de pesquisa.")
             return
         
-        try:
-            with open(self.files, "r") as f:
-                lines = f.readlines()
-            
-            self.text_area.delete(1.0, tk.END)
-            
-            found_items = []
-            for line in lines:
-                if search_term.lower() in line.lower():
-                    found_items.append(line.strip())
-            
-            if found_items:
-                result = "\n".join(found_items)
-                self.text_area.insert(1.0, result)
-                self.status_var.set(f"Encontrados {len(found_items)} itens com '{search_term}'")
+        self.show_text()
+        self.text_area.delete(1.0, tk.END)
+        found = [0]
+        
+        # Mostrar os resultados à medida que são encontrados
+        def on_items(lines):
+            text = "\n".join(line.strip() for line in lines)
+            self.text_area.insert(tk.END, ("\n" if found[0] else "") + text)
+            found[0] += len(lines)
+            self.status_var.set(f"A procurar... {found[0]} itens")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro na pesquisa: {str(error)}")
+            elif found[0]:
+                extra = " (cancelado)" if cancelled else ""
+                self.status_var.set(f"Encontrados {found[0]} itens com '{search_term}'{extra}")
+            elif cancelled:
+                self.status_var.set("Pesquisa cancelada")
             else:
                 self.text_area.insert(1.0, f"Nenhum item encontrado com '{search_term}'")
                 self.status_var.set(f"Nenhum resultado para '{search_term}'")
-                
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro na pesquisa: {str(e)}")
+        
+        self.taskbar.run(lambda task: storage.query("stock", search_term, self.files, progress=task.progress),
+                         on_items, on_done, text="A procurar...")
+    
+    def finds(self):
+        """Procurar uma entrada pelo ID (usa o indice stock.csv.idx)"""
+        entry_id = simpledialog.askstring("Procurar ID", "ID do Número de Entrada?")
+        
+        if entry_id is None:  # Usuário cancelou
+            return
+        
+        entry_id = entry_id.strip()
+        
+        def on_items(items):
+            line = items[0]
+            self.show_text()
+            self.text_area.delete(1.0, tk.END)
+            if line is not None:
+                self.text_area.insert(1.0, line)
+                self.status_var.set(f"Entrada '{entry_id}' encontrada")
+            else:
+                self.text_area.insert(1.0, f"Nenhuma entrada com ID '{entry_id}'")
+                self.status_var.set(f"Nenhum resultado para '{entry_id}'")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro na pesquisa: {str(error)}")
+        
+        self.taskbar.run(lambda task: storage.find("stock", entry_id, self.files), on_items, on_done,
+                         text="A procurar ID...")
+    
+    def balances(self):
+        """Unidades em stock por produto"""
+        def on_items(items):
+            totals = items[0]
+            self.show_text()
+            self.text_area.delete(1.0, tk.END)
+            if totals:
+                lines = [f"{product},{units}" for product, units in sorted(totals.items())]
+                self.text_area.insert(1.0, "\n".join(lines))
+            else:
+                self.text_area.insert(1.0, "Nenhum item em stock.")
+            self.status_var.set(f"Saldos de {len(totals)} produtos")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro ao calcular saldos: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Saldos cancelados")
+        
+        self.taskbar.run(lambda task: storage.balances(self.files, progress=task.progress),
+                         on_items, on_done, text="A calcular saldos...")
+    
+    def build_index(self):
+        """Criar o índice de pesquisa (trigramas) usado pelo Procurar"""
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro ao criar índice: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Criação do índice cancelada")
+            else:
+                self.status_var.set(f"Índice de pesquisa criado: {trigram.index_path(self.files)}")
+        
+        self.taskbar.run(lambda task: storage.build_search_index("stock", self.files, task.progress), None, on_done,
+                         text="A criar índice de pesquisa...")
+
+    def show_reports_menu(self):
+        """Mostrar a lista de relatórios por baixo do botão"""
+        x = self.reports_btn.winfo_rootx()
+        y = self.reports_btn.winfo_rooty() + self.reports_btn.winfo_height()
+        self.reports_menu.tk_popup(x, y)
+    
+    def join_report(self, name):
+        """Relatório que junta ficheiros (hash join, uma passagem por ficheiro)"""
+        self.show_text()
+        self.text_area.delete(1.0, tk.END)
+        count = [0]
+        
+        def on_items(lines):
+            self.text_area.insert(tk.END, ("\n" if count[0] else "") + "\n".join(lines))
+            count[0] += len(lines)
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro no relatório: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Relatório cancelado")
+            else:
+                if not count[0]:
+                    self.text_area.insert(1.0, "Nenhum resultado.")
+                self.status_var.set(f"{name}: {count[0]} linhas")
+        
+        self.taskbar.run(lambda task: joins.run(name, task.progress, stock_file=self.files),
+                         on_items, on_done, text=f"{name}...")
+
+    def low_stock(self):
+        """Produtos com menos de N unidades (cache em colunas, colcache.py)"""
+        limit = simpledialog.askfloat("Stock baixo", "Menos de quantas unidades?", initialvalue=10)
+        if limit is None:
+            return
+        
+        def work(task):
+            return colcache.stock_below(limit, self.files), colcache.total_units(self.files, received=True)
+        
+        def on_items(items):
+            rows, received = items[0]
+            self.show_text()
+            self.text_area.delete(1.0, tk.END)
+            lines = [f"{product},{units}" for product, units in rows]
+            self.text_area.insert(1.0, "\n".join(lines) if lines else "Nenhum produto abaixo do limite.")
+            self.status_var.set(f"{len(rows)} produtos com menos de {limit:g} unidades "
+                                f"(total recebido: {received})")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro no relatório: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Relatório cancelado")
+        
+        self.taskbar.run(work, on_items, on_done, text="A ler a cache de colunas...")
+
+    def period_summary(self):
+        """Movimentos, entradas e saídas por período (só lê as linhas do intervalo, timeline.py)"""
+        since = simpledialog.askstring("Movimentos por período", "Desde? (7d, 24h, today, 2026-10-01)",
+                                       initialvalue="7d")
+        if since is None:
+            return
+        period = simpledialog.askstring("Movimentos por período", "Por hour / day / week / month / year?",
+                                        initialvalue="day")
+        if period is None:
+            return
+        try:
+            start = timeline.parse_time(since)
+        except ValueError as ex:
+            messagebox.showerror("Erro", str(ex))
+            return
+        period = period.strip().lower()
+        
+        def on_items(items):
+            rows = items[0]
+            self.show_text()
+            self.text_area.delete(1.0, tk.END)
+            lines = ["periodo,movimentos,entradas,saidas,liquido"]
+            lines += [",".join(str(v) for v in row) for row in rows]
+            self.text_area.insert(1.0, "\n".join(lines) if rows else "Nenhum movimento no intervalo.")
+            self.status_var.set(f"{sum(row[1] for row in rows)} movimentos desde {start or 'o início'} (UTC)")
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro no relatório: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Relatório cancelado")
+        
+        self.taskbar.run(lambda task: aggregate.by_period(start, None, period, self.files, task.progress),
+                         on_items, on_done, text="A ler os movimentos...")
+
+    def compact_ledger(self):
+        """Passar os movimentos para o snapshot de saldos e para o arquivo (compact.py)"""
+        if not messagebox.askyesno("Compactar",
+                                   "Passar os movimentos atuais para o snapshot de saldos?\n"
+                                   f"As linhas ficam em {compact.archive_path(self.files)}."):
+            return
+        
+        def on_items(items):
+            snap = items[0]
+            if snap is None:
+                self.status_var.set("Nada para compactar")
+                return
+            self.status_var.set(f"Compactado: {snap['rows']} movimentos no snapshot "
+                                f"(última entrada {snap['last_id']})")
+            self.lists()
+        
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Erro", f"Erro ao compactar: {str(error)}")
+            elif cancelled:
+                self.status_var.set("Compactação cancelada")
+        
+        self.taskbar.run(lambda task: compact.compact(self.files, progress=task.progress),
+                         on_items, on_done, text="A compactar movimentos...")
 
 def main():
     root = tk.Tk()
@@ -181,4 +429,5 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    instrument.configure(sys.argv)
     main()
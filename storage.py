@@ -0,0 +1,543 @@
+"""
+Acesso aos dados partilhado pelos seis scripts (CLI e GUIs)
+- Um Dataset por ficheiro: product.csv, supplier.csv, stock.csv
+- Registos compactos (namedtuple): Product, Supplier, StockEntry
+- Sempre utf-8 (o product.csv continua com BOM no inicio, como o productgui)
+- append / append_rows limpam os valores como os scripts originais e mantem os indices
+- Os ids sao unicos: um id que ja existe (indice <csv>.idx em memoria, e o indice do arquivo
+  das linhas compactadas pelo compact.py) ou repetido no mesmo lote e recusado, sem ler o ficheiro
+- Cada operacao e medida pelo instrument (tempo, bytes, linhas, resultados)
+- Os appends ao csv sao feitos com lock (filelock) e o append de um registo passa pelo groupcommit
+- iter_records / iter_text / search / find leem em streaming
+- search / query no csv passam pela cache LRU de resultados (searchcache.py)
+- O stock tem uma 4a coluna opcional, time (UTC, timeline.py), posta em cada append dentro
+  do lock; movements(inicio, fim) le so as linhas desse intervalo (pesquisa binaria)
+- Backend: csv (por omissao) ou sqlite (sqlbackend.py), escolhido em gest.ini:
+      [storage]
+      backend = sqlite
+      database = gest.db
+  ou com as variaveis GEST_BACKEND / GEST_DB (tem prioridade sobre o gest.ini)
+  Com sqlite o csvfile so e usado para importar/exportar o CSV
+- Com service = http://127.0.0.1:8765 no [storage] (ou GEST_SERVICE) os pedidos vao para o
+  servico local (service.py), que tem os CSV em memoria; o csvfile e ignorado
+"""
+
+import configparser
+import csv
+import io
+import itertools
+import os
+from collections import ChainMap, namedtuple
+
+import csvindex
+import csvscan
+import filelock
+import instrument
+import ledger
+import parallel
+import query as querylang
+import searchcache
+import timeline
+import trigram
+from ledger import parse_units  # storage.parse_units para o resto do programa
+
+ENCODING = "utf-8"
+BOM = b"\xef\xbb\xbf"
+BATCH_SIZE = 10000
+BUFFER_SIZE = 1 << 20
+CONFIG_FILE = "gest.ini"
+
+Product = namedtuple("Product", "id name supplier_id about")
+Supplier = namedtuple("Supplier", "id name address phone email about")
+StockEntry = namedtuple("StockEntry", "id product_id units time")
+
+# required: quantos campos do inicio sao obrigatorios
+# quote: True usa csv quoting (suppliergui), False troca "," por ";" (scripts originais)
+# stamped: o ultimo campo e a hora (timeline.py), opcional na entrada e posto na escrita
+Dataset = namedtuple("Dataset", "name file record labels required quote bom stamped")
+
+DATASETS = {
+    "product": Dataset("product", "product.csv", Product,
+                       ["id number", "name", "supplier id", "about"], 1, False, True, False),
+    "supplier": Dataset("supplier", "supplier.csv", Supplier,
+                        ["id", "name", "address", "phone", "email", "about"], 1, True, False, False),
+    "stock": Dataset("stock", "stock.csv", StockEntry,
+                     ["id", "product", "units", "time"], 3, False, False, True),
+}
+
+
+def _read_config():
+    cfg = configparser.ConfigParser()
+    cfg.read(os.environ.get("GEST_CONFIG", CONFIG_FILE), encoding="utf-8")
+    section = cfg["storage"] if cfg.has_section("storage") else {}
+    backend = os.environ.get("GEST_BACKEND") or section.get("backend", "csv")
+    database = os.environ.get("GEST_DB") or section.get("database", "gest.db")
+    service = os.environ.get("GEST_SERVICE") or section.get("service", "")
+    return backend.strip().lower(), database, service.strip()
+
+
+BACKEND, DATABASE, SERVICE = _read_config()
+if BACKEND not in ("csv", "sqlite"):
+    raise ValueError(f"unknown storage backend {BACKEND!r} (expected csv or sqlite)")
+
+
+def _sql():
+    # sqlbackend so e importado se estiver ativo (e importa este modulo)
+    if BACKEND != "sqlite":
+        return None
+    import sqlbackend
+    return sqlbackend
+
+
+def _remote():
+    # cliente do servico local (service.py), se estiver configurado
+    if not SERVICE:
+        return None
+    import service
+    return service
+
+
+class AppendResult:
+    def __init__(self):
+        self.written = 0
+        self.rejected = []  # (numero da linha de entrada, motivo)
+
+    def __repr__(self):
+        return f"AppendResult(written={self.written}, rejected={len(self.rejected)})"
+
+
+def path(kind, csvfile=None):
+    return csvfile or DATASETS[kind].file
+
+
+@instrument.operation("ensure_file")
+def ensure_file(kind, csvfile=None):
+    # criar o ficheiro vazio se nao existir (sem header, como os scripts originais)
+    csvfile = path(kind, csvfile)
+    sql = _sql()
+    if _remote():
+        pass  # os ficheiros sao do servico
+    elif sql:
+        # a tabela e criada a partir do CSV (se existir) na primeira vez
+        sql.ensure_table(sql.connect(), kind, csvfile)
+    elif not os.path.exists(csvfile):
+        open(csvfile, "wb").close()
+    return csvfile
+
+
+def parse_line(kind, line):
+    """Linha (str, sem fim de linha) -> registo do dataset, ou None se vazia"""
+    if not line:
+        return None
+    ds = DATASETS[kind]
+    n = len(ds.record._fields)
+    parts = next(csv.reader([line])) if '"' in line else line.split(",")
+    if len(parts) < n:
+        parts += [""] * (n - len(parts))
+    elif len(parts) > n:
+        parts[n - 1:] = [",".join(parts[n - 1:])]
+    if kind == "stock":
+        parts[2] = parse_units(parts[2])
+    return ds.record._make(parts)
+
+
+@instrument.operation("read")
+def iter_records(kind, csvfile=None, progress=None):
+    """Gera os registos do backend ativo (memoria constante)"""
+    remote = _remote()
+    if remote:
+        return remote.iter_records(kind)
+    sql = _sql()
+    if sql:
+        return sql.iter_records(kind)
+    return iter_csv_records(kind, csvfile, progress=progress)
+
+
+def iter_csv_records(kind, csvfile=None, start=0, progress=None):
+    """Gera os registos do ficheiro (bloco a bloco, memoria constante)"""
+    csvfile = path(kind, csvfile)
+    for offset, chunk in csvscan.iter_chunks(csvfile, start, progress=progress):
+        text = chunk.decode(ENCODING, errors="replace")
+        if offset == 0:
+            text = text.lstrip("\ufeff")
+        for line in text.splitlines():
+            rec = parse_line(kind, line)
+            if rec is not None:
+                yield rec
+
+
+def load_all(kind, csvfile=None):
+    return list(iter_records(kind, csvfile))
+
+
+@instrument.operation("list")
+def iter_text(kind, csvfile=None):
+    """O ficheiro como texto, em blocos (para o List das CLI)"""
+    remote = _remote()
+    if remote:
+        yield from _join_lines(remote.iter_lines(kind))
+        return
+    sql = _sql()
+    if sql:
+        yield from _join_lines(sql.iter_lines(kind))
+        return
+    csvfile = path(kind, csvfile)
+    for offset, chunk in csvscan.iter_chunks(csvfile):
+        text = chunk.decode(ENCODING, errors="replace").replace("\r\n", "\n")
+        yield text.lstrip("\ufeff") if offset == 0 else text
+
+
+def _join_lines(lines, size=BATCH_SIZE):
+    batch = []
+    for line in lines:
+        batch.append(line + "\n")
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+@instrument.operation("tail")
+def tail(kind, csvfile=None, position=None):
+    """
+    (texto das linhas acrescentadas desde position, nova posicao).
+    position None, ou ficheiro truncado/substituido: devolve o ficheiro todo.
+    """
+    remote = _remote()
+    if remote:
+        return remote.tail(kind, position)
+    sql = _sql()
+    if sql:
+        return sql.tail(kind, position or 0)
+    csvfile = path(kind, csvfile)
+    if position is None or position.csvfile != csvfile:
+        position = csvscan.Tail(csvfile)
+    data = position.read()
+    if data is None:
+        position = csvscan.Tail(csvfile)
+        data = position.read()
+    text = data.decode(ENCODING, errors="replace").replace("\r\n", "\n")
+    return text.lstrip("\ufeff"), position
+
+
+def tail_position(kind, csvfile=None):
+    """Posicao no fim dos dados atuais (para o proximo tail so mostrar o que for novo)"""
+    remote = _remote()
+    if remote:
+        return remote.total(kind)
+    sql = _sql()
+    if sql:
+        return sql.last_rowid(kind)
+    csvfile = path(kind, csvfile)
+    return csvscan.Tail(csvfile, csvscan.end_of_lines(csvfile))
+
+
+def read_text(kind, csvfile=None):
+    return "".join(iter_text(kind, csvfile))
+
+
+@instrument.operation("search")
+def search(kind, term, csvfile=None, ignore_case=True, progress=None):
+    """Linhas que contem term (gerador); no supplier compara as linhas sem aspas"""
+    remote = _remote()
+    if remote:
+        return remote.search(kind, term, ignore_case)
+    sql = _sql()
+    if sql:
+        return sql.search(kind, term, ignore_case)
+    csvfile = path(kind, csvfile)
+    unquote = DATASETS[kind].quote
+    return searchcache.cached(
+        csvfile, ("search", kind, ignore_case, term.lower() if ignore_case else term),
+        lambda: csvscan.iter_matches(csvfile, term, ignore_case, unquote, progress),
+        lambda start, end: csvscan.scan_matches(csvfile, term, ignore_case, unquote, start, end))
+
+
+def query(kind, text, csvfile=None, ignore_case=True, progress=None):
+    """
+    Report com a linguagem do query.py (ex: name:ibm units>=5); um texto sem campos
+    e o mesmo que search(). ValueError se a pesquisa estiver mal escrita.
+    """
+    if not querylang.is_query(kind, text):
+        return search(kind, text, csvfile, ignore_case, progress)
+    return _query(kind, querylang.compile(kind, text, ignore_case), csvfile, progress)
+
+
+@instrument.operation("search")
+def _query(kind, q, csvfile, progress):
+    remote = _remote()
+    if remote:
+        return remote.search(kind, q.text, q.ignore_case, fields=True)
+    sql = _sql()
+    if sql:
+        return sql.query(kind, q)
+    csvfile = path(kind, csvfile)
+    if not os.path.exists(csvfile):
+        return iter([])
+    if q.id_key is not None:
+        # id exato: um seek no indice <csv>.idx
+        line = csvindex.lookup(csvfile, q.id_key)
+        return iter([q.output(line)] if line is not None and q.matches(line) else [])
+    return searchcache.cached(csvfile, ("query",) + q.key,
+                              lambda: _scan_query(kind, q, csvfile, progress),
+                              lambda start, end: _scan_query(kind, q, csvfile, None, start, end))
+
+
+def _scan_query(kind, q, csvfile, progress, start=0, end=None):
+    """Resultados do _query lidos do ficheiro (end: so as linhas entre start e end)"""
+    if end is None and not (q.literal and len(q.literal) >= 3 and trigram.exists(csvfile)):
+        # sem indice de trigramas: ficheiros grandes em varios processos
+        hits = parallel.query(csvfile, kind, q.text, q.ignore_case, progress)
+        if hits is not None:
+            return hits
+    if q.literal and end is not None:
+        lines = csvscan.scan_matches(csvfile, q.literal, True, False, start, end)
+    elif q.literal:
+        # so as linhas com o texto (blocos inteiros com bytes.find, ou o indice de trigramas)
+        lines = csvscan.iter_matches(csvfile, q.literal, True, False, progress)
+    else:
+        lines = (csvindex.decode_line(raw) for _, raw in csvscan.iter_lines(csvfile, start, end, progress))
+    return (q.output(line) for line in lines if q.matches(line))
+
+
+@instrument.operation("find")
+def find(kind, record_id, csvfile=None):
+    """Linha com este id (um seek no indice <csv>.idx ou o indice do sqlite) ou None"""
+    sql = _sql()
+    remote = _remote()
+    if remote:
+        line = remote.find(kind, record_id)
+    elif sql:
+        line = sql.find(kind, record_id)
+    else:
+        csvfile = path(kind, csvfile)
+        line = csvindex.lookup(csvfile, record_id) if os.path.exists(csvfile) else None
+    instrument.add(matches=line is not None)
+    return line
+
+
+def clean(kind, row):
+    """Devolve (valores, erro) para uma linha de entrada (lista ou dict)"""
+    ds = DATASETS[kind]
+    if isinstance(row, ValueError):
+        return None, str(row)  # linha que nem se conseguiu ler (ex: JSON invalido no bulkimport)
+    if not isinstance(row, (list, tuple, dict)):
+        return None, f"expected a list or an object, got {type(row).__name__}"
+    if isinstance(row, dict):
+        row = [row.get(f, row.get(label, "")) for f, label in zip(ds.record._fields, ds.labels)]
+    width = len(ds.labels)
+    if ds.stamped and len(row) == width - 1:
+        row = list(row) + [""]  # sem hora: e posta na escrita
+    if len(row) != width:
+        expected = f"{width - 1} or {width}" if ds.stamped else width
+        return None, f"expected {expected} fields, got {len(row)}"
+    vals = []
+    for v in row:
+        v = "" if v is None else str(v).strip()
+        # cada registo numa so linha
+        v = v.replace("\r", " ").replace("\n", " ")
+        if not ds.quote:
+            v = v.replace(",", ";")
+        vals.append(v)
+    for i in range(ds.required):
+        if not vals[i]:
+            return None, f"{ds.labels[i]} is required"
+    if ds.stamped and vals[-1]:
+        stamp = timeline.normalize(vals[-1])
+        if stamp is None:
+            return None, f"{ds.labels[-1]} {vals[-1]!r} is not a time (ex: 2026-10-18T07:20:00Z)"
+        vals[-1] = stamp
+    return vals, None
+
+
+def archived_ids(csvfile):
+    """
+    Ids das linhas que o compact.py tirou do csv: as do arquivo e as apagadas com --truncate
+    (<csv>.dropped). Serve para "id in archived_ids(...)".
+    """
+    indexes = []
+    archived = ledger.archive_range(csvfile)
+    if archived and os.path.exists(archived[0]):
+        indexes.append(csvindex.load(archived[0]))
+    snap = ledger.read_snapshot(csvfile) or {}
+    dropped = snap.get("dropped") or (snap.get("previous") or {}).get("dropped")
+    if dropped and os.path.exists(dropped):
+        indexes.append(csvindex.load(dropped))
+    return ChainMap(*indexes)
+
+
+def duplicate(kind, key):
+    """Mensagem de erro para um id que ja existe"""
+    return f"{DATASETS[kind].labels[0]} {key} already exists"
+
+
+def append(kind, values, csvfile=None):
+    """
+    Acrescenta um registo; ValueError se nao passar a validacao ou se o id ja existir.
+    Passa pelo groupcommit: registos de varias threads no mesmo intervalo vao num so write.
+    """
+    remote = _remote()
+    if remote:
+        remote.append(kind, values)  # o servico faz as escritas em serie
+        return
+    import groupcommit
+    groupcommit.writer().submit(kind, values, csvfile).wait()
+
+
+@instrument.operation("append")
+def append_rows(kind, rows, csvfile=None, batch_size=BATCH_SIZE, fsync="none"):
+    """
+    Acrescenta as linhas validas num so open(), em lotes.
+    fsync: "batch" (apos cada lote), "end" (uma vez no fim) ou "none".
+    No csv tudo e feito com o lock do ficheiro (filelock), incluindo os indices.
+    """
+    remote = _remote()
+    if remote:
+        return remote.append_rows(kind, rows)
+    sql = _sql()
+    if sql:
+        return sql.append_rows(kind, rows, csvfile, batch_size, fsync)
+    result = AppendResult()
+    csvfile = path(kind, csvfile)
+    with filelock.locked(csvfile):
+        _append_csv(kind, rows, csvfile, batch_size, fsync, result)
+    return result
+
+
+def _append_csv(kind, rows, csvfile, batch_size, fsync, result):
+    ds = DATASETS[kind]
+    before = csvindex.stamp(csvfile)
+    offset = before[0] if before else 0
+    # ids ja gravados (dict do .idx, em dia com o ficheiro: estamos dentro do lock)
+    index = csvindex.load(csvfile)
+    archived = archived_ids(csvfile)
+    clock = timeline.Clock(timeline.last_time(csvfile)) if ds.stamped else None
+    seen = set()
+    entries = []
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_MINIMAL)
+
+    with open(csvfile, "ab", buffering=BUFFER_SIZE) as fh:
+        if offset == 0 and ds.bom:
+            fh.write(BOM)
+            offset = len(BOM)
+        batch = []
+        for n, row in enumerate(rows, 1):
+            vals, error = clean(kind, row)
+            if not error and (vals[0] in index or vals[0] in seen or vals[0] in archived):
+                error = duplicate(kind, vals[0])
+            if not error and clock:
+                error = clock.stamp(vals)
+            if error:
+                result.rejected.append((n, error))
+                continue
+            seen.add(vals[0])
+            if ds.quote:
+                writer.writerow(vals)
+                line = buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            else:
+                line = ",".join(vals) + "\n"
+            data = line.encode(ENCODING)
+            batch.append(data)
+            entries.append((vals[0], offset))
+            offset += len(data)
+            if len(batch) >= batch_size:
+                _write_batch(fh, batch, fsync == "batch")
+                result.written += len(batch)
+                batch = []
+        _write_batch(fh, batch, fsync in ("batch", "end"))
+        result.written += len(batch)
+
+    instrument.add(bytes=offset - (before[0] if before else 0), rows=result.written)
+    csvindex.record_appends(csvfile, entries, before)
+    trigram.record_append(csvfile)
+
+
+def clean_rows(kind, rows, result, exists, clock=None):
+    """Gera os valores limpos das linhas validas; as recusadas vao para result.rejected"""
+    seen = set()
+    for n, row in enumerate(rows, 1):
+        vals, error = clean(kind, row)
+        if not error and (vals[0] in seen or exists(vals[0])):
+            error = duplicate(kind, vals[0])
+        if not error and clock:
+            error = clock.stamp(vals)
+        if error:
+            result.rejected.append((n, error))
+        else:
+            seen.add(vals[0])
+            yield vals
+
+
+def _write_batch(fh, batch, sync):
+    fh.writelines(batch)
+    if sync:
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def build_search_index(kind, csvfile=None, progress=None):
+    if _remote() or _sql():
+        return None  # os indices do sqlite sao criados com a tabela
+    return trigram.build(path(kind, csvfile), progress)
+
+
+@instrument.operation("balances", "stock")
+def balances(csvfile=None, progress=None):
+    """Unidades em stock por id de produto (ledger.balances no backend csv)"""
+    remote = _remote()
+    if remote:
+        return remote.balances()
+    sql = _sql()
+    if sql:
+        return sql.balances()
+    return ledger.balances(path("stock", csvfile), progress=progress)
+
+
+def snapshot(csvfile=None):
+    """Snapshot das linhas compactadas do stock (ledger.load_snapshot), ou None; nao alterar"""
+    remote = _remote()
+    if remote:
+        return remote.snapshot()
+    if _sql():
+        return None  # o compact.py so existe para o csv
+    return ledger.load_snapshot(path("stock", csvfile))
+
+
+@instrument.operation("movements", "stock")
+def movements(start=None, end=None, csvfile=None, progress=None):
+    """
+    Linhas do stock com start <= time < end (horas do timeline.parse_time; None = sem limite).
+    No csv: pesquisa binaria pelos offsets (so le as linhas do intervalo), tambem no arquivo
+    das linhas compactadas; sqlite: indice em time.
+    """
+    remote = _remote()
+    if remote:
+        return iter(remote.movements(start, end))
+    sql = _sql()
+    if sql:
+        return sql.movements(start, end)
+    csvfile = path("stock", csvfile)
+    lines = timeline.iter_range(csvfile, start, end, progress)
+    archived = ledger.archive_range(csvfile)
+    if archived:
+        # linhas compactadas (compact.py): o arquivo tambem esta por ordem de tempo
+        lines = itertools.chain(timeline.iter_range(archived[0], start, end, limit=archived[1]), lines)
+    return lines
+
+
+@instrument.operation("list")
+def table_rows(kind, csvfile=None, progress=None):
+    """Fonte de linhas para o tableview.CsvTable (total() e rows(inicio, fim))"""
+    remote = _remote()
+    if remote:
+        return remote.RemoteRows(kind)
+    sql = _sql()
+    if sql:
+        return sql.SqlRows(kind)
+    csvfile = path(kind, csvfile)
+    offsets, end = csvscan.line_offsets(csvfile, progress=progress)
+    return csvscan.LineRows(csvfile, offsets, end)
@@ -1,10 +1,21 @@
-print("\033c\033[43;30m\n")
+import sys
+
+import gestcli
+import instrument
+import joins
+import storage
+last=None
+kind="supplier"
 files="supplier.csv"
 def menu():
     value="""0...add
 1...list
 2...report
-3...exit"""
+3...exit
+4...find id
+5...build search index
+6...join reports
+7...tail (new lines since list)"""
     print(value)
     a=input().strip()
     return int(a)
@@ -21,37 +32,77 @@ def adds():
     e=input().replace(",",";")
     print("about?")
     f=input().replace(",",";")
-    a=a+","+b+","+c+","+d+","+e+","+f+"\n"
-    f1=open(files,"a")
-    f1.write(a)
-    f1.close()
+    try:
+        storage.append(kind,[a,b,c,d,e,f],files)
+    except ValueError as g:
+        print(g)
 def lists():
-    f1=open(files,"r")
-    a=f1.read()
-    f1.close()
+    global last
     print("\033c\033[43;30m\n")
-    print(a)
+    last=storage.tail_position(kind,files)
+    for a in storage.iter_text(kind,files):
+        print(a,end="")
+    print()
+def tails():
+    global last
+    print("\033c\033[43;30m\n")
+    a,last=storage.tail(kind,files,last)
+    print(a,end="")
+    print()
 def reports():
-    f1=open(files,"r")
-    a=f1.read()
-    f1.close()
-    b=a.split("\n")
-    a=""
     print("\033c\033[43;30m\n")
-    print("find wat?")
+    print("find wat? (text, or fields: name:ibm phone:0000)")
     c=input()
-    for d in b:
-        f=d.find(c)
-        if f>-1:
+    try:
+        for d in storage.query(kind,c,files,False):
             print(d)
-w=True
-while w:
-    a=menu()
-    if a==0:
-        adds()
-    if a==1:
-        lists()
-    if a==2:
-        reports()
-    if a>2:
-        break
\ No newline at end of file
+    except ValueError as g:
+        print(g)
+def finds():
+    print("\033c\033[43;30m\n")
+    print("id number?")
+    c=input()
+    d=storage.find(kind,c,files)
+    if d is None:
+        print("not found")
+    else:
+        print(d)
+def indexes():
+    print("\033c\033[43;30m\n")
+    storage.build_search_index(kind,files)
+    print("search index ok")
+def joined():
+    print("\033c\033[43;30m\n")
+    b=list(joins.REPORTS)
+    for c in range(len(b)):
+        print(str(c)+"..."+b[c])
+    c=int(input().strip())
+    print("\033c\033[43;30m\n")
+    for d in joins.run(b[c]):
+        print(d)
+def main():
+    print("\033c\033[43;30m\n")
+    w=True
+    while w:
+        a=menu()
+        if a==0:
+            adds()
+        if a==1:
+            lists()
+        if a==2:
+            reports()
+        if a==4:
+            finds()
+        if a==5:
+            indexes()
+        if a==6:
+            joined()
+        if a==7:
+            tails()
+        if a==3 or a>7:
+            break
+if __name__=="__main__":
+    instrument.configure(sys.argv)
+    if len(sys.argv)>1:
+        sys.exit(gestcli.main(kind,sys.argv[1:],files))
+    main()
@@ -1,44 +1,43 @@
 # supplier_gui.py
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, filedialog
+from tkinter import ttk, messagebox, simpledialog
 from tkinter.scrolledtext import ScrolledText
-import csv
 import os
+import sys
+
+import instrument
+import joins
+import storage
+import trigram
+from tableview import CsvTable
+from worker import TaskBar
 
 CSV_FILE = "supplier.csv"
 FIELDS = ["id", "name", "address", "phone", "email", "about"]
 
 def ensure_csv_exists():
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            # opcional: não escrever header para manter o mesmo formato antigo
-            # writer.writerow(FIELDS)
-            pass
+    # não escrever header para manter o mesmo formato antigo
+    storage.ensure_file("supplier", CSV_FILE)
 
 def add_record(values):
-    # values: list com 6 strings
-    with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(values)
+    # values: list com 6 strings (gravadas com csv quoting)
+    storage.append("supplier", values, CSV_FILE)
 
 def read_all_text():
     if not os.path.exists(CSV_FILE):
         return ""
-    with open(CSV_FILE, "r", newline="", encoding="utf-8") as f:
-        return f.read()
+    return storage.read_text("supplier", CSV_FILE)
+
+def iter_search(term, progress=None):
+    # gerador: as linhas vao saindo enquanto o ficheiro e lido
+    return storage.query("supplier", term, CSV_FILE, progress=progress)
 
 def search_records(term):
-    results = []
-    if not os.path.exists(CSV_FILE):
-        return results
-    with open(CSV_FILE, "r", newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            line = ",".join(row)
-            if term.lower() in line.lower():
-                results.append(line)
-    return results
+    return list(iter_search(term))
+
+def find_record(record_id):
+    # procura pelo id exato usando o indice supplier.csv.idx (um seek)
+    return storage.find("supplier", record_id, CSV_FILE)
 
 # --- GUI ---
 class SupplierGUI(tk.Tk):
@@ -60,6 +59,13 @@ class SupplierGUI(tk.Tk):
         filemenu.add_command(label="Add", command=self.open_add_dialog)
         filemenu.add_command(label="List", command=self.show_list)
         filemenu.add_command(label="Report (Search)", command=self.open_search_dialog)
+        filemenu.add_command(label="Find id", command=self.open_find_dialog)
+        filemenu.add_command(label="Build search index", command=self.build_search_index)
+        # relatórios que juntam supplier/product/stock
+        reports = tk.Menu(filemenu, tearoff=0)
+        for name in joins.REPORTS:
+            reports.add_command(label=name.capitalize(), command=lambda n=name: self.join_report(n))
+        filemenu.add_cascade(label="Reports", menu=reports)
         filemenu.add_separator()
         filemenu.add_command(label="Open CSV (Explorer)", command=self.open_csv_location)
         filemenu.add_command(label="Exit", command=self.quit)
@@ -85,11 +91,16 @@ class SupplierGUI(tk.Tk):
         ttk.Button(btn_frame, text="Add", command=self.open_add_dialog).pack(side="left", padx=4)
         ttk.Button(btn_frame, text="List", command=self.show_list).pack(side="left", padx=4)
         ttk.Button(btn_frame, text="Report (Search)", command=self.open_search_dialog).pack(side="left", padx=4)
-        ttk.Button(btn_frame, text="Refresh", command=self.show_list).pack(side="left", padx=4)
-        # Text area for list / output
+        ttk.Button(btn_frame, text="Find id", command=self.open_find_dialog).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="Refresh", command=self.refresh_list).pack(side="left", padx=4)
+        # Text area for search output
         self.text = ScrolledText(frame, wrap="none", height=25,bg="#FFFF00")
-        self.text.pack(fill="both", expand=True, pady=(6,0))
         self.text.configure(font=("Courier New", 10))
+        # Tabela para o List: só as linhas visíveis são lidas do ficheiro
+        self.table = CsvTable(frame, FIELDS, bg="#FFFF00")
+        # Estado / progresso / Cancel das leituras feitas em segundo plano
+        self.taskbar = TaskBar(frame)
+        self.taskbar.pack(side="bottom", fill="x", pady=(6,0))
 
         # show existing on start
         self.show_list()
@@ -99,30 +110,136 @@ class SupplierGUI(tk.Tk):
         self.wait_window(dlg)
         if dlg.values:
             # write to CSV (use values sanitized)
-            add_record(dlg.values)
+            try:
+                add_record(dlg.values)
+            except ValueError as ex:
+                # ex: id que ja existe
+                messagebox.showerror("Error", str(ex))
+                return
             messagebox.showinfo("Saved", "Registo gravado em: " + CSV_FILE)
-            self.show_list()
+            self.refresh_list()
+
+    def show_text(self):
+        self.table.pack_forget()
+        self.text.pack(fill="both", expand=True, pady=(6,0))
+
+    def show_table(self):
+        self.text.pack_forget()
+        self.table.pack(fill="both", expand=True, pady=(6,0))
 
     def show_list(self):
-        content = read_all_text()
-        # mostrar tal como no txt: cada linha com virgulas (compatível Excel)
-        self.text.delete("1.0", tk.END)
-        if content.strip() == "":
-            self.text.insert(tk.END, "(ficheiro vazio)\n")
+        ensure_csv_exists()
+
+        def on_items(items):
+            self.table.set_source(items[0])
+            if self.table.total() == 0:
+                self.show_text()
+                self.text.delete("1.0", tk.END)
+                self.text.insert(tk.END, "(ficheiro vazio)\n")
+            else:
+                self.show_table()
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                self.taskbar.set_text("")
+            elif cancelled:
+                self.taskbar.set_text("List cancelado")
+            else:
+                self.taskbar.set_text(f"{self.table.total()} linhas")
+
+        self.taskbar.run(lambda task: storage.table_rows("supplier", CSV_FILE, task.progress),
+                         on_items, on_done, text="A ler " + CSV_FILE + "...")
+
+    def refresh_list(self):
+        """So le as linhas acrescentadas desde o ultimo List (List completo se o ficheiro mudou)"""
+        if self.table.refresh() and self.table.total():
+            self.show_table()
+            self.taskbar.set_text(f"{self.table.total()} linhas")
         else:
-            self.text.insert(tk.END, content)
+            self.show_list()
 
     def open_search_dialog(self):
-        term = simpledialog.askstring("Search / Report", "Find what?")
+        term = simpledialog.askstring("Search / Report", "Find what?\n(or fields, e.g. name:ibm phone:0000)")
         if term is None:
             return
-        results = search_records(term)
+        self.show_text()
         self.text.delete("1.0", tk.END)
-        if not results:
-            self.text.insert(tk.END, "Nenhum resultado encontrado.\n")
-        else:
-            for r in results:
-                self.text.insert(tk.END, r + "\n")
+        found = [0]
+
+        def on_items(lines):
+            self.text.insert(tk.END, "\n".join(lines) + "\n")
+            found[0] += len(lines)
+            self.taskbar.set_text(f"A procurar... {found[0]} resultados")
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                return
+            if not found[0]:
+                self.text.insert(tk.END, "Nenhum resultado encontrado.\n")
+            self.taskbar.set_text(f"{found[0]} resultados" + (" (cancelado)" if cancelled else ""))
+
+        self.taskbar.run(lambda task: iter_search(term, task.progress), on_items, on_done,
+                         text="A procurar...")
+
+    def open_find_dialog(self):
+        record_id = simpledialog.askstring("Find id", "id?")
+        if record_id is None:
+            return
+        record_id = record_id.strip()
+
+        def on_items(items):
+            line = items[0]
+            self.show_text()
+            self.text.delete("1.0", tk.END)
+            if line is None:
+                self.text.insert(tk.END, "Nenhum resultado encontrado.\n")
+            else:
+                self.text.insert(tk.END, line + "\n")
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+            self.taskbar.set_text("")
+
+        # a primeira procura pode ter de (re)criar o indice de ids
+        self.taskbar.run(lambda task: find_record(record_id), on_items, on_done, text="A procurar id...")
+
+    def build_search_index(self):
+        ensure_csv_exists()
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                self.taskbar.set_text("")
+            elif cancelled:
+                self.taskbar.set_text("Indice de pesquisa cancelado")
+            else:
+                self.taskbar.set_text("Indice de pesquisa criado: " + trigram.index_path(CSV_FILE))
+
+        self.taskbar.run(lambda task: storage.build_search_index("supplier", CSV_FILE, task.progress), None, on_done,
+                         text="A criar indice de pesquisa...")
+
+    def join_report(self, name):
+        self.show_text()
+        self.text.delete("1.0", tk.END)
+        count = [0]
+
+        def on_items(lines):
+            self.text.insert(tk.END, "\n".join(lines) + "\n")
+            count[0] += len(lines)
+
+        def on_done(error, cancelled):
+            if error:
+                messagebox.showerror("Error", str(error))
+                return
+            if not count[0]:
+                self.text.insert(tk.END, "Nenhum resultado encontrado.\n")
+            self.taskbar.set_text(f"{name}: {count[0]} linhas" + (" (cancelado)" if cancelled else ""))
+
+        self.taskbar.run(lambda task: joins.run(name, task.progress, supplier_file=CSV_FILE),
+                         on_items, on_done, text=name + "...")
 
     def open_csv_location(self):
         # abrir a pasta que contém o CSV
@@ -192,6 +309,7 @@ class AddDialog(tk.Toplevel):
         self.destroy()
 
 if __name__ == "__main__":
+    instrument.configure(sys.argv)
     app = SupplierGUI()
     app.mainloop()
 
@@ -0,0 +1,139 @@
+"""
+Tabela virtual para listar CSV grandes nos GUIs (Tkinter)
+- ttk.Treeview com uma coluna por campo (FIELDS / labels de cada GUI)
+- So as linhas visiveis (mais um pequeno buffer) estao no Treeview
+- Um array com o offset de cada linha permite saltar para qualquer posicao com um seek
+- As linhas vem de uma fonte com total() e rows(inicio, fim): csvscan.LineRows ou
+  sqlbackend.SqlRows (ver storage.table_rows)
+- refresh() acrescenta so as linhas novas (a fonte le apenas os bytes novos)
+- A scrollbar vertical e controlada aqui (nao pelo Treeview), em numero de linhas
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+import csvscan
+
+BUFFER_ROWS = 50
+
+
+class CsvTable(ttk.Frame):
+    def __init__(self, master, columns, bg=None, **kw):
+        super().__init__(master, **kw)
+        self.columns = list(columns)
+        self.source = None
+        self.first = 0
+        # cache das linhas ja lidas: [inicio, lista de linhas]
+        self._cache_start = 0
+        self._cache_rows = []
+
+        style = ttk.Style(self)
+        style_name = "Treeview"
+        if bg:
+            style_name = "CsvTable.Treeview"
+            style.configure(style_name, background=bg, fieldbackground=bg)
+        self.row_height = int(style.lookup(style_name, "rowheight") or 20)
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", style=style_name)
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120, stretch=True)
+        self.yscroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.xscroll = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.xscroll.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.yscroll.grid(row=0, column=1, sticky="ns")
+        self.xscroll.grid(row=1, column=0, sticky="ew")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", lambda e: self.render())
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self.scroll(-1) or "break")
+        self.tree.bind("<Down>", lambda e: self.scroll(1) or "break")
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.visible_rows()) or "break")
+        self.tree.bind("<Next>", lambda e: self.scroll(self.visible_rows()) or "break")
+        self.tree.bind("<Home>", lambda e: self.goto(0) or "break")
+        self.tree.bind("<End>", lambda e: self.goto(self.total()) or "break")
+
+    def load(self, csvfile):
+        """Le so os offsets das linhas (8 bytes por linha) e mostra o inicio"""
+        offsets, end = csvscan.line_offsets(csvfile)
+        self.set_rows(csvfile, offsets, end)
+
+    def set_rows(self, csvfile, offsets, end):
+        # offsets calculados fora (ex: numa thread com csvscan.line_offsets)
+        self.set_source(csvscan.LineRows(csvfile, offsets, end))
+
+    def set_source(self, source):
+        self.source = source
+        self.first = 0
+        self._cache_rows = []
+        self.render()
+
+    def refresh(self):
+        """Mostra as linhas acrescentadas (so le as novas); False se for preciso um load completo"""
+        if self.source is None or not self.source.refresh():
+            return False
+        self._cache_rows = []
+        self.render()
+        return True
+
+    def total(self):
+        return self.source.total() if self.source is not None else 0
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            height = int(self.tree.cget("height")) * self.row_height
+        # uma linha fica para o cabecalho
+        return max(1, height // self.row_height - 1)
+
+    def rows(self, start, stop):
+        cache_stop = self._cache_start + len(self._cache_rows)
+        if start < self._cache_start or stop > cache_stop:
+            self._cache_start = max(0, start - BUFFER_ROWS)
+            self._cache_rows = self.source.rows(self._cache_start, min(self.total(), stop + BUFFER_ROWS))
+        return self._cache_rows[start - self._cache_start:stop - self._cache_start]
+
+    def render(self):
+        self.tree.delete(*self.tree.get_children())
+        total = self.total()
+        if not total:
+            self.yscroll.set(0, 1)
+            return
+        count = self.visible_rows()
+        self.first = max(0, min(self.first, total - count))
+        stop = min(total, self.first + count)
+        for row in self.rows(self.first, stop):
+            values = row[:len(self.columns)] + [""] * (len(self.columns) - len(row))
+            if len(row) > len(self.columns):
+                # campos a mais ficam juntos na ultima coluna
+                values[-1] = ",".join(row[len(self.columns) - 1:])
+            self.tree.insert("", tk.END, values=values)
+        self.yscroll.set(self.first / total, stop / total)
+
+    def goto(self, row):
+        self.first = max(0, row)
+        self.render()
+
+    def scroll(self, delta):
+        self.goto(self.first + delta)
+
+    def yview(self, *args):
+        # comandos da scrollbar: ("moveto", fracao) ou ("scroll", n, "units"/"pages")
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.goto(int(float(args[1]) * self.total()))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.visible_rows()
+            self.scroll(step)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
@@ -0,0 +1,201 @@
+"""
+Hora dos movimentos do stock (4a coluna do stock.csv, opcional)
+- Gravada em UTC, sempre com o mesmo formato: 2026-10-18T07:20:00Z (ordena como texto)
+- Linhas antigas sem hora ficam no inicio do ficheiro e contam como anteriores a todas
+- Clock: a hora posta em cada append, dentro do lock do ficheiro; nunca fica antes da ultima
+  linha gravada, por isso o stock.csv esta sempre por ordem de tempo
+- seek_time(): pesquisa binaria nos offsets do ficheiro (le uma linha por passo), sem indice:
+  os movimentos do ultimo dia so leem o fim de um ledger de varios anos
+- parse_time(): o que o utilizador escreve nas pesquisas -> hora gravada
+      7d, 12h, 30m, 2w          ha quanto tempo (a partir de agora)
+      now, today
+      2026-10-01, 2026-10-01 08:00   hora local
+      2026-10-01T08:00:00Z           UTC
+- bucket(): periodo de uma hora para os resumos (hour, day, week, month, year, em UTC)
+"""
+
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import csvindex
+import csvscan
+import instrument
+
+FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+TAIL_SIZE = 4096
+PERIODS = ("hour", "day", "week", "month", "year")
+AGO = re.compile(r"^(\d+)\s*([mhdw])$")
+STAMP = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ\Z")
+UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def now():
+    return time.strftime(FORMAT, time.gmtime())
+
+
+def _format(moment):
+    return moment.astimezone(timezone.utc).strftime(FORMAT)
+
+
+def normalize(text):
+    """Hora de um registo (ISO 8601, sem zona = UTC) no formato gravado, ou None se nao for uma hora"""
+    try:
+        moment = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return _format(moment)
+
+
+def is_stamp(text):
+    """True se o texto ja esta no formato gravado (sem converter)"""
+    return STAMP.match(text) is not None
+
+
+def parse_time(text, current=None):
+    """Hora escrita pelo utilizador -> hora gravada (None se o texto for vazio)"""
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    current = current or datetime.now(timezone.utc)
+    m = AGO.match(text)
+    if m:
+        return _format(current - timedelta(**{UNITS[m.group(2)]: int(m.group(1))}))
+    if text == "now":
+        return _format(current)
+    if text == "today":
+        local = current.astimezone()
+        return _format(local.replace(hour=0, minute=0, second=0, microsecond=0))
+    try:
+        moment = datetime.fromisoformat(text.upper())
+    except ValueError:
+        raise ValueError(f"expected a time like 7d, 12h, 2026-10-01 or 2026-10-01T08:00:00Z, got {text!r}")
+    if moment.tzinfo is None:
+        moment = moment.astimezone()  # hora local
+    return _format(moment)
+
+
+def bucket(stamp, period):
+    """Periodo (texto) de uma hora gravada; "" para as linhas sem hora"""
+    if not stamp:
+        return ""
+    if period == "hour":
+        return stamp[:13] + ":00"
+    if period == "day":
+        return stamp[:10]
+    if period == "week":
+        year, week, _ = datetime.strptime(stamp[:10], "%Y-%m-%d").isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return stamp[:7]
+    if period == "year":
+        return stamp[:4]
+    raise ValueError(f"unknown period {period!r} (expected one of {', '.join(PERIODS)})")
+
+
+def line_time(raw):
+    """Hora de uma linha do stock (bytes): "" se nao tiver, None se a linha estiver vazia"""
+    parts = raw.split(b",")
+    if len(parts) < 4:
+        return "" if raw.strip() else None
+    return parts[3].strip().decode("ascii", "replace")
+
+
+def last_time(csvfile):
+    """Hora da ultima linha completa do ficheiro ("" se nao tiver hora ou o ficheiro estiver vazio)"""
+    end = csvscan.end_of_lines(csvfile)
+    if not end:
+        return ""
+    with open(csvfile, "rb") as fh:
+        start = max(0, end - TAIL_SIZE)
+        fh.seek(start)
+        lines = fh.read(end - start).splitlines()
+    for raw in reversed(lines if start == 0 else lines[1:]):
+        stamp = line_time(raw)
+        if stamp is not None:
+            return stamp
+    return ""
+
+
+class Clock:
+    """Horas das linhas acrescentadas: a hora atual, mas nunca antes da ultima linha gravada"""
+
+    def __init__(self, last=""):
+        self.last = last or ""
+        self.now = now()
+
+    def stamp(self, vals):
+        """Poe a hora em vals[-1] se estiver vazia; devolve o erro se for anterior a ultima"""
+        stamp = vals[-1]
+        if not stamp:
+            stamp = vals[-1] = max(self.now, self.last)
+        elif stamp < self.last:
+            return f"time {stamp} is before the last movement ({self.last})"
+        self.last = stamp
+        return None
+
+
+def _probe(fh, pos, end):
+    # primeira linha nao vazia a partir de pos: (offset, hora, tamanho); hora None se nao houver
+    fh.seek(pos)
+    while pos < end:
+        raw = fh.readline()
+        if not raw:
+            break
+        stamp = line_time(raw)
+        if stamp is not None:
+            return pos, stamp, len(raw)
+        pos += len(raw)
+    return end, None, 0
+
+
+def seek_time(csvfile, stamp, start=0, end=None):
+    """
+    Offset da primeira linha com hora >= stamp, entre start e end (linhas completas).
+    Pesquisa binaria nos bytes: cada passo le so a linha a meio do intervalo.
+    """
+    if end is None:
+        end = csvscan.end_of_lines(csvfile)
+    lo, hi = start, end
+    read = 0
+    with open(csvfile, "rb") as fh:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mid > lo:
+                # inicio da linha seguinte a mid
+                fh.seek(mid - 1)
+                read += len(fh.readline())
+                mid = fh.tell()
+                if mid >= hi:
+                    mid = lo  # nao ha inicio de linha na segunda metade
+            pos, found, size = _probe(fh, mid, hi)
+            read += size
+            if found is None:
+                hi = mid  # so linhas vazias ate hi
+            elif found < stamp:
+                lo = pos + size
+            else:
+                hi = pos
+    instrument.add(bytes=read)
+    return lo
+
+
+def iter_range(csvfile, start=None, end=None, progress=None, limit=None):
+    """
+    Gera as linhas (str) com start <= hora < end; sem start tambem as linhas sem hora.
+    limit: so ate este offset (ex: arquivo de uma compactacao interrompida).
+    """
+    if not os.path.exists(csvfile):
+        return
+    last = csvscan.end_of_lines(csvfile)
+    if limit is not None:
+        last = min(last, limit)
+    lo = seek_time(csvfile, start, 0, last) if start else 0
+    hi = seek_time(csvfile, end, lo, last) if end else last
+    for _, raw in csvscan.iter_lines(csvfile, lo, hi, progress):
+        line = csvindex.decode_line(raw)
+        if line:
+            yield line
@@ -0,0 +1,257 @@
+"""
+Indice de trigramas (opcional) para o "Report (search)"
+- Cada linha do CSV e partida em trigramas (3 bytes do texto em minusculas)
+- O indice guarda trigrama -> numeros de linha e o offset de cada linha
+- Uma pesquisa so le as linhas candidatas (as que tem todos os trigramas do termo)
+- So e usado depois de criado com build(); fica em <csv>.tri
+- As linhas acrescentadas depois do ultimo save sao indexadas ao carregar
+  (so o fim do ficheiro), e o .tri e regravado quando esse fim cresce muito
+- Formato do .tri (binario, little endian; lido com array.fromfile, sem pickle):
+      cabecalho  GTRI, versao, tamanho indexado, linhas, trigramas, bytes de controlo
+      controlo   os ultimos bytes indexados do csv (ficheiro substituido?)
+      offsets    Q por linha
+      trigramas  3 bytes cada, e o numero de linhas de cada um (I)
+      linhas     I, as listas de todos os trigramas seguidas
+  Um .tri com outro cabecalho / versao (ou cortado) e criado outra vez
+"""
+
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+import csvindex
+import instrument
+
+CHECK_SIZE = 64
+MAGIC = b"GTRI"
+VERSION = 1
+HEADER = struct.Struct("<4sHQQQH")
+SAVE_EVERY = 0.1  # regravar o .tri quando as linhas novas passam 10% do total
+PROGRESS_ROWS = 10000
+
+# cache em memoria: caminho do csv -> estado
+_cache = {}
+
+
+def index_path(csvfile):
+    return csvfile + ".tri"
+
+
+def exists(csvfile):
+    return os.path.exists(index_path(csvfile))
+
+
+def grams(data):
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+def row_grams(raw):
+    line = csvindex.decode_line(raw)
+    keys = grams(line.lower().encode("utf-8"))
+    if '"' in line:
+        keys |= grams(csvindex.unquote_line(line).lower().encode("utf-8"))
+    return keys
+
+
+def _check_bytes(fh, offset):
+    start = max(0, offset - CHECK_SIZE)
+    fh.seek(start)
+    return fh.read(offset - start)
+
+
+def _empty():
+    return {"size": 0, "check": b"", "saved_rows": 0,
+            "offsets": array("Q"), "postings": {}}
+
+
+def _catch_up(state, fh, progress=None):
+    """Indexa as linhas completas depois de state["size"]"""
+    offsets = state["offsets"]
+    postings = state["postings"]
+    offset = state["size"]
+    size = os.fstat(fh.fileno()).st_size
+    fh.seek(offset)
+    for raw in fh:
+        if not raw.endswith(b"\n"):
+            break
+        row = len(offsets)
+        if progress and row % PROGRESS_ROWS == 0:
+            progress(offset, size)
+        offsets.append(offset)
+        for key in row_grams(raw):
+            rows = postings.get(key)
+            if rows is None:
+                rows = postings[key] = array("I")
+            rows.append(row)
+        offset += len(raw)
+    if offset != state["size"]:
+        state["size"] = offset
+        state["check"] = _check_bytes(fh, offset)
+
+
+def _write_array(fh, values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(fh)
+
+
+def _read_array(fh, code, count):
+    values = array(code)
+    values.fromfile(fh, count)  # EOFError se o ficheiro estiver cortado
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _save(csvfile, state):
+    state["saved_rows"] = len(state["offsets"])
+    postings = state["postings"]
+    keys = sorted(postings)
+    tmp = index_path(csvfile) + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, state["size"], state["saved_rows"], len(keys), len(state["check"])))
+        fh.write(state["check"])
+        _write_array(fh, state["offsets"])
+        fh.write(b"".join(keys))
+        _write_array(fh, array("I", (len(postings[key]) for key in keys)))
+        for key in keys:
+            _write_array(fh, postings[key])
+    os.replace(tmp, index_path(csvfile))
+
+
+def _read(path):
+    """Estado gravado no .tri; ValueError se nao for um indice desta versao"""
+    with open(path, "rb") as fh:
+        header = fh.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError("truncated trigram index")
+        magic, version, size, rows, count, check = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a trigram index version {VERSION}")
+        state = _empty()
+        state["size"] = size
+        state["saved_rows"] = rows
+        state["check"] = fh.read(check)
+        state["offsets"] = _read_array(fh, "Q", rows)
+        keys = fh.read(3 * count)
+        lengths = _read_array(fh, "I", count)
+        if len(state["check"]) != check or len(keys) != 3 * count:
+            raise ValueError("truncated trigram index")
+        everything = _read_array(fh, "I", sum(lengths))
+    postings = state["postings"]
+    start = 0
+    for i, length in enumerate(lengths):
+        postings[keys[3 * i:3 * i + 3]] = everything[start:start + length]
+        start += length
+    return state
+
+
+def build(csvfile, progress=None):
+    """Cria (ou recria) o indice de trigramas deste CSV"""
+    state = _empty()
+    if os.path.exists(csvfile):
+        with open(csvfile, "rb") as fh:
+            _catch_up(state, fh, progress)
+    _save(csvfile, state)
+    _cache[os.path.abspath(csvfile)] = state
+    return state
+
+
+def load(csvfile):
+    """Estado do indice em dia com o CSV (None se o indice nao foi criado)"""
+    if not exists(csvfile) or not os.path.exists(csvfile):
+        return None
+    state = _cache.get(os.path.abspath(csvfile))
+    if state is None:
+        try:
+            state = _read(index_path(csvfile))
+        except (OSError, ValueError, EOFError):
+            return build(csvfile)
+    with open(csvfile, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if state["size"] > size or _check_bytes(fh, state["size"]) != state["check"]:
+            # ficheiro truncado ou substituido
+            return build(csvfile)
+        _catch_up(state, fh)
+    if len(state["offsets"]) - state["saved_rows"] > max(1000, SAVE_EVERY * state["saved_rows"]):
+        _save(csvfile, state)
+    _cache[os.path.abspath(csvfile)] = state
+    return state
+
+
+def record_append(csvfile):
+    """Chamar depois de acrescentar linhas: indexa so as novas"""
+    if exists(csvfile):
+        load(csvfile)
+
+
+def _candidates(state, needle):
+    keys = grams(needle)
+    lists = []
+    for key in keys:
+        rows = state["postings"].get(key)
+        if rows is None:
+            return []
+        lists.append(rows)
+    lists.sort(key=len)
+    result = []
+    for row in lists[0]:
+        for rows in lists[1:]:
+            i = bisect_left(rows, row)
+            if i == len(rows) or rows[i] != row:
+                break
+        else:
+            result.append(row)
+    return result
+
+
+def search(csvfile, term, ignore_case=True, unquote=False, progress=None):
+    """
+    Gerador com as linhas que contem term, ou None se o indice nao pode ser usado
+    (nao existe ou o termo tem menos de 3 bytes).
+    """
+    needle = term.lower().encode("utf-8")
+    if len(needle) < 3:
+        return None
+    state = load(csvfile)
+    if state is None:
+        return None
+    return _verify(csvfile, state, term, ignore_case, unquote, progress)
+
+
+def _verify(csvfile, state, term, ignore_case, unquote, progress):
+    needle = term.lower() if ignore_case else term
+    offsets = state["offsets"]
+    with open(csvfile, "rb") as fh:
+        raws = []
+        rows = _candidates(state, needle.lower().encode("utf-8"))
+        for done, row in enumerate(rows):
+            fh.seek(offsets[row])
+            raw = fh.readline()
+            instrument.add(bytes=len(raw), rows=1)
+            raws.append(raw)
+            if len(raws) >= 1000:
+                if progress:
+                    progress(done, len(rows))
+                yield from _matching(raws, needle, ignore_case, unquote)
+                raws = []
+        # ultima linha ainda sem \n (nao indexada)
+        fh.seek(state["size"])
+        raw = fh.read()
+        instrument.add(bytes=len(raw), rows=1 if raw else 0)
+        raws.append(raw)
+        yield from _matching(raws, needle, ignore_case, unquote)
+
+
+def _matching(raws, needle, ignore_case, unquote):
+    for raw in raws:
+        if not raw:
+            continue
+        line = csvindex.decode_line(raw)
+        if unquote and '"' in line:
+            line = csvindex.unquote_line(line)
+        if needle in (line.lower() if ignore_case else line):
+            yield line
@@ -0,0 +1,295 @@
+"""
+Validacao da integridade dos tres CSV (antes do export para o Excel)
+- Uma passagem por ficheiro, em streaming: supplier.csv, depois product.csv, depois stock.csv
+- Encontra:
+      fields     numero de campos errado
+      missing    campo obrigatorio vazio (ids do stock)
+      units      unidades do stock que nao sao um numero
+      time       hora do stock que nao e uma hora, ou anterior a da linha de cima
+                 (a pesquisa por tempo precisa do ficheiro por ordem)
+      duplicate  id repetido no mesmo ficheiro (no stock tambem um id ja compactado:
+                 stock.archive.csv ou <csv>.dropped, ver storage.archived_ids)
+      orphan     supplier id do product que nao existe no supplier.csv,
+                 product id do stock que nao existe no product.csv
+- Os ids ficam num set; com --bloom, ou quando o ficheiro tem mais de MAX_SET_IDS
+  linhas (estimativa pelo tamanho), num filtro de Bloom (BloomFilter) com --error-rate:
+  os orphan continuam certos mas alguns podem escapar; os duplicate passam a "possible duplicate"
+- Mostra as contagens e os primeiros --examples casos de cada tipo (com o numero da linha)
+- Com sqlite / servico le os registos do backend (storage.iter_records); a linha e a
+  posicao do registo
+
+Executar: python validate.py [--dir pasta] [--bloom] [--error-rate 0.001] [--examples 20] [--json]
+          (codigo de saida 1 se houver problemas)
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+
+import csvscan
+import instrument
+import storage
+import timeline
+
+MAX_SET_IDS = 20_000_000
+ERROR_RATE = 0.001
+EXAMPLES = 20
+SAMPLE_SIZE = 1 << 20  # bytes lidos para estimar o numero de linhas
+
+
+class IdSet:
+    """Ids vistos (set): add() devolve False se o id ja existia"""
+    exact = True
+
+    def __init__(self):
+        self.ids = set()
+
+    def add(self, key):
+        ids = self.ids
+        if key in ids:
+            return False
+        ids.add(key)
+        return True
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom em bytearray (k posicoes por double hashing do blake2b).
+    add() devolve False se o id talvez ja existisse; "in" pode dar falsos positivos, nunca falsos negativos.
+    """
+    exact = False
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(storage.ENCODING), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def add(self, key):
+        array = self.array
+        new = False
+        for pos in self._positions(key):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not array[byte] & bit:
+                array[byte] |= bit
+                new = True
+        self.count += new
+        return new
+
+    def __contains__(self, key):
+        array = self.array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+
+def estimate_rows(csvfile):
+    """Numero de linhas aproximado (tamanho / media das linhas no primeiro MiB)"""
+    size = os.path.getsize(csvfile)
+    with open(csvfile, "rb") as fh:
+        sample = fh.read(SAMPLE_SIZE)
+    lines = sample.count(b"\n")
+    if not lines:
+        return 1
+    return int(size / (len(sample) / lines) * 1.1) + 1
+
+
+def id_set(csvfile, bloom=False, error_rate=ERROR_RATE, max_set=MAX_SET_IDS):
+    rows = estimate_rows(csvfile) if os.path.exists(csvfile) else 0
+    if bloom or rows > max_set:
+        return BloomFilter(rows, error_rate)
+    return IdSet()
+
+
+class Report:
+    """Contagens por (ficheiro, problema) e os primeiros exemplos de cada"""
+
+    def __init__(self, examples=EXAMPLES):
+        self.examples = examples
+        self.counts = {}
+        self.samples = {}
+        self.rows = {}
+        self.seconds = {}
+
+    def add(self, kind, problem, line_no, detail):
+        key = (kind, problem)
+        n = self.counts.get(key, 0)
+        self.counts[key] = n + 1
+        if n < self.examples:
+            self.samples.setdefault(key, []).append((line_no, detail))
+
+    @property
+    def problems(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        return {"rows": self.rows, "seconds": self.seconds, "problems": self.problems,
+                "counts": {f"{kind}.{problem}": n for (kind, problem), n in self.counts.items()},
+                "examples": {f"{kind}.{problem}": [{"line": n, "detail": d} for n, d in samples]
+                             for (kind, problem), samples in self.samples.items()}}
+
+    def lines(self):
+        for kind in storage.DATASETS:
+            if kind in self.rows:
+                yield f"{storage.DATASETS[kind].file}: {self.rows[kind]:,} rows in {self.seconds[kind]:.1f} s"
+        if not self.counts:
+            yield "no problems found"
+            return
+        for (kind, problem), n in self.counts.items():
+            yield f"{storage.DATASETS[kind].file}: {n:,} {problem}"
+            for line_no, detail in self.samples[(kind, problem)]:
+                yield f"    line {line_no}: {detail}"
+
+
+def iter_fields(kind, csvfile, progress=None):
+    """Gera (numero da linha, campos) de cada linha nao vazia; aspas so no supplier (csv)"""
+    quote = storage.DATASETS[kind].quote
+    reader = csv.reader
+    line_no = 0
+    for offset, chunk in csvscan.iter_chunks(csvfile, progress=progress):
+        text = chunk.decode(storage.ENCODING, "replace")
+        if offset == 0:
+            text = text.lstrip("\ufeff")
+        lines = text.split("\n")
+        if not lines[-1]:
+            lines.pop()  # o vazio depois do ultimo \n
+        for line in lines:
+            line_no += 1
+            if line.endswith("\r"):
+                line = line[:-1]
+            if not line:
+                continue
+            if quote and '"' in line:
+                yield line_no, next(reader([line]))
+            else:
+                yield line_no, line.split(",")
+
+
+def _local():
+    return storage.BACKEND == "csv" and not storage.SERVICE
+
+
+def iter_rows(kind, csvfile, progress=None):
+    """(numero da linha, campos) do backend ativo: iter_fields no csv, registos com sqlite / servico"""
+    if _local():
+        return iter_fields(kind, csvfile, progress)
+    records = storage.iter_records(kind, csvfile, progress=progress)
+    return ((n, ["" if v is None else str(v) for v in rec]) for n, rec in enumerate(records, 1))
+
+
+def check(kind, csvfile, report, ids, parents=None, progress=None):
+    """
+    Uma passagem por csvfile: poe os ids em ids e verifica o id do pai em parents.
+    parents: (indice do campo, set de ids do outro ficheiro, nome do outro ficheiro) ou None.
+    """
+    ds = storage.DATASETS[kind]
+    width = len(ds.labels)
+    # a hora do stock e opcional (linhas antigas)
+    widths = (width - 1, width) if ds.stamped else (width,)
+    expected = " or ".join(map(str, widths))
+    possible = "duplicate" if ids.exact else "possible duplicate"
+    archived = storage.archived_ids(csvfile) if kind == "stock" else {}
+    last = ""
+    rows = 0
+    start = time.perf_counter()
+    for line_no, fields in iter_rows(kind, csvfile, progress):
+        rows += 1
+        if len(fields) not in widths:
+            report.add(kind, "fields", line_no, f"expected {expected} fields, got {len(fields)}")
+            continue
+        key = fields[0].strip()
+        if not key:
+            report.add(kind, "missing", line_no, f"{ds.labels[0]} is empty")
+        elif not ids.add(key):
+            report.add(kind, possible, line_no, f"id {key}")
+        elif key in archived:
+            report.add(kind, "duplicate", line_no, f"id {key} (already compacted)")
+        if kind == "stock":
+            if not fields[1].strip():
+                report.add(kind, "missing", line_no, f"{ds.labels[1]} is empty")
+            if storage.parse_units(fields[2]) is None:
+                report.add(kind, "units", line_no, f"units {fields[2]!r} is not a number")
+            stamp = fields[3].strip() if len(fields) == width else ""
+            if stamp:
+                if not timeline.is_stamp(stamp):
+                    report.add(kind, "time", line_no, f"time {stamp!r} is not like 2026-10-18T07:20:00Z")
+                elif stamp < last:
+                    report.add(kind, "time", line_no, f"time {stamp} is before the line above ({last})")
+                else:
+                    last = stamp
+            elif last:
+                report.add(kind, "time", line_no, "no time after lines with time")
+        if parents is not None:
+            index, parent_ids, parent_file = parents
+            parent = fields[index].strip()
+            if parent and parent not in parent_ids:
+                report.add(kind, "orphan", line_no, f"{ds.labels[index]} {parent} not in {parent_file}")
+    report.rows[kind] = rows
+    report.seconds[kind] = time.perf_counter() - start
+    instrument.add(rows=rows)
+    return ids
+
+
+@instrument.operation("validate", "all")
+def validate(folder=".", bloom=False, error_rate=ERROR_RATE, examples=EXAMPLES, max_set=MAX_SET_IDS,
+             progress=None):
+    """Report com os problemas dos tres ficheiros de folder (os que existirem)"""
+    report = Report(examples)
+    files = {kind: os.path.join(folder, ds.file) for kind, ds in storage.DATASETS.items()}
+    local = _local()
+    known = {}
+    for kind, parent in (("supplier", None), ("product", ("supplier", 2)), ("stock", ("product", 1))):
+        csvfile = files[kind]
+        if local and not os.path.exists(csvfile):
+            continue
+        parents = None
+        if parent and parent[0] in known:
+            parents = (parent[1], known[parent[0]], storage.DATASETS[parent[0]].file)
+        ids = id_set(csvfile, bloom, error_rate, max_set)
+        known[kind] = check(kind, csvfile, report, ids, parents,
+                            progress and (lambda done, total, kind=kind: progress(kind, done, total)))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check ids, references and fields of product/supplier/stock")
+    parser.add_argument("--dir", default=".", help="folder with the csv files")
+    parser.add_argument("--bloom", action="store_true", help="keep ids in Bloom filters instead of sets")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="Bloom filter false positive rate")
+    parser.add_argument("--max-set", type=int, default=MAX_SET_IDS,
+                        help="use a Bloom filter for files with more rows than this")
+    parser.add_argument("--examples", type=int, default=EXAMPLES, help="examples shown per problem")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    report = validate(args.dir, args.bloom, args.error_rate, args.examples, args.max_set)
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        for line in report.lines():
+            print(line)
+    return 1 if report.problems else 0
+
+
+if __name__ == "__main__":
+    instrument.configure(sys.argv)
+    sys.exit(main())
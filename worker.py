@@ -0,0 +1,164 @@
+"""
+Trabalho em segundo plano para os GUIs (Tkinter)
+- BackgroundTask corre a leitura/pesquisa numa thread e manda os resultados
+  para a janela em lotes, com after() (o Tk so e usado na thread principal)
+- A funcao de trabalho recebe a task: chama task.progress(feito, total) de vez em quando,
+  o que tambem serve para parar quando o utilizador carrega em Cancel
+- TaskBar: barra de estado com texto, barra de progresso e botao Cancel,
+  e o resumo das operacoes do storage da ultima task (instrument)
+"""
+
+import queue
+import threading
+from collections.abc import Iterator
+import tkinter as tk
+from tkinter import ttk
+
+import instrument
+import searchcache
+
+BATCH_SIZE = 500
+POLL_MS = 50
+
+
+class Cancelled(Exception):
+    pass
+
+
+class BackgroundTask:
+    def __init__(self, widget, work, on_items=None, on_done=None, on_progress=None):
+        # work(task) e um gerador (cada item gerado vai para on_items, em listas)
+        # ou uma funcao normal: o valor devolvido chega a on_items como [valor]
+        self.widget = widget
+        self.work = work
+        self.on_items = on_items
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.done = False
+        self.ops = []  # operacoes do storage medidas nesta task (instrument)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.widget.after(POLL_MS, self._poll)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def progress(self, done, total):
+        # chamado na thread de trabalho
+        if self.cancelled.is_set():
+            raise Cancelled()
+        self.queue.put(("progress", done / total if total else 1.0))
+
+    def _run(self):
+        with instrument.collect() as self.ops, instrument.profiled():
+            self._work()
+
+    def _work(self):
+        items = []
+        error = None
+        try:
+            result = self.work(self)
+            if not isinstance(result, Iterator):
+                result = iter([result])
+            for item in result:
+                items.append(item)
+                if len(items) >= BATCH_SIZE:
+                    self.queue.put(("items", items))
+                    items = []
+                if self.cancelled.is_set():
+                    raise Cancelled()
+        except Cancelled:
+            pass
+        except Exception as ex:
+            error = ex
+        if items:
+            self.queue.put(("items", items))
+        self.queue.put(("done", error))
+
+    def _poll(self):
+        # corre na thread do Tk: aplica no maximo alguns lotes e volta a agendar
+        for _ in range(20):
+            try:
+                kind, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "items":
+                if self.on_items and not self.cancelled.is_set():
+                    self.on_items(value)
+            elif kind == "progress":
+                if self.on_progress:
+                    self.on_progress(value)
+            else:
+                self.done = True
+                if self.on_done:
+                    self.on_done(value, self.cancelled.is_set())
+                return
+        self.widget.after(POLL_MS, self._poll)
+
+
+class TaskBar(ttk.Frame):
+    """Estado + progresso + Cancel; so corre uma task de cada vez"""
+
+    def __init__(self, master, textvariable=None, **kw):
+        super().__init__(master, **kw)
+        self.var = textvariable or tk.StringVar(value="")
+        self.task = None
+        self.stats_var = tk.StringVar(value="")
+        ttk.Label(self, textvariable=self.var, relief=tk.SUNKEN).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_btn = ttk.Button(self, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.RIGHT, padx=(4, 0))
+        self.bar = ttk.Progressbar(self, mode="determinate", maximum=1.0, length=160)
+        self.bar.pack(side=tk.RIGHT, padx=(4, 0))
+        ttk.Label(self, textvariable=self.stats_var).pack(side=tk.RIGHT, padx=(4, 0))
+
+    def set_text(self, text):
+        self.var.set(text)
+
+    def run(self, work, on_items=None, on_done=None, text=None):
+        """Cancela a task anterior (se houver) e comeca outra"""
+        self.cancel()
+        if text is not None:
+            self.var.set(text)
+        self.bar["value"] = 0
+        self.cancel_btn.configure(state=tk.NORMAL)
+
+        def finished(error, cancelled):
+            if self.task is not None and self.task is not task:
+                return  # substituida por outra task
+            if task is self.task:
+                self.task = None
+                self.cancel_btn.configure(state=tk.DISABLED)
+                self.bar["value"] = 1.0
+            self.show_stats(task.ops)
+            if on_done:
+                on_done(error, cancelled)
+
+        def progress(value):
+            if task is self.task:
+                self.bar["value"] = value
+
+        task = BackgroundTask(self, work, on_items, finished, progress)
+        self.task = task
+        return task
+
+    def show_stats(self, ops):
+        """Resumo das operacoes da ultima task, ex: "12,345 rows scanned in 84 ms (avg 80 ms, 5x)" """
+        if not ops:
+            return
+        count, avg = instrument.rolling(ops[-1].op, ops[-1].kind)
+        text = instrument.summary(ops)
+        if count > 1:
+            text += f" (avg {avg:.0f} ms, {count}x)"
+        cache = searchcache.summary()
+        if cache:
+            text += f" | {cache}"
+        self.stats_var.set(text)
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.cancel_btn.configure(state=tk.DISABLED)
+            self.bar["value"] = 0